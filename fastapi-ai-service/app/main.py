@@ -1,39 +1,195 @@
 import os
+import asyncio
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request, Response
-from pydantic import BaseModel
-import requests
+from fastapi import FastAPI, HTTPException, Request, Response, Body
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel, ValidationError
+from typing import Any, Dict, List, Optional
 import logging
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (background writer thread, per-request sampling; see app.utils.log_config)
+from app.utils.log_config import RequestLogContextMiddleware, body, configure_logging
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Import services
 from app.services.chatbot_service import ChatbotService
 from app.services.sentiment_service import SentimentService
 from app.services.dispatch_service import DispatchService
-from app.services.knowledge_base_service import KnowledgeBaseService
+from app.services.knowledge_base_service import KnowledgeBaseService, KnowledgeBaseEntryExistsError
+from app.services.ticket_analysis_service import TicketAnalysisService
+from app.services.bulk_job_service import BulkJobService, BulkJobTooLargeError
+from app.services.stream_analysis_service import StreamAnalysisService
+from app.services.message_pipeline import MessagePipeline
+from app.services.training_service import TrainingService, TrainingInProgressError
+from app.services.tenant_registry import TenantRegistry, TenantNotFoundError, TenantLoadError
+from app.services.online_learning_service import OnlineLearningService, OnlineLearningUnavailableError, UnknownLabelError
+
+# Import utils
+from app.utils.inference_executor import InferenceExecutor, InferenceQueueFullError
+from app.utils.result_cache import ResultCache, normalize_message
+from app.utils.single_flight import SingleFlight
+from app.utils.micro_batcher import MicroBatcher
+from app.utils.model_watcher import ModelWatcher
+from app.utils.metrics import REGISTRY, STAGE_DURATION, RequestMetricsMiddleware
+from app.utils.admission import AdmissionController, AdmissionControlMiddleware
+from app.utils.startup import StartupLoader
+from app.utils.model_loader import import_model_libraries
+from app.utils.ndjson import DuplexStreamingResponse
 
 # Import models
 from app.models.chatbot_models import ChatbotRequest, ChatbotResponse
 from app.models.sentiment_models import SentimentRequest, SentimentResponse
-from app.models.ticket_models import TicketAnalysisRequest, TicketAnalysisResponse, TicketDispatchResponse
+from app.models.knowledge_base_models import (
+    KnowledgeBaseSearchRequest, KnowledgeBaseSearchResponse, KnowledgeBaseCandidate,
+    KnowledgeBaseEntry, KnowledgeBaseEntryList
+)
+from app.models.dispatch_models import AgentRoster, AgentLoadUpdate, AgentRosterResponse
+from app.models.ticket_models import (
+    TicketAnalysisRequest, TicketAnalysisResponse, TicketDispatchResponse,
+    TicketBatchItemResult, TicketBatchAnalysisResponse
+)
+from app.models.job_models import BulkJobStatus, BulkJobList
+from app.models.training_models import TrainingRequest, TrainingRunStatus, TrainingRunList
+from app.models.feedback_models import FeedbackRequest, FeedbackResponse, OnlineModelStatus
 
 app = FastAPI(
     title="Smart Customer Support AI Service",
     description="Provides AI capabilities for chatbot, sentiment analysis, and intelligent dispatch.",
     version="1.0.0"
 )
+# Per-client rate limits and priority queueing of the /ai/ endpoints (see app.utils.admission);
+# added first, so it runs inside the metrics and log middlewares and rejections are recorded
+# under the route they were sent to
+admission_controller = AdmissionController()
+app.add_middleware(AdmissionControlMiddleware, controller=admission_controller)
+# Latency histogram of every endpoint, exposed at /metrics
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(RequestLogContextMiddleware)
+
+# Initialize services. Their artifacts are loaded once, concurrently, by
+# startup_loader when the application starts (not at import time).
+chatbot_service = ChatbotService(load=False)
+sentiment_service = SentimentService(load=False)
+dispatch_service = DispatchService(load=False)
+knowledge_base_service = KnowledgeBaseService(load=False)
+# Results of repeated messages, keyed by normalized text and model/KB versions
+result_cache = ResultCache()
+ticket_analysis_service = TicketAnalysisService(
+    chatbot_service, sentiment_service, knowledge_base_service, dispatch_service, result_cache
+)
+
+# All blocking model inference is submitted to this bounded executor so that it
+# never runs on the event loop; a full queue is reported as 503.
+inference_executor = InferenceExecutor()
+inference_executor.register("chatbot", chatbot_service)
+inference_executor.register("sentiment", sentiment_service)
+inference_executor.register("knowledge_base", knowledge_base_service)
+inference_executor.register("ticket_analysis", ticket_analysis_service)
+
+# Bulk re-analysis jobs run without the result cache: one-off historical messages
+# would only evict the entries of live traffic.
+bulk_job_service = BulkJobService(
+    TicketAnalysisService(chatbot_service, sentiment_service, knowledge_base_service, dispatch_service),
+    inference_executor
+)
+inference_executor.register("bulk_jobs", bulk_job_service)
+# Concurrent requests for the same normalized message and model versions share one
+# in-flight inference; per-ticket fields are applied to each request afterwards
+request_coalescer = SingleFlight(os.getenv("REQUEST_COALESCING", "true").lower() == "true")
+REGISTRY.gauge_callback("ai_coalescing_in_flight", "Distinct computations currently shared by coalesced requests.", lambda: [((), len(request_coalescer))])
+
+def _model_versions_key(message: str, *versions):
+    return (normalize_message(message),) + versions
+
+# Concurrent single-message requests are grouped into one vectorized inference call
+# (see MicroBatcher); each caller gets its own item's result.
+async def _predict_intents(messages: List[str]):
+    classification = await inference_executor.run(ticket_analysis_service.classify, messages, False, True)
+    return [(intent, confidence, classification.intent_model_version) for intent, confidence in classification.intents]
+
+async def _analyze_sentiments(texts: List[str]):
+    classification = await inference_executor.run(ticket_analysis_service.classify, texts, True, False)
+    return [(sentiment, confidence, classification.sentiment_model_version) for sentiment, confidence in classification.sentiments]
+
+# Messages that need both models are classified in one call, featurized once
+async def _classify_messages(messages: List[str]):
+    classification = await inference_executor.run(ticket_analysis_service.classify, messages, True, True)
+    return [
+        ((sentiment, sentiment_confidence, classification.sentiment_model_version),
+         (intent, intent_confidence, classification.intent_model_version))
+        for (sentiment, sentiment_confidence), (intent, intent_confidence) in zip(classification.sentiments, classification.intents)
+    ]
+
+micro_batchers = {
+    "classify": MicroBatcher("classify", _classify_messages, max_concurrency=inference_executor.max_workers),
+    "intent": MicroBatcher("intent", _predict_intents, max_concurrency=inference_executor.max_workers),
+    "sentiment": MicroBatcher("sentiment", _analyze_sentiments, max_concurrency=inference_executor.max_workers),
+}
+REGISTRY.gauge_callback(
+    "ai_microbatch_target_size", "Current adaptive micro-batch size target.",
+    lambda: [((name,), batcher.target_size) for name, batcher in micro_batchers.items()], ("operation",)
+)
+
+# Runs the stages of /ai/process_incoming_message concurrently where they are independent
+message_pipeline = MessagePipeline(ticket_analysis_service, inference_executor, micro_batchers["classify"].submit)
+
+# Micro-batches continuous NDJSON feeds received on /ai/process_incoming_messages/stream
+stream_analysis_service = StreamAnalysisService(ticket_analysis_service, inference_executor)
+
+# Brands with their own models and knowledge base, loaded on first use and unloaded
+# least recently used first under TENANT_MEMORY_BUDGET_MB. The lambda looks the
+# default services up at load time, for the artifacts a tenant does not provide.
+tenant_registry = TenantRegistry(
+    lambda: {"chatbot": chatbot_service, "sentiment": sentiment_service, "knowledge_base": knowledge_base_service, "dispatch": dispatch_service},
+    inference_executor
+)
+REGISTRY.gauge_callback("ai_tenants_loaded", "Tenants whose artifacts are loaded.", lambda: [((), len(tenant_registry))])
+REGISTRY.gauge_callback("ai_tenant_memory_bytes", "Artifact bytes of the loaded tenants.", lambda: [((), tenant_registry.memory_bytes)])
+
+async def _tenant(tenant_id: Optional[str]):
+    """The loaded tenant of a request, or None for requests without a tenant id (default models)."""
+    if tenant_id is None:
+        return None
+    try:
+        return await tenant_registry.get(tenant_id)
+    except TenantNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except TenantLoadError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+# Cache and executor state already tracked by those objects, read when /metrics is scraped
+def _cache_namespace_values(field: str):
+    return lambda: [((namespace,), stats[field]) for namespace, stats in result_cache.stats()["namespaces"].items()]
+
+REGISTRY.counter_callback("ai_result_cache_hits_total", "Result cache hits.", _cache_namespace_values("hits"), ("namespace",))
+REGISTRY.counter_callback("ai_result_cache_misses_total", "Result cache misses.", _cache_namespace_values("misses"), ("namespace",))
+REGISTRY.gauge_callback("ai_result_cache_hit_ratio", "Result cache hit ratio since startup.", _cache_namespace_values("hit_rate"), ("namespace",))
+REGISTRY.counter_callback("ai_result_cache_evictions_total", "Result cache LRU evictions.", lambda: [((), result_cache.evictions)])
+REGISTRY.gauge_callback("ai_result_cache_entries", "Entries in the result cache.", lambda: [((), len(result_cache))])
+REGISTRY.gauge_callback("ai_inference_executor_pending", "Inference tasks running or queued.", lambda: [((), inference_executor.pending)])
+REGISTRY.gauge_callback("ai_admission_in_flight", "Requests holding an admission slot.", lambda: [((), admission_controller.active)])
+REGISTRY.gauge_callback(
+    "ai_admission_queued", "Requests waiting for an admission slot, by priority.",
+    lambda: [((priority,), count) for priority, count in admission_controller.queued().items()], ("priority",)
+)
+REGISTRY.gauge_callback("ai_inference_executor_queue_depth", "Inference tasks waiting for a free worker.", lambda: [((), inference_executor.queue_depth)])
+REGISTRY.counter_callback("ai_inference_executor_rejected_total", "Inference tasks rejected with 503 because the queue was full.", lambda: [((), inference_executor.rejected)])
 
-# Initialize services (models will be loaded on demand or at startup)
-chatbot_service = ChatbotService()
-sentiment_service = SentimentService()
-dispatch_service = DispatchService()
-knowledge_base_service = KnowledgeBaseService()
+# Upper bound on the number of messages accepted by the batch endpoint
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "256"))
+
+@app.exception_handler(InferenceQueueFullError)
+async def inference_queue_full_handler(request: Request, exc: InferenceQueueFullError):
+    logger.warning(f"Rejecting {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "AI service is overloaded. Please retry shortly."},
+        headers={"Retry-After": "1"}
+    )
 
 # Health check endpoint
 @app.get("/health")
@@ -49,10 +205,15 @@ async def get_chatbot_reply(request: ChatbotRequest):
         if not chatbot_service.is_model_loaded():
             raise HTTPException(status_code=503, detail="Chatbot model not loaded. Please train/load the model first.")
 
-        intent, confidence = chatbot_service.predict_intent(request.message)
+        intent, confidence, model_version = await request_coalescer.run(
+            "intent", _model_versions_key(request.message, chatbot_service.model_version),
+            lambda: micro_batchers["intent"].submit(request.message)
+        )
         reply = chatbot_service.get_reply(intent, request.message)
-        logger.info(f"Chatbot - Message: '{request.message}', Intent: '{intent}', Reply: '{reply}'")
-        return ChatbotResponse(intent=intent, reply=reply, confidence=confidence)
+        logger.info("Chatbot - Message: %s, Intent: '%s', Reply: %s", body(request.message), intent, body(reply))
+        return ChatbotResponse(intent=intent, reply=reply, confidence=confidence, intent_model_version=model_version)
+    except (HTTPException, InferenceQueueFullError):
+        raise
     except Exception as e:
         logger.error(f"Error in chatbot endpoint: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
@@ -66,9 +227,14 @@ async def analyze_sentiment(request: SentimentRequest):
         if not sentiment_service.is_model_loaded():
             raise HTTPException(status_code=503, detail="Sentiment model not loaded. Please train/load the model first.")
 
-        sentiment, confidence = sentiment_service.analyze_sentiment(request.text)
-        logger.info(f"Sentiment - Text: '{request.text}', Sentiment: '{sentiment}'")
-        return SentimentResponse(sentiment=sentiment, confidence=confidence)
+        sentiment, confidence, model_version = await request_coalescer.run(
+            "sentiment", _model_versions_key(request.text, sentiment_service.model_version),
+            lambda: micro_batchers["sentiment"].submit(request.text)
+        )
+        logger.info("Sentiment - Text: %s, Sentiment: '%s'", body(request.text), sentiment)
+        return SentimentResponse(sentiment=sentiment, confidence=confidence, sentiment_model_version=model_version)
+    except (HTTPException, InferenceQueueFullError):
+        raise
     except Exception as e:
         logger.error(f"Error in sentiment endpoint: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
@@ -79,19 +245,33 @@ async def dispatch_ticket(request: TicketAnalysisRequest):
     根據工單訊息進行智能分派。
     """
     try:
-        if not chatbot_service.is_model_loaded():
+        tenant = await _tenant(request.tenant_id)
+        analysis_service = tenant.ticket_analysis_service if tenant else ticket_analysis_service
+        executor = tenant_registry.executor if tenant else inference_executor
+        if not analysis_service.chatbot_service.is_model_loaded():
             raise HTTPException(status_code=503, detail="Chatbot model not loaded for dispatch. Please train/load the model first.")
 
         # 首先進行意圖識別和情感分析
-        intent, intent_confidence = chatbot_service.predict_intent(request.message)
-        sentiment, sentiment_confidence = sentiment_service.analyze_sentiment(request.message)
+        key = _model_versions_key(
+            request.message, request.tenant_id,
+            analysis_service.sentiment_service.model_version, analysis_service.chatbot_service.model_version
+        )
+        classification = await request_coalescer.run(
+            "classification", key, lambda: executor.run(analysis_service.classify, [request.message])
+        )
+        sentiment, sentiment_confidence = classification.sentiments[0]
+        intent, intent_confidence = classification.intents[0]
 
         # 結合 AI 分析結果進行智能分派
-        suggested_agent_id, suggested_priority = dispatch_service.suggest_dispatch(
-            intent, sentiment, request.existing_ticket_status
-        )
+        with STAGE_DURATION.time(stage="dispatch"):
+            suggested_agent_id, suggested_priority = dispatch_service.suggest_dispatch(
+                intent, sentiment, request.existing_ticket_status
+            )
 
-        logger.info(f"Dispatch - Ticket ID: {request.ticket_id}, Message: '{request.message}', Intent: '{intent}', Sentiment: '{sentiment}', Suggested Agent: {suggested_agent_id}, Suggested Priority: {suggested_priority}")
+        logger.info(
+            "Dispatch - Ticket ID: %s, Message: %s, Intent: '%s', Sentiment: '%s', Suggested Agent: %s, Suggested Priority: %s",
+            request.ticket_id, body(request.message), intent, sentiment, suggested_agent_id, suggested_priority
+        )
 
         return TicketDispatchResponse(
             ticket_id=request.ticket_id,
@@ -100,110 +280,571 @@ async def dispatch_ticket(request: TicketAnalysisRequest):
             sentiment=sentiment,
             sentiment_confidence=sentiment_confidence,
             suggested_agent_id=suggested_agent_id,
-            suggested_priority=suggested_priority
+            suggested_priority=suggested_priority,
+            sentiment_model_version=classification.sentiment_model_version,
+            intent_model_version=classification.intent_model_version
         )
+    except (HTTPException, InferenceQueueFullError):
+        raise
     except Exception as e:
         logger.error(f"Error in dispatch_ticket endpoint: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
+@app.post("/ai/knowledge_base/search", response_model=KnowledgeBaseSearchResponse)
+async def search_knowledge_base(request: KnowledgeBaseSearchRequest):
+    """
+    在知識庫中搜尋最佳答案，並可選擇返回依相關度排序的前 k 個候選條目。
+    """
+    try:
+        if not knowledge_base_service.is_kb_loaded():
+            raise HTTPException(status_code=503, detail="Knowledge base not loaded.")
+
+        entry, matched_by, candidates = await inference_executor.run(
+            knowledge_base_service.search_top_k, request.query, request.intent, request.top_k
+        )
+        return KnowledgeBaseSearchResponse(
+            answer=entry.get("answer") if entry else None,
+            matched_by=matched_by,
+            candidates=[
+                KnowledgeBaseCandidate(
+                    id=candidate.get("id"),
+                    question=candidate.get("question"),
+                    answer=candidate.get("answer"),
+                    intent_keyword=candidate.get("intent_keyword"),
+                    score=score
+                )
+                for candidate, score in candidates
+            ]
+        )
+    except (HTTPException, InferenceQueueFullError):
+        raise
+    except Exception as e:
+        logger.error(f"Error in knowledge_base search endpoint: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+def _require_kb_file():
+    if knowledge_base_service.kb_version is None:
+        raise HTTPException(status_code=503, detail="Knowledge base not loaded.")
+
+def _on_kb_edited():
+    # Process pool workers hold a copy of the previous knowledge base
+    if inference_executor.mode == "process":
+        inference_executor.restart()
+
+@app.get("/admin/knowledge_base/entries", response_model=KnowledgeBaseEntryList)
+async def list_knowledge_base_entries(offset: int = 0, limit: int = 100):
+    """
+    依知識庫順序分頁列出條目。
+    """
+    total, entries = knowledge_base_service.list_entries(max(offset, 0), min(max(limit, 0), 1000))
+    return KnowledgeBaseEntryList(total=total, entries=entries)
+
+@app.get("/admin/knowledge_base/entries/{entry_id}", response_model=KnowledgeBaseEntry)
+async def get_knowledge_base_entry(entry_id: str):
+    """
+    返回單一知識庫條目。
+    """
+    entry = knowledge_base_service.get_entry(entry_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Knowledge base entry {entry_id} not found.")
+    return entry
+
+@app.post("/admin/knowledge_base/entries", response_model=KnowledgeBaseEntry, status_code=201)
+async def create_knowledge_base_entry(entry: KnowledgeBaseEntry):
+    """
+    新增知識庫條目：寫入變更日誌後增量更新索引，無需重新載入整個知識庫。
+    """
+    _require_kb_file()
+    try:
+        created = await asyncio.to_thread(knowledge_base_service.create_entry, entry.model_dump(exclude_none=True))
+    except KnowledgeBaseEntryExistsError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    _on_kb_edited()
+    return created
+
+@app.put("/admin/knowledge_base/entries/{entry_id}", response_model=KnowledgeBaseEntry)
+async def update_knowledge_base_entry(entry_id: str, entry: KnowledgeBaseEntry):
+    """
+    以請求內容取代知識庫條目（保留其在知識庫中的順序）。
+    """
+    _require_kb_file()
+    updated = await asyncio.to_thread(knowledge_base_service.update_entry, entry_id, entry.model_dump(exclude_none=True))
+    if updated is None:
+        raise HTTPException(status_code=404, detail=f"Knowledge base entry {entry_id} not found.")
+    _on_kb_edited()
+    return updated
+
+@app.delete("/admin/knowledge_base/entries/{entry_id}")
+async def delete_knowledge_base_entry(entry_id: str):
+    """
+    刪除知識庫條目。
+    """
+    _require_kb_file()
+    if not await asyncio.to_thread(knowledge_base_service.delete_entry, entry_id):
+        raise HTTPException(status_code=404, detail=f"Knowledge base entry {entry_id} not found.")
+    _on_kb_edited()
+    return {"status": "ok", "message": f"Knowledge base entry {entry_id} deleted"}
+
+@app.post("/admin/knowledge_base/compact")
+async def compact_knowledge_base():
+    """
+    將變更日誌合併寫回知識庫檔案（達到 KB_LOG_COMPACT_THRESHOLD 筆變更時也會自動執行）。
+    """
+    _require_kb_file()
+    compacted = await asyncio.to_thread(knowledge_base_service.compact)
+    return {"compacted": compacted, "version": knowledge_base_service.kb_version}
+
 @app.post("/ai/process_incoming_message", response_model=TicketAnalysisResponse)
 async def process_incoming_message(request: TicketAnalysisRequest):
     """
     統一處理來自 Laravel 的新進訊息，進行全面 AI 分析並生成自動回覆（如果適用）。
     """
-    logger.info(f"Processing incoming message for ticket {request.ticket_id}: '{request.message}'")
     try:
-        # Step 1: Sentiment Analysis
-        sentiment, sentiment_confidence = "neutral", 0.0
-        if sentiment_service.is_model_loaded():
-            sentiment, sentiment_confidence = sentiment_service.analyze_sentiment(request.message)
-            logger.info(f"Sentiment analysis: {sentiment} ({sentiment_confidence:.2f})")
-        else:
-            logger.warning("Sentiment model not loaded, skipping sentiment analysis.")
-
-        # Step 2: Intent Recognition
-        intent, intent_confidence = "unknown", 0.0
-        if chatbot_service.is_model_loaded():
-            intent, intent_confidence = chatbot_service.predict_intent(request.message)
-            logger.info(f"Intent recognition: {intent} ({intent_confidence:.2f})")
-        else:
-            logger.warning("Chatbot model not loaded, skipping intent recognition.")
-
-        # Step 3: Knowledge Base Search
-        kb_answer = None
-        if knowledge_base_service.is_kb_loaded():
-            kb_answer = knowledge_base_service.search_knowledge_base(request.message, intent)
-            if kb_answer:
-                logger.info(f"Knowledge Base found answer: {kb_answer}")
-            else:
-                logger.info("No relevant answer found in knowledge base.")
-        else:
-            logger.warning("Knowledge base not loaded, skipping KB search.")
-
-        # Step 4: Generate AI Reply (if applicable)
-        ai_reply = None
-        if kb_answer:
-            ai_reply = kb_answer # If KB has a direct answer, use it
-        elif intent != "unknown" and chatbot_service.is_model_loaded():
-            # If a specific intent is recognized, try to get a canned/rule-based reply
-            ai_reply = chatbot_service.get_reply(intent, request.message)
-            if ai_reply:
-                logger.info(f"Chatbot generated reply for intent '{intent}': {ai_reply}")
-            else:
-                logger.info(f"Chatbot has no specific reply for intent '{intent}'.")
-        # else: Add integration with a Generative AI like OpenAI here
-        # For example:
-        # if not ai_reply and os.getenv("OPENAI_API_KEY"):
-        #     try:
-        #         from openai import OpenAI
-        #         client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        #         chat_completion = client.chat.completions.create(
-        #             model="gpt-3.5-turbo",
-        #             messages=[
-        #                 {"role": "system", "content": "You are a helpful customer support assistant."},
-        #                 {"role": "user", "content": request.message}
-        #             ]
-        #         )
-        #         ai_reply = chat_completion.choices[0].message.content
-        #         logger.info(f"OpenAI generated reply: {ai_reply}")
-        #     except Exception as e:
-        #         logger.error(f"Error calling OpenAI API: {e}", exc_info=True)
-
-
-        # Step 5: Intelligent Dispatch (Suggest status/agent)
-        suggested_agent_id, suggested_priority = dispatch_service.suggest_dispatch(
-            intent, sentiment, request.existing_ticket_status
+        tenant = await _tenant(request.tenant_id)
+        pipeline = tenant.message_pipeline if tenant else message_pipeline
+        analysis_service = pipeline.ticket_analysis_service
+        key = _model_versions_key(
+            request.message, request.tenant_id, analysis_service.sentiment_service.model_version,
+            analysis_service.chatbot_service.model_version, analysis_service.knowledge_base_service.kb_version
         )
-        logger.info(f"Suggested Dispatch - Agent: {suggested_agent_id}, Priority: {suggested_priority}")
+        analysis = await request_coalescer.run("analysis", key, lambda: pipeline.analyze(request))
+        # The analysis may be shared with identical concurrent messages: dispatch works on a copy for this ticket
+        return pipeline.dispatch(request, analysis)
+    except (HTTPException, InferenceQueueFullError):
+        raise
+    except Exception as e:
+        logger.error(f"Critical error processing incoming message for ticket {request.ticket_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
-        # Construct response
-        response_data = TicketAnalysisResponse(
-            ticket_id=request.ticket_id,
-            sentiment=sentiment,
-            sentiment_confidence=sentiment_confidence,
-            intent=intent,
-            intent_confidence=intent_confidence,
-            ai_reply=ai_reply,
-            suggested_agent_id=suggested_agent_id,
-            suggested_priority=suggested_priority,
-            knowledge_base_answer=kb_answer
-        )
-        return response_data
+@app.post("/ai/process_incoming_messages", response_model=TicketBatchAnalysisResponse)
+async def process_incoming_messages(items: List[Any] = Body(...)):
+    """
+    批次處理多則新進訊息：情感分析與意圖識別以單次向量化推論處理整個批次。
+    每則訊息的結果依輸入順序返回，單一訊息失敗不會影響其他訊息。
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(items)} items (max {MAX_BATCH_SIZE}).")
 
+    results: List[TicketBatchItemResult] = [None] * len(items)
+    valid_indices, valid_requests = [], []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Each batch item must be a JSON object.")
+            valid_requests.append(TicketAnalysisRequest(**item))
+            valid_indices.append(index)
+        except (ValidationError, ValueError) as e:
+            ticket_id = item.get("ticket_id") if isinstance(item, dict) else None
+            results[index] = TicketBatchItemResult(
+                index=index,
+                ticket_id=ticket_id if isinstance(ticket_id, int) else None,
+                status="error",
+                error=f"Invalid request: {e}"
+            )
+
+    # Messages of different tenants are analyzed by different models: one batch per tenant
+    positions_by_tenant: Dict[Optional[str], List[int]] = {}
+    for position, request in enumerate(valid_requests):
+        positions_by_tenant.setdefault(request.tenant_id, []).append(position)
+
+    async def analyze_tenant_batch(tenant_id: Optional[str], positions: List[int]):
+        try:
+            tenant = await _tenant(tenant_id)
+        except HTTPException as e:
+            return [(None, e.detail)] * len(positions)
+        analysis_service = tenant.ticket_analysis_service if tenant else ticket_analysis_service
+        executor = tenant_registry.executor if tenant else inference_executor
+        return await executor.run(analysis_service.analyze_batch, [valid_requests[position] for position in positions], False)
+
+    try:
+        tenant_analyses = await asyncio.gather(*(
+            analyze_tenant_batch(tenant_id, positions) for tenant_id, positions in positions_by_tenant.items()
+        ))
+        analyses = [None] * len(valid_requests)
+        for positions, group in zip(positions_by_tenant.values(), tenant_analyses):
+            for position, analysis in zip(positions, group):
+                analyses[position] = analysis
+    except InferenceQueueFullError:
+        raise
     except Exception as e:
-        logger.error(f"Critical error processing incoming message for ticket {request.ticket_id}: {e}", exc_info=True)
+        logger.error(f"Critical error processing batch of {len(valid_requests)} messages: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
+    for index, request, (analysis, error) in zip(valid_indices, valid_requests, analyses):
+        if analysis is not None:
+            try:
+                ticket_analysis_service.apply_dispatch(request, analysis)
+            except Exception as e:
+                logger.error(f"Error dispatching batched message for ticket {request.ticket_id}: {e}", exc_info=True)
+                analysis, error = None, str(e)
+        results[index] = TicketBatchItemResult(
+            index=index,
+            ticket_id=request.ticket_id,
+            status="ok" if error is None else "error",
+            result=analysis,
+            error=error
+        )
+
+    failed = sum(1 for result in results if result.status == "error")
+    return TicketBatchAnalysisResponse(results=results, succeeded=len(results) - failed, failed=failed)
+
+@app.post("/ai/process_incoming_messages/stream")
+async def process_incoming_message_stream(request: Request):
+    """
+    串流處理新進訊息：請求主體為持續傳入的 NDJSON（每行一筆 TicketAnalysisRequest），
+    服務依筆數或時間窗口組成微批次進行向量化推論，並以 NDJSON 串流依輸入順序返回每筆結果。
+    處理速度跟不上時停止讀取請求主體（背壓）。
+    """
+    return DuplexStreamingResponse(stream_analysis_service.stream(request.stream()), media_type="application/x-ndjson")
+
+@app.post("/ai/jobs", response_model=BulkJobStatus, status_code=202)
+async def submit_bulk_job(request: Request):
+    """
+    提交批次重新分析工作：請求主體為 JSONL（每行一筆 TicketAnalysisRequest），以串流方式寫入磁碟。
+    立即返回工作 ID，可透過 GET /ai/jobs/{job_id} 查詢進度。
+    """
+    try:
+        job = await bulk_job_service.submit(request.stream())
+    except BulkJobTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return job.to_status()
+
+@app.get("/ai/jobs", response_model=BulkJobList)
+async def list_bulk_jobs():
+    """
+    返回所有批次工作的狀態。
+    """
+    return BulkJobList(jobs=[job.to_status() for job in bulk_job_service.list()])
+
+@app.get("/ai/jobs/{job_id}", response_model=BulkJobStatus)
+async def get_bulk_job(job_id: str):
+    """
+    返回批次工作的狀態與進度。
+    """
+    job = bulk_job_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job.to_status()
+
+@app.get("/ai/jobs/{job_id}/results")
+async def get_bulk_job_results(job_id: str):
+    """
+    以 JSONL 串流返回批次工作目前已完成的結果（每行一筆 TicketBatchItemResult，依輸入順序）。
+    """
+    job = bulk_job_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    if not os.path.exists(job.output_path):
+        return Response(content=b"", media_type="application/x-ndjson")
+    return FileResponse(job.output_path, media_type="application/x-ndjson")
+
+@app.delete("/ai/jobs/{job_id}")
+async def delete_bulk_job(job_id: str):
+    """
+    取消批次工作（若仍在執行）並刪除其輸入與結果檔案。
+    """
+    if not await bulk_job_service.delete(job_id):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return {"status": "ok", "message": f"Job {job_id} deleted"}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    以 Prometheus 文字格式輸出各階段耗時、端點延遲、模型降級次數、快取命中率與推論佇列深度。
+    """
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/cache")
+async def get_cache_stats():
+    """
+    返回結果快取的大小、命中率與淘汰次數。
+    """
+    return result_cache.stats()
+
+@app.delete("/admin/cache")
+async def clear_cache():
+    """
+    清除所有快取結果。
+    """
+    result_cache.invalidate()
+    return {"status": "ok", "message": "Result cache cleared"}
+
+async def reload_models(model_names: Optional[List[str]] = None) -> dict:
+    """
+    Loads new model artifacts in a background thread, validates them and swaps them
+    into serving. Requests already running finish on the model they started with.
+    Only the named models are reloaded, if given; otherwise every model and the
+    knowledge base.
+    """
+    services = {"chatbot": chatbot_service, "sentiment": sentiment_service}
+    results = {}
+    for name in model_names or list(services):
+        service = services[name]
+        reloaded, message = await asyncio.to_thread(service.reload_model)
+        results[name] = {"reloaded": reloaded, "message": message, "version": service.model_version}
+
+    if model_names is None:
+        kb_reloaded = await asyncio.to_thread(knowledge_base_service.reload_knowledge_base)
+        results["knowledge_base"] = {"reloaded": kb_reloaded, "version": knowledge_base_service.kb_version}
+
+    if any(result["reloaded"] for result in results.values()):
+        # Old results can no longer be hit (their keys carry the old versions); free them
+        result_cache.invalidate()
+        # Process pool workers hold copies of the old models; fork fresh ones
+        if inference_executor.mode == "process":
+            inference_executor.restart()
+    return results
+
+async def _on_artifacts_changed(paths):
+    await reload_models()
+
+# Reloads models automatically when their files change (disabled when the interval is 0).
+# The knowledge base change log is watched too, for the edits made by other workers
+model_watcher = ModelWatcher(
+    lambda: [chatbot_service.model_path, sentiment_service.model_path, knowledge_base_service.kb_path, knowledge_base_service.log_path],
+    _on_artifacts_changed,
+    float(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", "0"))
+)
+
+async def _on_model_published(model_name: str) -> dict:
+    # The training service compares the version now serving with the one it published
+    return (await reload_models([model_name]))[model_name]
+
+# Trains models in a child process and publishes them to MODEL_REGISTRY_DIR
+training_service = TrainingService(on_published=_on_model_published)
+
+@app.post("/admin/models/train", response_model=TrainingRunStatus, status_code=202)
+async def train_model(request: TrainingRequest):
+    """
+    於獨立程序中離線訓練模型（可選擇以所有 CPU 核心進行超參數搜尋），並以新版本原子性地發佈至模型註冊目錄。
+    訓練完成後僅重新載入該模型；MODEL_PATH_* 指向註冊目錄中的 manifest.json 時即改用新版本。
+    新版本未能服務（驗證失敗或路徑未指向註冊目錄）時，執行狀態為 published_not_serving，原因見 error。
+    """
+    if not os.path.isfile(request.data_path):
+        raise HTTPException(status_code=400, detail=f"Training data not found: {request.data_path}")
+    try:
+        run = await training_service.start(request)
+    except TrainingInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return run.to_status()
+
+@app.get("/admin/models/train", response_model=TrainingRunList)
+async def list_training_runs():
+    """
+    返回所有訓練執行的狀態。
+    """
+    return TrainingRunList(runs=[run.to_status() for run in training_service.list()])
+
+@app.get("/admin/models/train/{run_id}", response_model=TrainingRunStatus)
+async def get_training_run(run_id: str):
+    """
+    返回訓練執行的狀態、發佈的版本、交叉驗證分數與輸出記錄。
+    """
+    run = training_service.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Training run {run_id} not found.")
+    return run.to_status()
+
+async def _on_online_update(model_name: str):
+    # Cached results and process pool workers hold predictions of the previous weights
+    result_cache.invalidate()
+    if inference_executor.mode == "process":
+        inference_executor.restart()
+
+# Applies agent corrections to online models in the background (ONLINE_LEARNING_ENABLED)
+online_learning_service = OnlineLearningService(
+    {"chatbot": chatbot_service, "sentiment": sentiment_service}, on_updated=_on_online_update
+)
+
+@app.post("/ai/feedback", response_model=FeedbackResponse, status_code=202)
+async def submit_feedback(request: FeedbackRequest):
+    """
+    接收客服人員對意圖或情緒的更正，排入佇列後於背景以小批次線上更新模型（需以 online 管線訓練的模型）。
+    """
+    if not online_learning_service.enabled:
+        raise HTTPException(status_code=503, detail="Online learning is disabled.")
+    corrections = {
+        name: label for name, label in (("chatbot", request.intent), ("sentiment", request.sentiment)) if label
+    }
+    if not corrections:
+        raise HTTPException(status_code=422, detail="Provide a corrected intent or sentiment.")
+    try:
+        online_learning_service.submit(request.message, corrections)
+    except OnlineLearningUnavailableError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UnknownLabelError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return FeedbackResponse(accepted=corrections, pending=online_learning_service.pending())
+
+@app.get("/admin/models/online", response_model=List[OnlineModelStatus])
+async def get_online_learning_status():
+    """
+    返回各模型的線上學習狀態：是否可線上更新、待處理更正數、已套用的更新與最近的檢查點版本。
+    """
+    return online_learning_service.status()
+
+@app.post("/admin/models/online/flush", response_model=List[OnlineModelStatus])
+async def flush_online_learning():
+    """
+    立即套用所有待處理的更正，並將更新後的模型發佈為檢查點。
+    """
+    if not online_learning_service.enabled:
+        raise HTTPException(status_code=503, detail="Online learning is disabled.")
+    await online_learning_service.flush(checkpoint=True)
+    return online_learning_service.status()
+
+@app.post("/admin/models/reload")
+async def reload_models_endpoint():
+    """
+    熱重新載入模型與知識庫：於背景載入並驗證新檔案後原子性地切換，無需重啟服務。
+    """
+    return await reload_models()
+
+@app.get("/admin/models")
+async def get_model_versions():
+    """
+    返回目前服務中的模型與知識庫版本。
+    """
+    return {
+        "chatbot": {"loaded": chatbot_service.is_model_loaded(), "version": chatbot_service.model_version, "path": chatbot_service.model_path, "inference_engine": chatbot_service.inference_engine},
+        "sentiment": {"loaded": sentiment_service.is_model_loaded(), "version": sentiment_service.model_version, "path": sentiment_service.model_path, "inference_engine": sentiment_service.inference_engine},
+        "knowledge_base": {"loaded": knowledge_base_service.is_kb_loaded(), "version": knowledge_base_service.kb_version, "path": knowledge_base_service.kb_path}
+    }
+
+@app.get("/admin/tenants")
+async def list_tenants():
+    """
+    返回已載入的租戶（品牌）、各自的模型與知識庫版本及佔用的記憶體預算，最近使用者在前（記憶體不足時由最後一個開始卸載）。
+    """
+    tenants = tenant_registry.loaded()
+    return {
+        "memory_bytes": tenant_registry.memory_bytes,
+        "memory_budget_bytes": tenant_registry.memory_budget_bytes,
+        "tenants": [
+            {
+                "tenant_id": tenant.tenant_id,
+                "memory_bytes": tenant.memory_bytes,
+                "loaded_at": tenant.loaded_at,
+                "chatbot_version": tenant.chatbot_service.model_version,
+                "sentiment_version": tenant.sentiment_service.model_version,
+                "knowledge_base_version": tenant.knowledge_base_service.kb_version,
+            }
+            for tenant in reversed(tenants)
+        ]
+    }
+
+@app.delete("/admin/tenants/{tenant_id}")
+async def unload_tenant(tenant_id: str):
+    """
+    卸載租戶；下一個請求會重新載入其目前的檔案（用於更新租戶的模型或知識庫）。
+    """
+    if not tenant_registry.evict(tenant_id):
+        raise HTTPException(status_code=404, detail=f"Tenant {tenant_id} is not loaded.")
+    return {"status": "ok", "tenant_id": tenant_id}
+
+@app.get("/admin/dispatch/agents", response_model=AgentRosterResponse)
+async def get_dispatch_agents():
+    """
+    返回目前的客服人員名單、技能與未結工單數。
+    """
+    return AgentRosterResponse(source=dispatch_service.roster_source, agents=dispatch_service.get_roster())
+
+@app.put("/admin/dispatch/agents", response_model=AgentRosterResponse)
+async def set_dispatch_agents(roster: AgentRoster):
+    """
+    以請求內容取代客服人員名單（未提供未結工單數的人員沿用目前的數值）。
+    """
+    dispatch_service.set_roster(roster.agents)
+    return AgentRosterResponse(source=dispatch_service.roster_source, agents=dispatch_service.get_roster())
+
+@app.post("/admin/dispatch/agents/reload", response_model=AgentRosterResponse)
+async def reload_dispatch_agents():
+    """
+    從 DISPATCH_ROSTER_PATH（檔案或 URL）重新載入客服人員名單，失敗時保留目前名單。
+    """
+    if not await asyncio.to_thread(dispatch_service.load_roster):
+        raise HTTPException(status_code=502, detail=f"Could not load dispatch roster from {dispatch_service.roster_source}.")
+    return AgentRosterResponse(source=dispatch_service.roster_source, agents=dispatch_service.get_roster())
+
+@app.post("/admin/dispatch/load")
+async def update_dispatch_load(update: AgentLoadUpdate):
+    """
+    由後端回報各客服人員目前的未結工單數，供負載感知分派使用。
+    """
+    unknown = dispatch_service.update_open_tickets(update.open_tickets)
+    return {"status": "ok", "updated": len(update.open_tickets) - len(unknown), "unknown_agent_ids": unknown}
+
+# 'blocking' loads all artifacts before the server accepts requests; 'background'
+# accepts requests at once (models report as not loaded) while /ready returns 503.
+STARTUP_LOAD_MODE = os.getenv("STARTUP_LOAD_MODE", "blocking").lower()
+# Components that must be loaded for /ready to succeed
+READY_REQUIRED_COMPONENTS = {
+    name.strip() for name in os.getenv("READY_REQUIRED_COMPONENTS", "chatbot,sentiment,knowledge_base").split(",") if name.strip()
+}
+
+# The lambdas look the services up at call time, so replaced services are loaded too
+startup_loader = StartupLoader()
+startup_loader.add(
+    "chatbot", lambda: chatbot_service.load_model(),
+    lambda: (chatbot_service.is_model_loaded(), chatbot_service.model_version, chatbot_service.load_error),
+    "chatbot" in READY_REQUIRED_COMPONENTS
+)
+startup_loader.add(
+    "sentiment", lambda: sentiment_service.load_model(),
+    lambda: (sentiment_service.is_model_loaded(), sentiment_service.model_version, sentiment_service.load_error),
+    "sentiment" in READY_REQUIRED_COMPONENTS
+)
+startup_loader.add(
+    "knowledge_base", lambda: knowledge_base_service.load_knowledge_base(),
+    lambda: (knowledge_base_service.is_kb_loaded(), knowledge_base_service.kb_version, knowledge_base_service.load_error),
+    "knowledge_base" in READY_REQUIRED_COMPONENTS
+)
+startup_loader.add(
+    "dispatch_roster", lambda: dispatch_service.roster_source and dispatch_service.load_roster(),
+    lambda: (dispatch_service.is_roster_loaded(), None, dispatch_service.load_error),
+    "dispatch_roster" in READY_REQUIRED_COMPONENTS
+)
+
+async def load_artifacts():
+    await asyncio.to_thread(import_model_libraries)
+    await startup_loader.load_all()
+    result_cache.invalidate()
+    # Process pool workers forked before loading finished hold no models
+    if inference_executor.mode == "process":
+        inference_executor.restart()
+    model_watcher.start()
+    online_learning_service.start()
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    就緒探針：回報各元件（模型、知識庫、客服名單）的載入狀態、版本與載入耗時。
+    所有必要元件載入完成前返回 503；/health 只表示程序存活。
+    """
+    report = startup_loader.report()
+    report["mode"] = STARTUP_LOAD_MODE
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 @app.on_event("startup")
 async def startup_event():
-    """Load models at startup (optional, can also be on first request)."""
-    logger.info("Attempting to load AI models at startup...")
-    try:
-        chatbot_service.load_model()
-        sentiment_service.load_model()
-        knowledge_base_service.load_knowledge_base()
-        logger.info("AI models and knowledge base loaded successfully (if files exist).")
-    except Exception as e:
-        logger.warning(f"Could not load all AI models at startup: {e}")
-        logger.warning("Please ensure models are trained and knowledge_base.json is in the correct volume.")
+    """Loads every artifact once, concurrently; in background mode without delaying startup."""
+    logger.info(f"Loading AI models and knowledge base at startup ({STARTUP_LOAD_MODE} mode)...")
+    if STARTUP_LOAD_MODE == "background":
+        app.state.startup_task = asyncio.create_task(load_artifacts())
+    else:
+        await load_artifacts()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    startup_task = getattr(app.state, "startup_task", None)
+    if startup_task is not None and not startup_task.done():
+        startup_task.cancel()
+    await model_watcher.stop()
+    # Applies and checkpoints the corrections still queued
+    await online_learning_service.stop()
+    for batcher in micro_batchers.values():
+        await batcher.shutdown()
+    await bulk_job_service.shutdown()
+    await training_service.shutdown()
+    tenant_registry.shutdown()
+    inference_executor.shutdown()
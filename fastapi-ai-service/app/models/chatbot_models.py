@@ -8,3 +8,4 @@ class ChatbotResponse(BaseModel):
     intent: str
     reply: str
     confidence: float
+    intent_model_version: Optional[str] = None # Version of the intent model that served this request
@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict
+
+class AgentProfile(BaseModel):
+    id: int
+    name: str
+    skills: List[str] = [] # Intents the agent handles; 'all' makes the agent a generalist
+    open_tickets: Optional[int] = Field(default=None, ge=0) # Current load; kept from the previous roster if omitted
+
+class AgentRoster(BaseModel):
+    agents: List[AgentProfile]
+
+class AgentLoadUpdate(BaseModel):
+    open_tickets: Dict[int, int] # Agent ID -> number of open tickets, as tracked by the backend
+
+class AgentRosterResponse(BaseModel):
+    source: Optional[str] = None # File path or URL the roster was loaded from, None if built in or set via API
+    agents: List[AgentProfile]
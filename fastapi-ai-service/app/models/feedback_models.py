@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import Optional, Dict
+
+class FeedbackRequest(BaseModel):
+    message: str # The customer message the agent reviewed
+    intent: Optional[str] = None # Corrected intent, if the agent changed it
+    sentiment: Optional[str] = None # Corrected sentiment, if the agent changed it
+    ticket_id: Optional[int] = None
+
+class FeedbackResponse(BaseModel):
+    accepted: Dict[str, str] # Model name ('chatbot', 'sentiment') -> label queued for it
+    pending: Dict[str, int] # Corrections per model waiting for the next update
+
+class OnlineModelStatus(BaseModel):
+    model: str
+    online: bool # Whether the serving model can be updated online (hashing + SGD pipeline)
+    version: Optional[str] = None
+    pending: int = 0
+    samples_applied: int = 0 # Corrections applied since the service started
+    updates: int = 0 # Mini-batch updates swapped into serving since the service started
+    dropped: int = 0 # Corrections discarded (queue full or label unknown to the model)
+    last_update_at: Optional[float] = None # Unix timestamps
+    last_checkpoint_at: Optional[float] = None
+    checkpoint_version: Optional[str] = None # Registry version of the last checkpoint
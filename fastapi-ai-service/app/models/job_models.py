@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import Optional, List
+
+class BulkJobStatus(BaseModel):
+    job_id: str
+    status: str # 'queued', 'running', 'completed', 'failed' or 'cancelled'
+    created_at: float # Unix timestamps
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    input_bytes: int # Size of the submitted JSONL file
+    processed_bytes: int = 0 # Input bytes whose results have been written
+    progress: float = 0.0 # processed_bytes / input_bytes
+    processed: int = 0 # Records written to the output file so far
+    succeeded: int = 0
+    failed: int = 0
+    error: Optional[str] = None # Why the job failed
+    results_url: str # Results so far as JSONL, one TicketBatchItemResult per record
+
+class BulkJobList(BaseModel):
+    jobs: List[BulkJobStatus]
@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+class KnowledgeBaseSearchRequest(BaseModel):
+    query: str
+    intent: Optional[str] = None # Recognized intent, if known; an entry for it wins over keyword matches
+    top_k: int = Field(default=1, ge=0, le=50) # Number of ranked candidates to return
+
+class KnowledgeBaseCandidate(BaseModel):
+    id: Optional[str] = None
+    question: Optional[str] = None
+    answer: Optional[str] = None
+    intent_keyword: Optional[str] = None
+    score: float # BM25 relevance score, or cosine similarity for semantic matches
+
+class KnowledgeBaseSearchResponse(BaseModel):
+    answer: Optional[str] = None # Best answer, None if nothing matched
+    matched_by: Optional[str] = None # 'exact', 'intent', 'keyword' or 'semantic'
+    candidates: List[KnowledgeBaseCandidate] = []
+
+class KnowledgeBaseEntry(BaseModel):
+    id: Optional[str] = None # Generated when an entry is created without one
+    question: str
+    answer: str
+    keywords: List[str] = []
+    intent_keyword: Optional[str] = None # Intent whose messages are answered by this entry
+
+class KnowledgeBaseEntryList(BaseModel):
+    total: int
+    entries: List[KnowledgeBaseEntry]
@@ -7,3 +7,4 @@ class SentimentRequest(BaseModel):
 class SentimentResponse(BaseModel):
     sentiment: str # e.g., 'positive', 'negative', 'neutral'
     confidence: float # confidence score for the sentiment
+    sentiment_model_version: Optional[str] = None # Version of the sentiment model that served this request
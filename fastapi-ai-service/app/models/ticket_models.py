@@ -1,11 +1,17 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 
 class TicketAnalysisRequest(BaseModel):
     ticket_id: int
     message: str
     customer_id: Optional[int] = None
     existing_ticket_status: Optional[str] = 'pending' # Current status of the ticket
+    tenant_id: Optional[str] = None # Brand whose models and knowledge base analyze the message; None uses the default ones
+
+class StageTiming(BaseModel):
+    stage: str # 'sentiment', 'intent', 'knowledge_base_exact', 'knowledge_base', 'reply' or 'dispatch'
+    started_ms: float # Offset from the start of the analysis
+    duration_ms: float
 
 class TicketAnalysisResponse(BaseModel):
     ticket_id: int
@@ -17,6 +23,10 @@ class TicketAnalysisResponse(BaseModel):
     suggested_agent_id: Optional[int] = None # Suggested agent ID for dispatch
     suggested_priority: Optional[str] = None # Suggested priority: low, normal, high, urgent
     knowledge_base_answer: Optional[str] = None # Answer found in KB if any
+    sentiment_model_version: Optional[str] = None # Version of the sentiment model that served this request
+    intent_model_version: Optional[str] = None # Version of the intent model that served this request
+    stages: Optional[List[StageTiming]] = None # Stages that ran, in start order (single-message endpoint only)
+    skipped_stages: Optional[List[str]] = None # Stages that could not change the result and were skipped
 
 class TicketDispatchResponse(BaseModel):
     ticket_id: int
@@ -26,3 +36,17 @@ class TicketDispatchResponse(BaseModel):
     sentiment_confidence: float
     suggested_agent_id: Optional[int] = None
     suggested_priority: Optional[str] = None
+    sentiment_model_version: Optional[str] = None
+    intent_model_version: Optional[str] = None
+
+class TicketBatchItemResult(BaseModel):
+    index: int # Position of the item in the submitted batch
+    ticket_id: Optional[int] = None
+    status: str # 'ok' or 'error'
+    result: Optional[TicketAnalysisResponse] = None
+    error: Optional[str] = None
+
+class TicketBatchAnalysisResponse(BaseModel):
+    results: List[TicketBatchItemResult]
+    succeeded: int
+    failed: int
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any, List, Literal
+
+class TrainingRequest(BaseModel):
+    model: Literal["chatbot", "sentiment"]
+    data_path: str # Training data on the service's file system (.csv with a header row, or .jsonl)
+    pipeline: Literal["tfidf", "online"] = "tfidf" # 'online': hashing + SGD, updatable from agent feedback
+    search: bool = True # Cross-validated hyper-parameter search on all cores
+    calibration: Literal["sigmoid", "isotonic", "none"] = "sigmoid" # Confidences as calibrated probabilities
+    export_mapped: bool = False # Publish a memory-mapped artifact instead of a joblib file
+
+class TrainingRunStatus(BaseModel):
+    run_id: str
+    model: str
+    status: str # 'running', 'succeeded', 'published_not_serving' (see error) or 'failed'
+    started_at: float # Unix timestamps
+    finished_at: Optional[float] = None
+    version: Optional[str] = None # Version published by a successful run
+    training: Optional[Dict[str, Any]] = None # Training summary: samples, best parameters, CV score
+    error: Optional[str] = None
+    log_tail: List[str] = [] # Last lines of the training process output
+
+class TrainingRunList(BaseModel):
+    runs: List[TrainingRunStatus]
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterable, Deque, Dict, List, Optional, Tuple
+
+from app.models.job_models import BulkJobStatus
+from app.models.ticket_models import TicketBatchItemResult
+from app.services.ticket_analysis_service import TicketAnalysisService
+from app.utils.inference_executor import InferenceExecutor, InferenceQueueFullError
+from app.utils.metrics import REGISTRY
+from app.utils.ndjson import parse_analysis_record
+
+logger = logging.getLogger(__name__)
+
+BULK_JOB_RECORDS = REGISTRY.counter("ai_bulk_job_records_total", "Records processed by bulk re-analysis jobs.", ("status",))
+
+# How long a chunk waits before it is resubmitted when the inference queue is full
+QUEUE_FULL_RETRY_SECONDS = 0.5
+
+
+class BulkJobTooLargeError(Exception):
+    """Raised when a submitted JSONL file exceeds BULK_JOB_MAX_INPUT_MB."""
+
+
+class BulkJob:
+    """State of one bulk re-analysis job; its input and output live in files under the job directory."""
+    def __init__(self, job_id: str, job_dir: str):
+        self.job_id = job_id
+        self.input_path = os.path.join(job_dir, f"{job_id}.input.jsonl")
+        self.output_path = os.path.join(job_dir, f"{job_id}.output.jsonl")
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.input_bytes = 0
+        self.processed_bytes = 0
+        self.processed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def to_status(self) -> BulkJobStatus:
+        if self.input_bytes:
+            progress = self.processed_bytes / self.input_bytes
+        else:
+            progress = 1.0 if self.status == "completed" else 0.0
+        return BulkJobStatus(
+            job_id=self.job_id,
+            status=self.status,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            input_bytes=self.input_bytes,
+            processed_bytes=self.processed_bytes,
+            progress=progress,
+            processed=self.processed,
+            succeeded=self.succeeded,
+            failed=self.failed,
+            error=self.error,
+            results_url=f"/ai/jobs/{self.job_id}/results"
+        )
+
+
+class BulkJobService:
+    """
+    Re-analyzes large numbers of stored tickets in the background, e.g. after a new
+    intent or sentiment model has been deployed.
+
+    A job's JSONL input is streamed to disk on submission and then read back in
+    chunks of chunk_size records. Each chunk is analyzed with one vectorized
+    analyze_batch call on the inference executor, with up to parallel_chunks chunks
+    in flight, and its results are appended to the job's output file in input order.
+    Memory use is therefore bounded by chunk_size * parallel_chunks records,
+    whatever the size of the input.
+
+    Jobs do not suggest agents: the tickets were dispatched when they arrived, and
+    re-scoring them must not change the agents' open ticket counts.
+    """
+    def __init__(
+        self,
+        ticket_analysis_service: TicketAnalysisService,
+        inference_executor: InferenceExecutor,
+        job_dir: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        parallel_chunks: Optional[int] = None,
+        max_running_jobs: Optional[int] = None
+    ):
+        self.ticket_analysis_service = ticket_analysis_service
+        self.inference_executor = inference_executor
+        self.job_dir = job_dir or os.getenv("BULK_JOB_DIR", "/app/jobs_data")
+        self.chunk_size = chunk_size or int(os.getenv("BULK_JOB_CHUNK_SIZE", "256"))
+        self.parallel_chunks = parallel_chunks or int(os.getenv("BULK_JOB_PARALLEL_CHUNKS", "2"))
+        self.max_input_bytes = int(float(os.getenv("BULK_JOB_MAX_INPUT_MB", "1024")) * 1024 * 1024)
+        # Finished jobs (and their output files) kept before the oldest are deleted
+        self.max_retained_jobs = int(os.getenv("BULK_JOB_MAX_RETAINED", "100"))
+        self._running = asyncio.Semaphore(max_running_jobs or int(os.getenv("BULK_JOB_MAX_RUNNING", "1")))
+        self._jobs: Dict[str, BulkJob] = {}
+
+    async def submit(self, body: AsyncIterable[bytes]) -> BulkJob:
+        """Writes the streamed JSONL body to the job directory and queues the job."""
+        os.makedirs(self.job_dir, exist_ok=True)
+        job = BulkJob(uuid.uuid4().hex, self.job_dir)
+        try:
+            with open(job.input_path, 'wb') as f:
+                async for data in body:
+                    job.input_bytes += len(data)
+                    if job.input_bytes > self.max_input_bytes:
+                        raise BulkJobTooLargeError(f"Input exceeds {self.max_input_bytes} bytes.")
+                    f.write(data)
+        except BaseException:
+            _remove(job.input_path)
+            raise
+
+        self._jobs[job.job_id] = job
+        self._evict_finished_jobs()
+        job.task = asyncio.create_task(self._run(job))
+        logger.info(f"Bulk job {job.job_id} queued with {job.input_bytes} bytes of input")
+        return job
+
+    def get(self, job_id: str) -> Optional[BulkJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[BulkJob]:
+        return sorted(self._jobs.values(), key=lambda job: job.created_at)
+
+    async def delete(self, job_id: str) -> bool:
+        """Cancels the job if it is still running and deletes its files."""
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        await _cancel(job)
+        _remove(job.input_path)
+        _remove(job.output_path)
+        return True
+
+    async def shutdown(self):
+        for job in self._jobs.values():
+            await _cancel(job)
+
+    def analyze_lines(self, first_index: int, lines: List[bytes]) -> Tuple[bytes, int, int]:
+        """
+        Parses and analyzes one chunk of JSONL records. Returns the chunk's output
+        lines and its succeeded and failed counts. Runs on the inference executor.
+        """
+        results: List[Optional[TicketBatchItemResult]] = [None] * len(lines)
+        positions, requests = [], []
+        for position, line in enumerate(lines):
+            request, results[position] = parse_analysis_record(first_index + position, line)
+            if request is not None:
+                requests.append(request)
+                positions.append(position)
+
+        analyses = self.ticket_analysis_service.analyze_batch(requests, dispatch=False)
+        for position, request, (analysis, error) in zip(positions, requests, analyses):
+            results[position] = TicketBatchItemResult(
+                index=first_index + position,
+                ticket_id=request.ticket_id,
+                status="ok" if error is None else "error",
+                result=analysis,
+                error=error
+            )
+
+        failed = sum(1 for result in results if result.status == "error")
+        output = "".join(result.model_dump_json() + "\n" for result in results).encode("utf-8")
+        return output, len(results) - failed, failed
+
+    async def _run(self, job: BulkJob):
+        try:
+            async with self._running:
+                job.status = "running"
+                job.started_at = time.time()
+                await self._process(job)
+            job.status = "completed"
+            logger.info(f"Bulk job {job.job_id} completed: {job.succeeded} succeeded, {job.failed} failed")
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Bulk job {job.job_id} failed: {e}", exc_info=True)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            _remove(job.input_path)
+
+    async def _process(self, job: BulkJob):
+        in_flight: Deque[Tuple[asyncio.Future, int]] = deque()
+        try:
+            with open(job.input_path, 'rb') as source, open(job.output_path, 'wb') as sink:
+                next_index = 0
+                while True:
+                    lines, size = await asyncio.to_thread(_read_chunk, source, self.chunk_size)
+                    if not size:
+                        break
+                    in_flight.append((asyncio.ensure_future(self._analyze_chunk(next_index, lines)), size))
+                    next_index += len(lines)
+                    if len(in_flight) >= self.parallel_chunks:
+                        await self._write_next(job, in_flight, sink)
+                while in_flight:
+                    await self._write_next(job, in_flight, sink)
+        finally:
+            for future, _ in in_flight:
+                future.cancel()
+
+    async def _analyze_chunk(self, first_index: int, lines: List[bytes]) -> Tuple[bytes, int, int]:
+        # Interactive requests take priority: wait for queue space instead of failing the job
+        while True:
+            try:
+                return await self.inference_executor.run(self.analyze_lines, first_index, lines)
+            except InferenceQueueFullError:
+                await asyncio.sleep(QUEUE_FULL_RETRY_SECONDS)
+
+    async def _write_next(self, job: BulkJob, in_flight: Deque[Tuple[asyncio.Future, int]], sink):
+        future, size = in_flight[0]
+        output, succeeded, failed = await future
+        in_flight.popleft()
+        sink.write(output)
+        sink.flush()
+        job.processed_bytes += size
+        job.processed += succeeded + failed
+        job.succeeded += succeeded
+        job.failed += failed
+        BULK_JOB_RECORDS.inc(succeeded, status="ok")
+        BULK_JOB_RECORDS.inc(failed, status="error")
+
+    def _evict_finished_jobs(self):
+        finished = [job for job in self.list() if job.finished]
+        for job in finished[:max(0, len(finished) - self.max_retained_jobs)]:
+            del self._jobs[job.job_id]
+            _remove(job.output_path)
+
+
+def _read_chunk(source, max_records: int) -> Tuple[List[bytes], int]:
+    """Reads up to max_records non-blank lines; returns them and the number of bytes consumed."""
+    lines, size = [], 0
+    while len(lines) < max_records:
+        line = source.readline()
+        if not line:
+            break
+        size += len(line)
+        if line.strip():
+            lines.append(line)
+    return lines, size
+
+
+async def _cancel(job: BulkJob):
+    if job.task is not None and not job.task.done():
+        job.task.cancel()
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            pass
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
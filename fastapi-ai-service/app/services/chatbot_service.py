@@ -1,89 +1,54 @@
-import os
-import joblib
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import LinearSVC
-from sklearn.pipeline import Pipeline
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Optional
 import logging
-from app.utils.model_loader import load_model_from_path
+from app.services.model_service import LoadedModel, ModelService
+from app.utils.scoring import as_score_matrix
+from app.utils.featurizer import MessageFeatures
 
 logger = logging.getLogger(__name__)
 
-class ChatbotService:
-    def __init__(self):
-        self.model_path = os.getenv("MODEL_PATH_CHATBOT", "/app/models_data/trained_chatbot_model.joblib")
-        self.pipeline = None
-        self.intent_labels = []
-        self.load_model()
-        self.rule_based_replies = self._load_rule_based_replies()
-
-    def load_model(self):
-        """Loads the chatbot model from the specified path."""
-        try:
-            # For demonstration, we'll try to load, but it might not exist initially
-            self.pipeline = load_model_from_path(self.model_path)
-            # Assuming the pipeline's last step (LinearSVC) has a classes_ attribute
-            if hasattr(self.pipeline.named_steps.clf, 'classes_'):
-                self.intent_labels = self.pipeline.named_steps.clf.classes_.tolist()
-            logger.info(f"Chatbot model loaded successfully from {self.model_path}")
-        except FileNotFoundError:
-            logger.warning(f"Chatbot model file not found at {self.model_path}. Model will be trained on first run or needs manual training.")
-            self.pipeline = None
-            self.intent_labels = []
-        except Exception as e:
-            logger.error(f"Error loading chatbot model from {self.model_path}: {e}")
-            self.pipeline = None
-            self.intent_labels = []
-
-    def is_model_loaded(self):
-        return self.pipeline is not None and len(self.intent_labels) > 0
-
-    def _train_and_save_model(self, texts: list, labels: list, output_path: str):
-        """
-        Internal method to train and save a simple chatbot intent recognition model.
-        This is for initial setup/demonstration. In a real scenario, training would be
-        more sophisticated and done offline.
-        """
-        logger.info("Training chatbot model...")
-        if not texts or not labels or len(texts) != len(labels):
-            logger.error("Invalid training data provided for chatbot model.")
-            return
+class ChatbotService(ModelService):
+    model_name = "chatbot"
+    model_path_env = "MODEL_PATH_CHATBOT"
+    default_model_path = "/app/models_data/trained_chatbot_model.joblib"
+    fallback_label = "unknown" # Default to unknown intent
+    confidence_threshold_env = "INTENT_CONFIDENCE_THRESHOLD"
 
-        # Simple pipeline for text classification
-        pipeline = Pipeline([
-            ('tfidf', TfidfVectorizer(max_features=1000)),
-            ('clf', LinearSVC()) # Linear Support Vector Classification
-        ])
+    def __init__(self, load: bool = True, model_path: Optional[str] = None):
+        super().__init__(load, model_path)
+        self.rule_based_replies = self._load_rule_based_replies()
 
-        pipeline.fit(texts, labels)
-        joblib.dump(pipeline, output_path)
-        self.pipeline = pipeline
-        self.intent_labels = pipeline.named_steps.clf.classes_.tolist()
-        logger.info(f"Chatbot model trained and saved to {output_path}")
+    @property
+    def intent_labels(self) -> List[str]:
+        return self.labels
 
-    def predict_intent(self, message: str) -> Tuple[str, float]:
+    def predict_intent(
+        self,
+        message: str,
+        features: Optional[MessageFeatures] = None,
+        model: Optional[LoadedModel] = None
+    ) -> Tuple[str, float]:
         """Predicts the intent of a given message."""
-        if not self.is_model_loaded():
-            # Fallback for when model is not loaded
-            return "unknown", 0.0 # Default to unknown intent
-
-        try:
-            prediction_proba = self.pipeline.decision_function([message]) # Get scores for each class
-            predicted_idx = np.argmax(prediction_proba)
-            intent = self.intent_labels[predicted_idx]
-            confidence = float(np.max(prediction_proba)) # Use max score as confidence
-
-            # Normalize confidence if needed, or use a threshold
-            # For LinearSVC, higher score means higher confidence for that class
-            # A more robust confidence would involve Platt scaling or probability calibration
-            if confidence < 0: # If score is negative, implies low confidence
-                confidence = 0.0
-
-            return intent, confidence
-        except Exception as e:
-            logger.error(f"Error predicting intent for message '{message}': {e}")
-            return "unknown", 0.0
+        return self._predict([message], features, model)[0]
+
+    def predict_intents(
+        self,
+        messages: List[str],
+        features: Optional[MessageFeatures] = None,
+        model: Optional[LoadedModel] = None
+    ) -> List[Tuple[str, float]]:
+        """Predicts the intents of several messages with a single decision_function call."""
+        return self._predict(messages, features, model)
+
+    def _predictions_from_scores(self, decision_scores, labels: List[str]) -> List[Tuple[str, float]]:
+        """Maps a (n_samples, n_classes) decision_function matrix to (intent, confidence) pairs."""
+        scores = as_score_matrix(decision_scores)
+        predicted_idx = np.argmax(scores, axis=1)
+        # Use max score as confidence. For LinearSVC, higher score means higher confidence
+        # for that class; a negative score implies low confidence, so clip it at 0.
+        # Models trained with calibration report probabilities instead (see ModelService)
+        confidences = np.maximum(scores[np.arange(len(scores)), predicted_idx], 0.0)
+        return [(labels[idx], float(conf)) for idx, conf in zip(predicted_idx, confidences)]
 
     def _load_rule_based_replies(self) -> Dict[str, str]:
         """
@@ -1,17 +1,43 @@
+import os
+import json
 import logging
-from typing import Optional, Tuple
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from app.models.dispatch_models import AgentProfile
+from app.utils.agent_pool import Agent, AgentPool
 
 logger = logging.getLogger(__name__)
 
+# Used when no roster source is configured
+DEFAULT_ROSTER = [
+    {"id": 1, "name": "John Doe", "skills": ["technical_support", "billing_inquiry"]},
+    {"id": 2, "name": "Jane Smith", "skills": ["order_status", "product_inquiry"]},
+    {"id": 3, "name": "Admin User", "skills": ["all"]} # Admin can handle anything
+]
+
+ROSTER_FETCH_TIMEOUT_SECONDS = 5
+
+_roster_adapter = TypeAdapter(List[AgentProfile])
+
+
 class DispatchService:
-    def __init__(self):
-        # In a real application, agent IDs would come from a database.
-        # For this example, we'll use placeholder IDs and a simple mapping.
-        self.agent_skills = {
-            1: {"name": "John Doe", "skills": ["technical_support", "billing_inquiry"]},
-            2: {"name": "Jane Smith", "skills": ["order_status", "product_inquiry"]},
-            3: {"name": "Admin User", "skills": ["all"]} # Admin can handle anything
-        }
+    """
+    Suggests an agent and a priority for each ticket.
+
+    The agent roster comes from DISPATCH_ROSTER_PATH (a JSON file or an http(s)
+    URL returning a JSON array of agents) and can be replaced or reloaded at
+    runtime. Agents are picked by skill and current load: the eligible agent with
+    the fewest open tickets wins (see AgentPool). Load counts are reported by the
+    backend through update_open_tickets.
+    """
+    def __init__(self, load: bool = True):
+        """With load=False a configured roster source is read later by load_roster()."""
+        self.roster_source = os.getenv("DISPATCH_ROSTER_PATH") or None
+        self._pool = AgentPool([])
+        self.load_error: Optional[str] = None # Why the last load_roster() failed
 
         # Define priority mapping based on sentiment
         self.sentiment_priority_map = {
@@ -20,6 +46,71 @@ class DispatchService:
             "neutral": "normal"
         }
 
+        if self.roster_source:
+            if load:
+                self.load_roster()
+        else:
+            self.set_roster(_roster_adapter.validate_python(DEFAULT_ROSTER))
+
+    def is_roster_loaded(self) -> bool:
+        return len(self._pool.agents) > 0
+
+    @property
+    def agent_skills(self) -> Dict[int, Dict]:
+        return {agent.agent_id: {"name": agent.name, "skills": list(agent.skills)} for agent in self._pool.agents.values()}
+
+    def get_roster(self) -> List[AgentProfile]:
+        pool = self._pool
+        load = pool.open_tickets()
+        return [
+            AgentProfile(id=agent.agent_id, name=agent.name, skills=list(agent.skills), open_tickets=load[agent.agent_id])
+            for agent in pool.agents.values()
+        ]
+
+    def set_roster(self, agents: List[AgentProfile]):
+        """
+        Replaces the roster. Agents that keep their ID keep their open ticket count
+        unless the new profile carries one. The new pool is built completely before
+        it replaces the old one, so concurrent suggestions see either roster.
+        """
+        previous_load = self._pool.open_tickets()
+        open_tickets = {
+            agent.id: agent.open_tickets if agent.open_tickets is not None else previous_load.get(agent.id, 0)
+            for agent in agents
+        }
+        self._pool = AgentPool([Agent(agent.id, agent.name, tuple(agent.skills)) for agent in agents], open_tickets)
+        logger.info(f"Dispatch roster set with {len(agents)} agents")
+
+    def load_roster(self) -> bool:
+        """
+        Reads the roster from the configured file or URL and swaps it in. The current
+        roster is kept on any error. Returns whether a roster was loaded.
+        """
+        if not self.roster_source:
+            logger.warning("No dispatch roster source configured (DISPATCH_ROSTER_PATH).")
+            return False
+        try:
+            if self.roster_source.startswith(("http://", "https://")):
+                with urllib.request.urlopen(self.roster_source, timeout=ROSTER_FETCH_TIMEOUT_SECONDS) as response:
+                    data = json.load(response)
+            else:
+                with open(self.roster_source, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            if isinstance(data, dict):
+                data = data.get("agents")
+            agents = _roster_adapter.validate_python(data)
+        except Exception as e:
+            logger.error(f"Error loading dispatch roster from {self.roster_source}: {e}")
+            self.load_error = str(e)
+            return False
+        self.set_roster(agents)
+        self.load_error = None
+        return True
+
+    def update_open_tickets(self, loads: Dict[int, int]) -> List[int]:
+        """Records the open ticket counts of agents; returns the IDs not in the roster."""
+        return self._pool.set_open_tickets(loads)
+
     def suggest_dispatch(
         self,
         intent: str,
@@ -28,26 +119,16 @@ class DispatchService:
     ) -> Tuple[Optional[int], str]:
         """
         Suggests an agent and priority based on intent, sentiment, and current ticket status.
+        For a pending (new) ticket the suggested agent is counted as having one more
+        open ticket right away; tickets in other states are already counted.
         """
-        suggested_agent_id = None
         suggested_priority = self.sentiment_priority_map.get(sentiment, "normal")
 
-        # Basic intent-based agent assignment
-        for agent_id, agent_info in self.agent_skills.items():
-            if intent in agent_info["skills"] or "all" in agent_info["skills"]:
-                suggested_agent_id = agent_id
-                break # Assign to the first matching agent found
-
-        # If no specific agent, maybe default to a general queue or a specific agent
-        if suggested_agent_id is None:
-            # Fallback to an admin or a general agent
-            suggested_agent_id = 3 # Default to Admin User
+        # Least-loaded agent with the intent's skill, else the least-loaded generalist
+        suggested_agent_id = self._pool.select(intent, reserve=(current_status == 'pending'))
 
         # If ticket is already in progress or replied, don't downgrade priority significantly
         if current_status in ['in_progress', 'replied'] and suggested_priority in ['low', 'normal']:
              suggested_priority = 'normal' # Maintain at least normal priority for active tickets
 
-        logger.info(f"Dispatch suggestion - Intent: {intent}, Sentiment: {sentiment}, Suggested Agent: {suggested_agent_id}, Suggested Priority: {suggested_priority}")
-
         return suggested_agent_id, suggested_priority
-
@@ -1,61 +1,459 @@
 import os
 import json
 import logging
-from typing import Optional, List, Dict
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Tuple
+from app.utils.kb_index import KnowledgeBaseIndex
+from app.utils.kb_store import KnowledgeBaseLog, iter_json_array, write_json_array_atomic
+from app.utils.log_config import body
+from app.utils.model_loader import file_version
 
 logger = logging.getLogger(__name__)
 
+# keyword: BM25 only; semantic: embedding similarity only; hybrid: BM25, then
+# embedding similarity for queries without a keyword match
+RETRIEVAL_MODES = ("keyword", "semantic", "hybrid")
+
+class KnowledgeBaseEntryExistsError(Exception):
+    """Raised when an entry is created with the id of an existing entry."""
+
 class KnowledgeBaseService:
-    def __init__(self):
-        self.kb_path = os.getenv("KNOWLEDGE_BASE_PATH", "/app/knowledge_data/knowledge_base.json")
-        self.knowledge_base_data: List[Dict] = []
-        self.load_knowledge_base()
+    """
+    Serves knowledge base answers from an immutable index snapshot that is replaced
+    as a whole, so searches never see a half-updated knowledge base.
+
+    Entries can be edited one at a time (create_entry, update_entry, delete_entry).
+    An edit is appended to a change log next to the knowledge base file (see
+    app.utils.kb_store) and applied to the index incrementally; the log is replayed
+    on load and folded into the file once it holds KB_LOG_COMPACT_THRESHOLD records.
+
+    Server workers sharing the files can all edit: an edit or compaction holds the
+    log lock and first applies the records the other workers logged, so none are
+    lost. The other workers see an edit on their next reload (the model watcher also
+    watches the log), which replays only the new records.
+    """
+    def __init__(self, load: bool = True, kb_path: Optional[str] = None):
+        """kb_path overrides KNOWLEDGE_BASE_PATH; its change log is then always kept next to it."""
+        self.kb_path = kb_path or os.getenv("KNOWLEDGE_BASE_PATH", "/app/knowledge_data/knowledge_base.json")
+        self.retrieval_mode = os.getenv("KB_RETRIEVAL_MODE", "keyword").lower()
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            logger.warning(f"Unknown KB_RETRIEVAL_MODE '{self.retrieval_mode}', using keyword retrieval.")
+            self.retrieval_mode = "keyword"
+        # Cosine similarity below which a semantic match is ignored
+        self.semantic_min_score = float(os.getenv("KB_SEMANTIC_MIN_SCORE", "0.3"))
+        self.embedding_dim = int(os.getenv("KB_EMBEDDING_DIM", "128"))
+        self.ivf_min_entries = int(os.getenv("KB_IVF_MIN_ENTRIES", "50000"))
+        self.ivf_nprobe = int(os.getenv("KB_IVF_NPROBE", "8"))
+        self.vector_cache_dir = os.getenv("KB_VECTOR_CACHE_DIR") or None
+        self._log = KnowledgeBaseLog((None if kb_path else os.getenv("KNOWLEDGE_BASE_LOG_PATH")) or f"{self.kb_path}.log")
+        self.compact_threshold = int(os.getenv("KB_LOG_COMPACT_THRESHOLD", "1000"))
+        self._write_lock = threading.Lock() # Serializes loads, edits and compactions
+        self._compaction: Optional[threading.Thread] = None # Background compaction, if one was started
+        self._index = KnowledgeBaseIndex([])
+        self.base_version: Optional[str] = None # Content hash of the loaded knowledge base file
+        self.load_error: Optional[str] = None # Why the last load_knowledge_base() loaded nothing
+        if load:
+            self.load_knowledge_base()
+
+    @property
+    def kb_version(self) -> Optional[str]:
+        """Version of the served knowledge base: the file's content hash, plus the number of logged edits."""
+        return self._index.version
+
+    @property
+    def log_path(self) -> str:
+        return self._log.path
+
+    @property
+    def knowledge_base_data(self) -> List[Dict]:
+        return self._index.live()
+
+    @knowledge_base_data.setter
+    def knowledge_base_data(self, entries: List[Dict]):
+        self._publish(self._build_index(_with_ids(entries)), self.kb_version)
+
+    def _publish(self, index: KnowledgeBaseIndex, version: Optional[str]):
+        # The index is built completely before it replaces the previous one, so
+        # concurrent searches always see either the old or the new knowledge base.
+        index.version = version
+        self._index = index
+
+    def _build_index(self, entries: List[Dict]) -> KnowledgeBaseIndex:
+        return KnowledgeBaseIndex(entries, self._build_semantic_index(entries))
+
+    def _build_semantic_index(self, entries: List[Dict]):
+        """Embeds the entries for semantic retrieval, reusing the vectors of the previous index where possible."""
+        if self.retrieval_mode == "keyword" or not entries:
+            return None
+        from app.utils.kb_vectors import SemanticIndex
+
+        previous = self._index.semantic
+        try:
+            if previous is not None:
+                return previous.update(entries, dim=self.embedding_dim, ivf_min_entries=self.ivf_min_entries, cache_dir=self.vector_cache_dir)
+            return SemanticIndex.build(entries, self.embedding_dim, self.ivf_min_entries, self.ivf_nprobe, self.vector_cache_dir)
+        except Exception as e:
+            logger.error(f"Could not build the semantic knowledge base index, using keyword retrieval: {e}", exc_info=True)
+            return None
+
+    def _read(self) -> Tuple[List[Dict], str]:
+        """
+        Parses the knowledge base file entry by entry and applies the change log to
+        it. Returns the entries and the file's version.
+        """
+        version = file_version(self.kb_path)
+        with open(self.kb_path, 'r', encoding='utf-8') as f:
+            entries = _with_ids(iter_json_array(f))
+        records = self._log.read(version)
+        if records:
+            entries = _apply_records(entries, records)
+            logger.info(f"Applied {len(records)} logged knowledge base edits from {self._log.path}")
+        return entries, version
 
     def load_knowledge_base(self):
         """Loads the knowledge base from a JSON file."""
+        with self._write_lock:
+            try:
+                if os.path.exists(self.kb_path):
+                    with self._log.locked():
+                        entries, version = self._read()
+                    self.base_version = version
+                    self._publish(self._build_index(entries), self._version())
+                    self.load_error = None
+                    logger.info(f"Knowledge base loaded successfully from {self.kb_path} with {len(entries)} entries.")
+                else:
+                    logger.warning(f"Knowledge base file not found at {self.kb_path}. Please ensure it's copied to the volume.")
+                    self._reset(f"knowledge base file not found at {self.kb_path}")
+            except json.JSONDecodeError as e:
+                logger.error(f"Error decoding knowledge base JSON from {self.kb_path}: {e}")
+                self._reset(f"invalid JSON: {e}")
+            except Exception as e:
+                logger.error(f"Error loading knowledge base from {self.kb_path}: {e}")
+                self._reset(str(e))
+
+    def _reset(self, error: str):
+        self.base_version = None
+        self._publish(KnowledgeBaseIndex([]), None)
+        self.load_error = error
+
+    def reload_knowledge_base(self) -> bool:
+        """
+        Re-reads the knowledge base file and swaps it in if it parsed successfully.
+        If only the change log grew (edits made by another worker), just the new
+        records are applied. Unlike load_knowledge_base, the serving knowledge base is
+        kept on any error. Returns whether a new version was swapped in.
+        """
+        with self._write_lock:
+            try:
+                with self._log.locked():
+                    if file_version(self.kb_path) == self.base_version:
+                        records = self._log.read_new()
+                        if records is not None:
+                            if not records:
+                                return False
+                            self._change_index(records)
+                            logger.info(f"Applied {len(records)} knowledge base edits of other workers from {self._log.path}")
+                            return True
+                    entries, version = self._read()
+            except Exception as e:
+                logger.error(f"Rejected knowledge base reload from {self.kb_path}: {e}")
+                return False
+
+            self.base_version = version
+            self._publish(self._build_index(entries), self._version())
+            logger.info(f"Knowledge base {version} reloaded from {self.kb_path} with {len(entries)} entries.")
+            return True
+
+    def _version(self) -> Optional[str]:
+        if self.base_version is None or not self._log.records:
+            return self.base_version
+        return f"{self.base_version}+{self._log.records}"
+
+    def get_entry(self, entry_id: str) -> Optional[Dict]:
+        index = self._index
+        doc_id = index.ids.get(entry_id)
+        return index.entries[doc_id] if doc_id is not None else None
+
+    def list_entries(self, offset: int = 0, limit: int = 100) -> Tuple[int, List[Dict]]:
+        """(total number of entries, the entries in [offset, offset + limit))."""
+        entries = self._index.live()
+        return len(entries), entries[offset:offset + limit]
+
+    def create_entry(self, entry: Dict) -> Dict:
+        """Adds an entry; an id is generated unless the entry has one."""
+        entry = {**entry, "id": str(entry.get("id") or uuid.uuid4().hex[:12])}
+        with self._editing():
+            if entry["id"] in self._index.ids:
+                raise KnowledgeBaseEntryExistsError(f"Knowledge base entry {entry['id']} already exists.")
+            self._apply([{"op": "upsert", "entry": entry}])
+        return entry
+
+    def update_entry(self, entry_id: str, entry: Dict) -> Optional[Dict]:
+        """Replaces an entry, keeping its position. Returns None if there is no such entry."""
+        entry = {**entry, "id": entry_id}
+        with self._editing():
+            if entry_id not in self._index.ids:
+                return None
+            self._apply([{"op": "upsert", "entry": entry}])
+        return entry
+
+    def delete_entry(self, entry_id: str) -> bool:
+        with self._editing():
+            if entry_id not in self._index.ids:
+                return False
+            self._apply([{"op": "delete", "id": entry_id}])
+        return True
+
+    @contextmanager
+    def _editing(self):
+        """
+        Holds the write lock and the log lock, with the edits other workers logged
+        meanwhile applied, so checks and edits see the current knowledge base.
+        """
+        with self._write_lock:
+            if self.base_version is None:
+                raise RuntimeError("Knowledge base not loaded.")
+            with self._log.locked():
+                self._catch_up()
+                yield
+
+    def _catch_up(self):
+        """Applies the edits other workers logged. Called with both locks held."""
+        records = self._log.read_new()
+        if records is None:
+            # Another worker compacted the log into the file
+            entries, self.base_version = self._read()
+            self._publish(self._build_index(entries), self._version())
+        elif records:
+            self._change_index(records)
+
+    def _apply(self, records: List[Dict]):
+        """Logs edit records, then swaps in an index with them applied. Called within _editing()."""
+        self._log.append(records)
+        self._change_index(records)
+
+        if self._log.records >= self.compact_threshold and not (self._compaction and self._compaction.is_alive()):
+            self._compaction = threading.Thread(target=self._compact_in_background, name="kb-compaction", daemon=True)
+            self._compaction.start()
+
+    def _change_index(self, records: List[Dict]):
+        """Swaps in an index with logged records applied, in order, without rebuilding it."""
+        previous = index = self._index
+        changed_positions = set()
+        for record in records:
+            if record.get("op") == "upsert":
+                index = index.with_changes([record["entry"]], [])
+                changed_positions.add(index.ids[record["entry"]["id"]])
+            elif record.get("op") == "delete" and record["id"] in index.ids:
+                changed_positions.add(index.ids[record["id"]])
+                index = index.with_changes([], [record["id"]])
+        if previous.semantic is not None:
+            try:
+                index.semantic = previous.semantic.with_changes(
+                    {position: index.entries[position] for position in changed_positions}, index.entries,
+                    dim=self.embedding_dim, ivf_min_entries=self.ivf_min_entries
+                )
+            except Exception as e:
+                logger.error(f"Could not update the semantic knowledge base index, using keyword retrieval: {e}", exc_info=True)
+        self._publish(index, self._version())
+
+    def _compact_in_background(self):
         try:
-            if os.path.exists(self.kb_path):
-                with open(self.kb_path, 'r', encoding='utf-8') as f:
-                    self.knowledge_base_data = json.load(f)
-                logger.info(f"Knowledge base loaded successfully from {self.kb_path} with {len(self.knowledge_base_data)} entries.")
-            else:
-                logger.warning(f"Knowledge base file not found at {self.kb_path}. Please ensure it's copied to the volume.")
-                self.knowledge_base_data = []
-        except json.JSONDecodeError as e:
-            logger.error(f"Error decoding knowledge base JSON from {self.kb_path}: {e}")
-            self.knowledge_base_data = []
-        except Exception as e:
-            logger.error(f"Error loading knowledge base from {self.kb_path}: {e}")
-            self.knowledge_base_data = []
+            self.compact()
+        finally:
+            self._compaction = None
+
+    def compact(self) -> bool:
+        """
+        Writes the current entries, including the edits other workers logged, to the
+        knowledge base file and starts an empty change log for it. Returns whether
+        there was anything to compact.
+        """
+        with self._write_lock:
+            if self.base_version is None:
+                return False
+            try:
+                with self._log.locked():
+                    self._catch_up()
+                    if not self._log.records:
+                        return False
+                    entries = self._index.live()
+                    write_json_array_atomic(self.kb_path, entries)
+                    self.base_version = file_version(self.kb_path)
+                    self._log.reset(self.base_version)
+                # Rebuilding also drops the slots of deleted entries; the vectors are reused
+                self._publish(self._build_index(entries), self._version())
+                logger.info(f"Compacted the knowledge base log into {self.kb_path} ({len(entries)} entries)")
+                return True
+            except Exception as e:
+                logger.error(f"Knowledge base compaction failed, edits stay in the log: {e}", exc_info=True)
+                return False
 
     def is_kb_loaded(self):
-        return len(self.knowledge_base_data) > 0
+        # Called on every request: the index counts its live entries, knowledge_base_data copies them
+        return len(self._index) > 0
 
     def search_knowledge_base(self, query: str, intent: Optional[str] = None) -> Optional[str]:
         """
         Searches the knowledge base for a relevant answer based on the query and optional intent.
-        This is a very simple keyword-based search. For production, consider using
-        vector embeddings, Elasticsearch, or a proper RAG (Retrieval-Augmented Generation) system.
+        An entry whose question the query repeats exactly wins, then an entry registered
+        for the recognized intent; otherwise the best match
+        of the configured retrieval mode (BM25 keywords and/or embedding similarity)
+        is returned.
         """
-        if not self.is_kb_loaded():
-            return None
+        return self.search_batch([query], [intent])[0]
+
+    def exact_answer(self, query: str) -> Optional[str]:
+        """
+        The answer of the entry whose question the query repeats word for word, if any.
+        Such a match does not depend on the intent, so callers can use it before the
+        message is classified.
+        """
+        index = self._index
+        doc_id = index.lookup_question(query)
+        return index.entries[doc_id].get("answer") if doc_id is not None else None
+
+    def search_batch(self, queries: List[str], intents: Optional[List[Optional[str]]] = None) -> List[Optional[str]]:
+        """
+        Answers several queries at once, as search_knowledge_base does for one. The
+        queries without an intent entry are embedded and scored together, with one
+        matrix product in semantic retrieval modes.
+        """
+        index = self._index # Snapshot, in case the knowledge base is reloaded meanwhile
+        answers: List[Optional[str]] = [None] * len(queries)
+        if len(index) == 0:
+            return answers
+        intents = intents or [None] * len(queries)
 
-        # Normalize query for search
-        query_lower = query.lower()
+        unmatched = []
+        for position, (query, intent) in enumerate(zip(queries, intents)):
+            doc_id = index.lookup_question(query)
+            if doc_id is not None:
+                logger.info("KB exact question match for query: %s", body(query))
+                answers[position] = index.entries[doc_id].get("answer")
+                continue
+            # Prioritize exact intent match if provided
+            if intent and intent != "unknown":
+                doc_id = index.lookup_intent(intent)
+                if doc_id is not None:
+                    logger.info("KB match by intent '%s' for query: %s", intent, body(query))
+                    answers[position] = index.entries[doc_id].get("answer")
+                    continue
+            unmatched.append(position)
+
+        # Fallback to ranked retrieval across questions/keywords
+        ranked = self._rank(index, [queries[position] for position in unmatched], top_k=1)
+        for position, (results, matched_by) in zip(unmatched, ranked):
+            if results:
+                doc_id, score = results[0]
+                logger.info("KB match by %s (score %.2f) for query: %s", matched_by, score, body(queries[position]))
+                answers[position] = index.entries[doc_id].get("answer")
+        return answers
+
+    def search_top_k(
+        self,
+        query: str,
+        intent: Optional[str] = None,
+        top_k: int = 1
+    ) -> Tuple[Optional[Dict], Optional[str], List[Tuple[Dict, float]]]:
+        """
+        Returns (best entry, how it was matched, ranked candidates). The best entry is
+        the one registered for the intent if there is one, else the top ranked match;
+        candidates are the top_k matches with their BM25 scores, or cosine
+        similarities when they were matched semantically.
+        """
+        index = self._index # Snapshot, in case the knowledge base is reloaded meanwhile
+        if len(index) == 0:
+            return None, None, []
+
+        results, matched_by = self._rank(index, [query], top_k)[0]
+        candidates = [(index.entries[doc_id], score) for doc_id, score in results]
+
+        doc_id = index.lookup_question(query)
+        if doc_id is not None:
+            logger.info("KB exact question match for query: %s", body(query))
+            return index.entries[doc_id], "exact", candidates
 
         # Prioritize exact intent match if provided
         if intent and intent != "unknown":
-            for entry in self.knowledge_base_data:
-                if entry.get("intent_keyword", "").lower() == intent.lower():
-                    logger.info(f"KB match by intent '{intent}' for query: '{query}'")
-                    return entry.get("answer")
-
-        # Fallback to keyword search across questions/keywords
-        for entry in self.knowledge_base_data:
-            keywords = [entry.get("question", "").lower()] + [kw.lower() for kw in entry.get("keywords", [])]
-            for keyword in keywords:
-                if keyword in query_lower or query_lower in keyword:
-                    logger.info(f"KB match by keyword '{keyword}' for query: '{query}'")
-                    return entry.get("answer")
-
-        return None
+            doc_id = index.lookup_intent(intent)
+            if doc_id is not None:
+                logger.info("KB match by intent '%s' for query: %s", intent, body(query))
+                return index.entries[doc_id], "intent", candidates
+
+        # Fallback to ranked retrieval across questions/keywords
+        if candidates:
+            best_entry, best_score = candidates[0]
+            logger.info("KB match by %s (score %.2f) for query: %s", matched_by, best_score, body(query))
+            return best_entry, matched_by, candidates
+
+        return None, None, []
+
+    def _rank(
+        self,
+        index: KnowledgeBaseIndex,
+        queries: List[str],
+        top_k: int
+    ) -> List[Tuple[List[Tuple[int, float]], Optional[str]]]:
+        """Per query, the top_k (entry id, score) pairs of the retrieval mode and 'keyword' or 'semantic'."""
+        ranked: List[Tuple[List[Tuple[int, float]], Optional[str]]] = [([], None)] * len(queries)
+        if top_k <= 0 or not queries:
+            return ranked
+        # Keyword retrieval serves every mode while the semantic index is unavailable
+        mode = self.retrieval_mode if index.semantic is not None else "keyword"
+
+        semantic_positions = list(range(len(queries)))
+        if mode != "semantic":
+            semantic_positions = []
+            for position, query in enumerate(queries):
+                results = index.search(query, top_k)
+                if results:
+                    ranked[position] = (results, "keyword")
+                elif mode == "hybrid":
+                    semantic_positions.append(position)
+
+        if semantic_positions:
+            semantic_results = index.semantic.search_batch([queries[position] for position in semantic_positions], top_k)
+            for position, results in zip(semantic_positions, semantic_results):
+                results = [(doc_id, score) for doc_id, score in results if score >= self.semantic_min_score]
+                if results:
+                    ranked[position] = (results, "semantic")
+        return ranked
+
+
+def _with_ids(entries) -> List[Dict]:
+    """
+    The entries with an "id" each. Entries without one get their position in the
+    file, which stays stable until the file is rewritten (compaction stores the ids).
+    """
+    result = []
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"knowledge base entry {position} is not an object")
+        if entry.get("id") is None:
+            entry = {**entry, "id": str(position)}
+        elif not isinstance(entry["id"], str):
+            entry = {**entry, "id": str(entry["id"])}
+        result.append(entry)
+    return result
+
+
+def _apply_records(entries: List[Dict], records: List[Dict]) -> List[Dict]:
+    """Replays change log records onto a list of entries."""
+    slots: List[Optional[Dict]] = list(entries)
+    positions = {entry["id"]: position for position, entry in enumerate(entries)}
+    for record in records:
+        if record.get("op") == "upsert":
+            entry = record["entry"]
+            if entry["id"] in positions:
+                slots[positions[entry["id"]]] = entry
+            else:
+                positions[entry["id"]] = len(slots)
+                slots.append(entry)
+        elif record.get("op") == "delete":
+            position = positions.pop(record["id"], None)
+            if position is not None:
+                slots[position] = None
+    return [entry for entry in slots if entry is not None]
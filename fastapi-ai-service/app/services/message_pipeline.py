@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from app.models.ticket_models import StageTiming, TicketAnalysisRequest, TicketAnalysisResponse
+from app.services.ticket_analysis_service import TicketAnalysisService
+from app.utils.inference_executor import InferenceExecutor
+from app.utils.log_config import body
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# (label, confidence, model version) of one message, as returned by the single-message classifiers
+Prediction = Tuple[str, float, Optional[str]]
+# (sentiment, intent) predictions of one message from a single classification
+MessageClassification = Tuple[Prediction, Prediction]
+
+
+class StageTrace:
+    """Records which stages of one analysis ran, when they started and how long they took."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[StageTiming] = []
+        self.skipped: List[str] = []
+
+    async def run(self, stage: str, compute: Callable[[], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        try:
+            return await compute()
+        finally:
+            self._record(stage, started)
+
+    def run_inline(self, stage: str, compute: Callable[[], T]) -> T:
+        started = time.perf_counter()
+        try:
+            return compute()
+        finally:
+            self._record(stage, started)
+
+    def skip(self, stage: str):
+        self.skipped.append(stage)
+
+    def _record(self, stage: str, started: float):
+        self.stages.append(StageTiming(
+            stage=stage,
+            started_ms=round((started - self.started) * 1000, 3),
+            duration_ms=round((time.perf_counter() - started) * 1000, 3)
+        ))
+
+    def apply(self, response: TicketAnalysisResponse) -> TicketAnalysisResponse:
+        response.stages = sorted(self.stages, key=lambda timing: timing.started_ms)
+        response.skipped_stages = list(self.skipped)
+        return response
+
+
+class MessagePipeline:
+    """
+    Analyzes one incoming message as a small dependency graph of stages:
+
+        sentiment ───────────────────────────────────────┐
+        intent ──────────┬──> knowledge_base ──> reply ──┼──> response ──> dispatch
+        knowledge_base_exact ─(hit: skip both)───────────┘
+
+    sentiment and intent do not depend on each other: both read one classification
+    of the message, run on the inference executor (through the single-message
+    micro-batcher), so the message is featurized once for both models. The knowledge
+    base search needs the intent, whose registered entry wins over ranked matches,
+    so it starts once the intent is known. A message that repeats a knowledge base
+    question word for word is answered by that entry whatever the intent, so the
+    exact lookup runs first, in the serving process, and a hit skips the search and
+    the reply stage; the reply stage is likewise skipped when the search answered or
+    the intent is unknown. Dispatch updates the agents' load counters and runs per
+    ticket in dispatch(), after the analysis, which may be shared between identical
+    messages.
+
+    Every response lists the stages that ran, with their start offsets and
+    durations, and the stages that were skipped.
+    """
+    def __init__(
+        self,
+        ticket_analysis_service: TicketAnalysisService,
+        inference_executor: InferenceExecutor,
+        classify: Callable[[str], Awaitable[MessageClassification]]
+    ):
+        self.ticket_analysis_service = ticket_analysis_service
+        self.inference_executor = inference_executor
+        self.classify = classify
+
+    async def analyze(self, request: TicketAnalysisRequest) -> TicketAnalysisResponse:
+        """Runs every stage but dispatch; errors of any stage are raised to the caller."""
+        logger.info("Processing incoming message for ticket %s: %s", request.ticket_id, body(request.message))
+        analysis = self.ticket_analysis_service
+        trace = StageTrace()
+        classification = asyncio.ensure_future(self.classify(request.message))
+
+        async def prediction(index: int) -> Prediction:
+            return (await classification)[index]
+
+        sentiment_task = asyncio.ensure_future(trace.run("sentiment", lambda: prediction(0)))
+        try:
+            kb_answer = None
+            kb_loaded = analysis.knowledge_base_service.is_kb_loaded()
+            if kb_loaded:
+                kb_answer = trace.run_inline(
+                    "knowledge_base_exact", lambda: analysis.knowledge_base_service.exact_answer(request.message)
+                )
+
+            intent, intent_confidence, intent_version = await trace.run("intent", lambda: prediction(1))
+            logger.info("Intent recognition: %s (%.2f)", intent, intent_confidence)
+
+            if kb_answer:
+                trace.skip("knowledge_base")
+            elif kb_loaded:
+                kb_answer = await trace.run("knowledge_base", lambda: self.inference_executor.run(
+                    analysis.search_knowledge_base, request.message, intent
+                ))
+            else:
+                analysis.search_knowledge_base(request.message, intent) # Counts the fallback
+                trace.skip("knowledge_base_exact")
+                trace.skip("knowledge_base")
+
+            if kb_answer or intent == "unknown":
+                trace.skip("reply")
+                ai_reply = kb_answer
+            else:
+                ai_reply = trace.run_inline("reply", lambda: analysis.generate_reply(intent, request.message))
+
+            sentiment, sentiment_confidence, sentiment_version = await sentiment_task
+            logger.info("Sentiment analysis: %s (%.2f)", sentiment, sentiment_confidence)
+        finally:
+            for task in (sentiment_task, classification):
+                if not task.done():
+                    task.cancel()
+
+        response = TicketAnalysisResponse(
+            ticket_id=request.ticket_id,
+            sentiment=sentiment,
+            sentiment_confidence=sentiment_confidence,
+            intent=intent,
+            intent_confidence=intent_confidence,
+            ai_reply=ai_reply,
+            knowledge_base_answer=kb_answer,
+            sentiment_model_version=sentiment_version,
+            intent_model_version=intent_version
+        )
+        return trace.apply(response)
+
+    def dispatch(self, request: TicketAnalysisRequest, analysis: TicketAnalysisResponse) -> TicketAnalysisResponse:
+        """
+        Copies a (possibly shared) analysis for this ticket and applies dispatch to the
+        copy, recording the dispatch stage after the analysis stages.
+        """
+        response = analysis.model_copy(update={"ticket_id": request.ticket_id, "stages": list(analysis.stages or [])})
+        started = time.perf_counter()
+        self.ticket_analysis_service.apply_dispatch(request, response)
+        finished = time.perf_counter()
+        # Dispatch follows the analysis, which may have been computed for another ticket
+        analysis_ms = max((timing.started_ms + timing.duration_ms for timing in response.stages), default=0.0)
+        response.stages.append(StageTiming(
+            stage="dispatch", started_ms=analysis_ms, duration_ms=round((finished - started) * 1000, 3)
+        ))
+        return response
@@ -0,0 +1,270 @@
+import os
+import threading
+import numpy as np
+from typing import Any, List, NamedTuple, Optional, Tuple
+import logging
+from app.utils.model_loader import load_model_from_path, file_version, calibration_path, manifest_version
+from app.utils.calibration import ScoreCalibrator, load_calibrator
+from app.utils.featurizer import MessageFeatures, decision_scores
+from app.utils.linear_engine import CompiledLinearModel, compile_pipeline
+from app.utils.log_config import body
+from app.utils.metrics import MODEL_FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+# Text used to validate a freshly loaded model before it is swapped into serving
+SMOKE_TEST_MESSAGE = "hello, I need help with my order"
+
+
+class LoadedModel(NamedTuple):
+    """An immutable snapshot of a loaded model. Services swap whole snapshots."""
+    pipeline: Any
+    labels: List[str]
+    version: Optional[str] # Content hash of the model file
+    engine: Optional[CompiledLinearModel] = None # Compiled scorer, when compiled inference is enabled
+    calibrator: Optional[ScoreCalibrator] = None # Maps scores to probabilities, when the model was calibrated
+
+
+class ModelService:
+    """
+    Base class for services that serve a text classification pipeline
+    (vectorizer + linear classifier) loaded from a joblib file.
+
+    With COMPILED_INFERENCE=true, each loaded pipeline is also compiled into a
+    CompiledLinearModel, which produces identical scores without sklearn's
+    per-call validation and dispatch overhead.
+
+    A model trained with calibration (see app.utils.training) reports calibrated
+    class probabilities as confidences, computed from the same decision_function
+    output. Predictions below the service's confidence threshold (env
+    confidence_threshold_env, 0 disables it) fall back to fallback_label.
+
+    The loaded pipeline, its labels and its version are kept together in one
+    LoadedModel snapshot. A request reads the snapshot once and uses it to the end,
+    so replacing it (reload_model) is an atomic reference swap: in-flight requests
+    finish on the old model while new requests get the new one.
+    """
+    model_name = "model" # Used in log messages
+    model_path_env = ""
+    default_model_path = ""
+    fallback_label = "unknown" # Returned when the model is not loaded or fails
+    confidence_threshold_env = ""
+
+    def __init__(self, load: bool = True, model_path: Optional[str] = None):
+        """
+        With load=False the model is loaded later by an explicit load_model() call.
+        model_path overrides the path configured by model_path_env.
+        """
+        self.model_path = model_path or os.getenv(self.model_path_env, self.default_model_path)
+        self.compiled_inference = os.getenv("COMPILED_INFERENCE", "false").lower() in ("1", "true", "yes")
+        self.confidence_threshold = float(os.getenv(self.confidence_threshold_env, "0")) if self.confidence_threshold_env else 0.0
+        self._model: Optional[LoadedModel] = None
+        self._swap_lock = threading.Lock() # Serializes swaps that depend on the snapshot they replace
+        self.load_error: Optional[str] = None # Why the last load_model() left the service unloaded
+        if load:
+            self.load_model()
+
+    @property
+    def pipeline(self):
+        model = self._model
+        return model.pipeline if model else None
+
+    @property
+    def labels(self) -> List[str]:
+        model = self._model
+        return model.labels if model else []
+
+    @property
+    def model_version(self) -> Optional[str]:
+        model = self._model
+        return model.version if model else None
+
+    @property
+    def inference_engine(self) -> str:
+        model = self._model
+        return "compiled" if model is not None and model.engine is not None else "sklearn"
+
+    def current_model(self) -> Optional[LoadedModel]:
+        """Returns the snapshot currently used for serving, or None if nothing is loaded."""
+        model = self._model
+        return model if model is not None and model.labels else None
+
+    def is_model_loaded(self):
+        return self.current_model() is not None
+
+    def load_model(self):
+        """Loads the model from the configured path, leaving the service unloaded on failure."""
+        try:
+            # For demonstration, we'll try to load, but it might not exist initially
+            self._model = self._load_snapshot(self.model_path)
+            self.load_error = None
+            logger.info(f"{self.model_name.capitalize()} model {self._model.version} loaded successfully from {self.model_path}")
+        except FileNotFoundError:
+            logger.warning(f"{self.model_name.capitalize()} model file not found at {self.model_path}. Model will be trained on first run or needs manual training.")
+            self._model = None
+            self.load_error = f"model file not found at {self.model_path}"
+        except Exception as e:
+            logger.error(f"Error loading {self.model_name} model from {self.model_path}: {e}")
+            self._model = None
+            self.load_error = str(e)
+
+    def reload_model(self, model_path: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        Loads a new model artifact next to the serving one, validates it with a smoke
+        prediction and swaps it in atomically. The serving model is kept on failure.
+        Returns (swapped, message).
+        """
+        path = model_path or self.model_path
+        try:
+            candidate = self._load_snapshot(path)
+            current = self._model
+            if current is not None and current.version == candidate.version:
+                return False, f"{self.model_name} model {candidate.version} is already serving"
+            self._validate(candidate)
+        except Exception as e:
+            logger.error(f"Rejected {self.model_name} model reload from {path}: {e}")
+            return False, f"{self.model_name} model reload failed: {e}"
+
+        with self._swap_lock:
+            previous_version = self.model_version
+            self.model_path = path
+            self._model = candidate
+        logger.info(f"Swapped {self.model_name} model {previous_version} -> {candidate.version}")
+        return True, f"{self.model_name} model {candidate.version} is now serving"
+
+    def swap_model(self, candidate: LoadedModel, expected: LoadedModel) -> bool:
+        """
+        Validates a model derived in memory from the expected snapshot (e.g. by an
+        online update) and swaps it in, unless another model was swapped in since.
+        Returns whether it was swapped in; raises if validation fails.
+        """
+        self._validate(candidate)
+        with self._swap_lock:
+            if self._model is not expected:
+                return False
+            self._model = candidate
+        return True
+
+    def _load_snapshot(self, path: str) -> LoadedModel:
+        pipeline = load_model_from_path(path)
+        labels = self._labels_of(pipeline)
+        calibrator = self._load_calibrator(path, labels)
+        # A registry version names its calibration too, and is what training runs report
+        version = manifest_version(path)
+        if version is None:
+            version = file_version(path)
+            if calibrator is not None:
+                # Calibration changes the confidences, so it is part of the version cached results are keyed by
+                version = f"{version}-{calibrator.version}"
+        return LoadedModel(pipeline, labels, version, self._compile(pipeline), calibrator)
+
+    def _load_calibrator(self, path: str, labels: List[str]) -> Optional[ScoreCalibrator]:
+        try:
+            calibrator = load_calibrator(calibration_path(path))
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable {self.model_name} calibration for {path}: {e}")
+            return None
+        if calibrator is not None and calibrator.classes != labels:
+            logger.warning(f"Ignoring {self.model_name} calibration for {path}: its classes do not match the model")
+            return None
+        return calibrator
+
+    def _compile(self, pipeline) -> Optional[CompiledLinearModel]:
+        return compile_pipeline(pipeline) if self.compiled_inference else None
+
+    @staticmethod
+    def _labels_of(pipeline) -> List[str]:
+        # Assuming the pipeline's last step (LinearSVC) has a classes_ attribute
+        classifier = pipeline.named_steps.clf
+        return [str(label) for label in classifier.classes_] if hasattr(classifier, 'classes_') else []
+
+    def _validate(self, candidate: LoadedModel):
+        """Raises if the candidate cannot produce a sane prediction."""
+        if not candidate.labels:
+            raise ValueError("model has no class labels")
+        scores = np.asarray(candidate.pipeline.decision_function([SMOKE_TEST_MESSAGE]), dtype=float)
+        expected_width = 1 if len(candidate.labels) == 2 else len(candidate.labels)
+        if scores.shape[0] != 1 or scores.reshape(1, -1).shape[1] != expected_width:
+            raise ValueError(f"smoke prediction has unexpected shape {scores.shape}")
+        if not np.all(np.isfinite(scores)):
+            raise ValueError("smoke prediction is not finite")
+        if candidate.engine is not None and not np.array_equal(candidate.engine.decision_function([SMOKE_TEST_MESSAGE]), scores):
+            raise ValueError("compiled engine disagrees with the pipeline on the smoke prediction")
+        if candidate.calibrator is not None and not np.all(np.isfinite(candidate.calibrator.predict_proba(scores))):
+            raise ValueError("calibrated smoke prediction is not finite")
+
+    def _train_and_save_model(self, texts: list, labels: list, output_path: str):
+        """
+        Internal method to train and save a simple text classification model in this
+        process. This is for initial setup/demonstration; production models are trained
+        offline with `python -m app.utils.training` or POST /admin/models/train.
+        """
+        from app.utils.training import build_pipeline, save_joblib_atomic
+
+        logger.info(f"Training {self.model_name} model...")
+        if not texts or not labels or len(texts) != len(labels):
+            logger.error(f"Invalid training data provided for {self.model_name} model.")
+            return
+
+        pipeline = build_pipeline()
+        pipeline.fit(texts, labels)
+        save_joblib_atomic(pipeline, output_path)
+        self._model = LoadedModel(pipeline, self._labels_of(pipeline), file_version(output_path), self._compile(pipeline))
+        logger.info(f"{self.model_name.capitalize()} model trained and saved to {output_path}")
+
+    def _predict(
+        self,
+        messages: List[str],
+        features: Optional[MessageFeatures] = None,
+        model: Optional[LoadedModel] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Scores messages with one decision_function call on a single model snapshot.
+        If the batched call fails, each message is retried on its own so that one
+        problematic message only falls back for itself.
+        """
+        model = model or self.current_model()
+        if model is None:
+            MODEL_FALLBACKS.inc(len(messages), component=self.model_name, reason="not_loaded")
+            return [(self.fallback_label, 0.0) for _ in messages]
+        if not messages:
+            return []
+
+        try:
+            scores = decision_scores(model.pipeline, messages, features, model.engine)
+            if model.calibrator is not None:
+                predictions = self._predictions_from_probabilities(model.calibrator.predict_proba(scores), model.labels)
+            else:
+                predictions = self._predictions_from_scores(scores, model.labels)
+            return self._apply_confidence_threshold(predictions)
+        except Exception as e:
+            if len(messages) == 1:
+                logger.error("Error running %s model on message %s: %s", self.model_name, body(messages[0]), e)
+                MODEL_FALLBACKS.inc(component=self.model_name, reason="error")
+                return [(self.fallback_label, 0.0)]
+            logger.error(f"Error running {self.model_name} model on a batch of {len(messages)} messages: {e}")
+            return [self._predict([message], model=model)[0] for message in messages]
+
+    def _predictions_from_scores(self, decision_scores, labels: List[str]) -> List[Tuple[str, float]]:
+        """Maps an uncalibrated decision_function result to (label, confidence) pairs."""
+        raise NotImplementedError
+
+    @staticmethod
+    def _predictions_from_probabilities(probabilities: np.ndarray, labels: List[str]) -> List[Tuple[str, float]]:
+        """Most probable label and its probability per row of a calibrated probability matrix."""
+        predicted_idx = np.argmax(probabilities, axis=1)
+        confidences = probabilities[np.arange(len(probabilities)), predicted_idx]
+        return [(labels[idx], float(conf)) for idx, conf in zip(predicted_idx, confidences)]
+
+    def _apply_confidence_threshold(self, predictions: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+        """Replaces predictions below the confidence threshold by the fallback label, keeping their confidence."""
+        if self.confidence_threshold <= 0:
+            return predictions
+        low_confidence = sum(1 for _, confidence in predictions if confidence < self.confidence_threshold)
+        if not low_confidence:
+            return predictions
+        MODEL_FALLBACKS.inc(low_confidence, component=self.model_name, reason="low_confidence")
+        return [
+            (self.fallback_label, confidence) if confidence < self.confidence_threshold else (label, confidence)
+            for label, confidence in predictions
+        ]
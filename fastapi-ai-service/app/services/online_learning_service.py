@@ -0,0 +1,281 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.models.feedback_models import OnlineModelStatus
+from app.services.model_service import LoadedModel, ModelService
+from app.utils.metrics import REGISTRY
+from app.utils.model_loader import MANIFEST_FILE
+
+logger = logging.getLogger(__name__)
+
+ONLINE_FEEDBACK = REGISTRY.counter(
+    "ai_online_feedback_total", "Agent corrections received for online learning, by model and outcome.", ("model", "outcome")
+)
+ONLINE_UPDATES = REGISTRY.counter(
+    "ai_online_updates_total", "Online mini-batch updates swapped into serving.", ("model",)
+)
+ONLINE_CHECKPOINTS = REGISTRY.counter(
+    "ai_online_checkpoints_total", "Online model checkpoints published to the model registry.", ("model",)
+)
+
+
+class OnlineLearningUnavailableError(Exception):
+    """Raised when feedback is sent for a model that cannot be updated online."""
+
+
+class UnknownLabelError(Exception):
+    """Raised when a correction names a label the serving model does not know."""
+
+
+class _OnlineModel:
+    """Feedback queue and update statistics of one model."""
+    def __init__(self, service: ModelService):
+        self.service = service
+        self.pending: Deque[Tuple[str, str]] = deque() # (message, corrected label)
+        self.lock = threading.Lock() # One update or checkpoint at a time
+        self.samples_applied = 0
+        self.updates = 0
+        self.updates_since_checkpoint = 0
+        self.dropped = 0
+        self.last_update_at: Optional[float] = None
+        self.last_checkpoint_at = time.time()
+        self.checkpoint_version: Optional[str] = None
+
+
+class OnlineLearningService:
+    """
+    Keeps the intent and sentiment models learning from agent corrections without a
+    full retrain.
+
+    Online learning needs a model trained with the online pipeline (hashing
+    featurizer + SGD classifier, `--pipeline online` in app.utils.training): the
+    hashing featurizer is stateless, so corrections never require refitting a
+    vocabulary, and the classifier's partial_fit continues from the fitted weights.
+
+    submit() only queues a correction. A background task applies the queued
+    corrections every update_interval seconds, or as soon as batch_size of them are
+    waiting, in a worker thread: it copies the serving classifier, runs partial_fit
+    over the corrections in mini-batches of batch_size and swaps the result into
+    serving like a reload (requests in flight finish on the previous weights). The
+    updated model is published to the model registry every checkpoint_interval
+    seconds and at shutdown, and the service switches to that registry version, so
+    a restart continues from the last checkpoint. Corrections are also appended to
+    ONLINE_FEEDBACK_LOG_DIR/<model>.jsonl, when set, in the training data format
+    for the next full retrain.
+
+    Online learning needs a single server worker: each worker would apply only the
+    corrections it received and checkpoint over the versions of the others, so it
+    stays disabled when WEB_CONCURRENCY is above 1.
+
+    Corrections can only use labels the model was trained with: SGD cannot add a
+    class to a fitted model. Updated models are served and checkpointed without a
+    probability calibration, since partial_fit changes the scores it was fitted to;
+    the next full retrain calibrates again.
+    """
+    def __init__(
+        self,
+        services: Dict[str, ModelService],
+        registry_dir: Optional[str] = None,
+        on_updated: Optional[Callable[[str], Awaitable]] = None,
+        enabled: Optional[bool] = None
+    ):
+        self.enabled = enabled if enabled is not None else os.getenv("ONLINE_LEARNING_ENABLED", "false").lower() == "true"
+        workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+        if self.enabled and workers > 1:
+            logger.error(f"Online learning needs a single worker, not WEB_CONCURRENCY={workers}; it stays disabled")
+            self.enabled = False
+        self.registry_dir = registry_dir or os.getenv("MODEL_REGISTRY_DIR", "/app/models_data/registry")
+        self.on_updated = on_updated
+        self.batch_size = int(os.getenv("ONLINE_BATCH_SIZE", "32"))
+        self.update_interval = float(os.getenv("ONLINE_UPDATE_INTERVAL_SECONDS", "5"))
+        self.checkpoint_interval = float(os.getenv("ONLINE_CHECKPOINT_INTERVAL_SECONDS", "300"))
+        self.max_pending = int(os.getenv("ONLINE_MAX_PENDING", "10000"))
+        self.feedback_log_dir = os.getenv("ONLINE_FEEDBACK_LOG_DIR") or None
+        self._models = {name: _OnlineModel(service) for name, service in services.items()}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def status(self) -> List[OnlineModelStatus]:
+        return [
+            OnlineModelStatus(
+                model=name,
+                online=self._is_online(state.service.current_model()),
+                version=state.service.model_version,
+                pending=len(state.pending),
+                samples_applied=state.samples_applied,
+                updates=state.updates,
+                dropped=state.dropped,
+                last_update_at=state.last_update_at,
+                last_checkpoint_at=state.last_checkpoint_at if state.checkpoint_version else None,
+                checkpoint_version=state.checkpoint_version
+            )
+            for name, state in self._models.items()
+        ]
+
+    def pending(self) -> Dict[str, int]:
+        return {name: len(state.pending) for name, state in self._models.items()}
+
+    def submit(self, message: str, corrections: Dict[str, str]):
+        """
+        Queues corrected labels (model name -> label) of a message. All corrections
+        are checked before any is queued. Raises OnlineLearningUnavailableError or
+        UnknownLabelError.
+        """
+        for name, label in corrections.items():
+            model = self._models[name].service.current_model()
+            if not self._is_online(model):
+                raise OnlineLearningUnavailableError(
+                    f"The serving {name} model cannot be updated online; publish one trained with the online pipeline."
+                )
+            if label not in model.labels:
+                raise UnknownLabelError(f"'{label}' is not a {name} label of the serving model: {model.labels}")
+        for name, label in corrections.items():
+            state = self._models[name]
+            if len(state.pending) >= self.max_pending:
+                state.dropped += 1
+                ONLINE_FEEDBACK.inc(model=name, outcome="dropped")
+                logger.warning(f"Online {name} feedback queue is full; dropping a correction")
+                continue
+            state.pending.append((message, label))
+            ONLINE_FEEDBACK.inc(model=name, outcome="queued")
+            if len(state.pending) >= self.batch_size and self._wake is not None:
+                self._wake.set()
+
+    def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Online learning started: updates every {self.update_interval}s or {self.batch_size} corrections")
+
+    async def stop(self):
+        """Stops the background task, then applies and checkpoints what is left."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.flush(checkpoint=True)
+        except Exception as e:
+            logger.error(f"Error saving online model updates at shutdown: {e}", exc_info=True)
+
+    async def flush(self, checkpoint: bool = False):
+        """Applies the queued corrections now; with checkpoint=True also publishes the updated models."""
+        for name in self._models:
+            if await asyncio.to_thread(self._update, name) and self.on_updated is not None:
+                await self.on_updated(name)
+            if checkpoint:
+                await asyncio.to_thread(self._checkpoint, name)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.update_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+                for name, state in self._models.items():
+                    if time.time() - state.last_checkpoint_at >= self.checkpoint_interval:
+                        await asyncio.to_thread(self._checkpoint, name)
+            except Exception as e:
+                logger.error(f"Error applying online model updates: {e}", exc_info=True)
+
+    def _update(self, name: str) -> bool:
+        """Applies every queued correction of a model in one swap. Returns whether a new model is serving."""
+        state = self._models[name]
+        with state.lock:
+            if not state.pending:
+                return False
+            model = state.service.current_model()
+            samples = [state.pending.popleft() for _ in range(len(state.pending))]
+            if not self._is_online(model):
+                self._drop(name, len(samples), "the serving model cannot be updated online")
+                return False
+            known = set(model.labels)
+            unknown = sum(1 for _, label in samples if label not in known)
+            if unknown:
+                # The model was replaced by one with other classes since the corrections were queued
+                self._drop(name, unknown, "their labels are unknown to the serving model")
+                samples = [(message, label) for message, label in samples if label in known]
+                if not samples:
+                    return False
+
+            (vectorizer_name, vectorizer), (classifier_name, classifier) = model.pipeline.steps
+            # Requests in flight keep scoring with the serving weights; the copy is updated
+            classifier = copy.deepcopy(classifier)
+            for start in range(0, len(samples), self.batch_size):
+                batch = samples[start:start + self.batch_size]
+                classifier.partial_fit(vectorizer.transform([message for message, _ in batch]), [label for _, label in batch])
+            from sklearn.pipeline import Pipeline
+
+            pipeline = Pipeline([(vectorizer_name, vectorizer), (classifier_name, classifier)])
+            version = f"{model.version.split('+')[0]}+online{state.updates + 1}"
+            # No compiled engine: the compiled scorer does not support hashing featurizers.
+            # No calibrator either: it was fitted to the scores of the previous weights
+            candidate = LoadedModel(pipeline, model.labels, version, None, None)
+            if not state.service.swap_model(candidate, model):
+                # Another model was loaded meanwhile; the corrections go to it next time
+                state.pending.extendleft(reversed(samples))
+                return False
+
+            state.samples_applied += len(samples)
+            state.updates += 1
+            state.updates_since_checkpoint += 1
+            state.last_update_at = time.time()
+            ONLINE_UPDATES.inc(model=name)
+            # Only once applied: corrections put back in the queue above would be journaled twice
+            self._journal(name, samples)
+            logger.info(f"Applied {len(samples)} corrections to the {name} model, now serving {version}")
+            return True
+
+    def _checkpoint(self, name: str) -> Optional[str]:
+        """Publishes the updated model to the registry and serves that version. Returns it, if published."""
+        from app.utils.training import publish_version
+
+        state = self._models[name]
+        with state.lock:
+            state.last_checkpoint_at = time.time()
+            model = state.service.current_model()
+            if state.updates_since_checkpoint == 0 or not self._is_online(model):
+                return None
+            summary = {"pipeline": "online", "online_update_of": model.version.split("+")[0], "samples_applied": state.samples_applied}
+            manifest = publish_version(self.registry_dir, name, model.pipeline, summary)
+            # Serving the published file gives the model the version it will have after a restart
+            state.service.reload_model(os.path.join(os.path.abspath(self.registry_dir), name, MANIFEST_FILE))
+            state.updates_since_checkpoint = 0
+            state.checkpoint_version = manifest["version"]
+            ONLINE_CHECKPOINTS.inc(model=name)
+            logger.info(f"Checkpointed the online {name} model as {manifest['version']}")
+            return manifest["version"]
+
+    def _journal(self, name: str, samples: List[Tuple[str, str]]):
+        if self.feedback_log_dir is None:
+            return
+        os.makedirs(self.feedback_log_dir, exist_ok=True)
+        with open(os.path.join(self.feedback_log_dir, f"{name}.jsonl"), "a", encoding="utf-8") as f:
+            for message, label in samples:
+                f.write(json.dumps({"text": message, "label": label}, ensure_ascii=False) + "\n")
+
+    def _drop(self, name: str, count: int, reason: str):
+        self._models[name].dropped += count
+        ONLINE_FEEDBACK.inc(count, model=name, outcome="dropped")
+        logger.warning(f"Dropped {count} {name} corrections: {reason}")
+
+    @staticmethod
+    def _is_online(model: Optional[LoadedModel]) -> bool:
+        from app.utils.training import is_online_pipeline
+
+        return model is not None and is_online_pipeline(model.pipeline)
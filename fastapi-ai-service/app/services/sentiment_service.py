@@ -1,68 +1,51 @@
-import os
-import joblib
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import LinearSVC
-from sklearn.pipeline import Pipeline
-from typing import Tuple
+from typing import Tuple, List, Optional
 import logging
-from app.utils.model_loader import load_model_from_path
+from app.services.model_service import LoadedModel, ModelService
+from app.utils.scoring import as_score_matrix
+from app.utils.featurizer import MessageFeatures
 
 logger = logging.getLogger(__name__)
 
-class SentimentService:
-    def __init__(self):
-        self.model_path = os.getenv("MODEL_PATH_SENTIMENT", "/app/models_data/trained_sentiment_model.joblib")
-        self.pipeline = None
-        self.sentiment_labels = []
-        self.load_model()
-
-    def is_model_loaded(self):
-        return self.pipeline is not None and len(self.sentiment_labels) > 0
-
-    def _train_and_save_model(self, texts: list, labels: list, output_path: str):
+class SentimentService(ModelService):
+    model_name = "sentiment"
+    model_path_env = "MODEL_PATH_SENTIMENT"
+    default_model_path = "/app/models_data/trained_sentiment_model.joblib"
+    fallback_label = "neutral" # Default to neutral if model not loaded
+    confidence_threshold_env = "SENTIMENT_CONFIDENCE_THRESHOLD"
+
+    @property
+    def sentiment_labels(self) -> List[str]:
+        return self.labels
+
+    def analyze_sentiment(
+        self,
+        text: str,
+        features: Optional[MessageFeatures] = None,
+        model: Optional[LoadedModel] = None
+    ) -> Tuple[str, float]:
+        """Analyzes the sentiment of a given text."""
+        return self._predict([text], features, model)[0]
+
+    def analyze_sentiments(
+        self,
+        texts: List[str],
+        features: Optional[MessageFeatures] = None,
+        model: Optional[LoadedModel] = None
+    ) -> List[Tuple[str, float]]:
+        """Analyzes the sentiment of several texts with a single decision_function call."""
+        return self._predict(texts, features, model)
+
+    def _predictions_from_scores(self, decision_scores, labels: List[str]) -> List[Tuple[str, float]]:
         """
-        Internal method to train and save a simple sentiment analysis model.
-        This is for initial setup/demonstration. In a real scenario, training would be
-        more sophisticated and done offline.
+        Derives the predicted labels and confidences from one decision_function matrix,
+        so the text does not need a separate predict pass.
         """
-        logger.info("Training sentiment model...")
-        if not texts or not labels or len(texts) != len(labels):
-            logger.error("Invalid training data provided for sentiment model.")
-            return
-
-        # Simple pipeline for text classification
-        pipeline = Pipeline([
-            ('tfidf', TfidfVectorizer(max_features=1000)),
-            ('clf', LinearSVC()) # Linear Support Vector Classification
-        ])
-
-        pipeline.fit(texts, labels)
-        joblib.dump(pipeline, output_path)
-        self.pipeline = pipeline
-        self.sentiment_labels = pipeline.named_steps.clf.classes_.tolist()
-        logger.info(f"Sentiment model trained and saved to {output_path}")
-
-    def analyze_sentiment(self, text: str) -> Tuple[str, float]:
-        """Analyzes the sentiment of a given text."""
-        if not self.is_model_loaded():
-            return "neutral", 0.0 # Default to neutral if model not loaded
-
-        try:
-            # Predict the class index
-            predicted_idx = self.pipeline.predict([text])[0]
-            sentiment = self.sentiment_labels[predicted_idx]
-
-            # Get decision function scores for confidence
-            decision_scores = self.pipeline.decision_function([text])
-            confidence = 0.0
-            if len(decision_scores[0]) == 1: # Binary classification
-                 confidence = float(1 / (1 + np.exp(-decision_scores[0][0]))) # Sigmoid for binary SVM
-            else: # Multi-class classification
-                 confidence = float(np.max(decision_scores)) # Max score for multi-class
-
-            # Further normalize or map confidence if needed
-            return sentiment, confidence
-        except Exception as e:
-            logger.error(f"Error analyzing sentiment for text '{text}': {e}")
-            return "neutral", 0.0
+        scores = as_score_matrix(decision_scores)
+        predicted_idx = np.argmax(scores, axis=1)
+        max_scores = scores[np.arange(len(scores)), predicted_idx]
+        if scores.shape[1] == 2: # Binary classification
+            confidences = 1 / (1 + np.exp(-max_scores)) # Sigmoid for binary SVM
+        else: # Multi-class classification
+            confidences = max_scores # Max score for multi-class
+        return [(labels[idx], float(conf)) for idx, conf in zip(predicted_idx, confidences)]
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+from typing import AsyncIterable, AsyncIterator, List, Optional, Tuple
+
+from app.models.ticket_models import TicketAnalysisRequest, TicketBatchItemResult
+from app.services.ticket_analysis_service import TicketAnalysisService
+from app.utils.inference_executor import InferenceExecutor, InferenceQueueFullError
+from app.utils.metrics import REGISTRY
+from app.utils.ndjson import iter_ndjson_lines, parse_analysis_record
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_SIZE = REGISTRY.histogram(
+    "ai_stream_batch_size", "Records per micro-batch of the streaming endpoint.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+
+# How long a micro-batch waits before it is resubmitted when the inference queue is full
+QUEUE_FULL_RETRY_SECONDS = 0.05
+
+# Marks the end of the input in the record queue
+_END = object()
+
+# A parsed record, or the error result of a record that could not be parsed
+Record = Tuple[int, Optional[TicketAnalysisRequest], Optional[TicketBatchItemResult]]
+
+
+class StreamAnalysisService:
+    """
+    Analyzes a continuous NDJSON feed of TicketAnalysisRequest records received over
+    one connection, e.g. from email ingestion.
+
+    Records are collected into micro-batches that are closed after batch_size
+    records or window_seconds after their first record, whichever comes first, so a
+    record waits at most one window before its batch is analyzed. Each batch is
+    classified with one vectorized call on the inference executor and dispatched in
+    the serving process, and its results are streamed back as NDJSON lines in input
+    order.
+
+    Backpressure: at most max_pending parsed records are buffered. When the client
+    sends faster than batches are analyzed, or reads the results slower, the
+    request body is no longer read and the client's sends block.
+    """
+    def __init__(
+        self,
+        ticket_analysis_service: TicketAnalysisService,
+        inference_executor: InferenceExecutor,
+        batch_size: Optional[int] = None,
+        window_seconds: Optional[float] = None,
+        max_pending: Optional[int] = None
+    ):
+        self.ticket_analysis_service = ticket_analysis_service
+        self.inference_executor = inference_executor
+        self.batch_size = batch_size or int(os.getenv("STREAM_BATCH_SIZE", "64"))
+        self.window_seconds = window_seconds if window_seconds is not None else float(os.getenv("STREAM_BATCH_WINDOW_MS", "20")) / 1000
+        self.max_pending = max_pending or int(os.getenv("STREAM_MAX_PENDING", "256"))
+        self.max_line_bytes = int(os.getenv("STREAM_MAX_RECORD_BYTES", str(1024 * 1024)))
+
+    async def stream(self, body: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        """Yields the NDJSON results of each micro-batch as soon as it is analyzed."""
+        records: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        reader = asyncio.create_task(self._read(body, records))
+        try:
+            finished = False
+            while not finished:
+                batch, finished = await self._next_batch(records)
+                if batch:
+                    yield await self._analyze(batch)
+        finally:
+            reader.cancel()
+
+    async def _read(self, body: AsyncIterable[bytes], records: asyncio.Queue):
+        index = 0
+        try:
+            async for line in iter_ndjson_lines(body, self.max_line_bytes):
+                await records.put((index, *parse_analysis_record(index, line)))
+                index += 1
+        except Exception as e:
+            # Report why the stream ended early (oversized record, client disconnect)
+            logger.warning(f"Stopped reading NDJSON stream after {index} records: {e}")
+            await records.put((index, None, TicketBatchItemResult(index=index, status="error", error=f"Stream aborted: {e}")))
+        await records.put(_END)
+
+    async def _next_batch(self, records: asyncio.Queue) -> Tuple[List[Record], bool]:
+        """Waits for a record, then collects more until the batch is full or its window closes."""
+        record = await records.get()
+        if record is _END:
+            return [], True
+        batch = [record]
+        deadline = asyncio.get_running_loop().time() + self.window_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            try:
+                record = records.get_nowait() if timeout <= 0 else await asyncio.wait_for(records.get(), timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if record is _END:
+                return batch, True
+            batch.append(record)
+        return batch, False
+
+    async def _analyze(self, batch: List[Record]) -> bytes:
+        STREAM_BATCH_SIZE.observe(len(batch))
+        requests = [request for _, request, _ in batch if request is not None]
+        try:
+            analyses = await self._run_batch(requests)
+        except Exception as e:
+            logger.error(f"Error processing streamed batch of {len(requests)} messages: {e}", exc_info=True)
+            analyses = [(None, str(e))] * len(requests)
+
+        results = []
+        analyses_iter = iter(analyses)
+        for index, request, error_result in batch:
+            if request is None:
+                results.append(error_result)
+                continue
+            analysis, error = next(analyses_iter)
+            if analysis is not None:
+                try:
+                    self.ticket_analysis_service.apply_dispatch(request, analysis)
+                except Exception as e:
+                    logger.error(f"Error dispatching streamed message for ticket {request.ticket_id}: {e}", exc_info=True)
+                    analysis, error = None, str(e)
+            results.append(TicketBatchItemResult(
+                index=index,
+                ticket_id=request.ticket_id,
+                status="ok" if error is None else "error",
+                result=analysis,
+                error=error
+            ))
+        return "".join(result.model_dump_json() + "\n" for result in results).encode("utf-8")
+
+    async def _run_batch(self, requests: List[TicketAnalysisRequest]):
+        if not requests:
+            return []
+        # A stream cannot be answered with 503 halfway; wait for queue space instead
+        while True:
+            try:
+                return await self.inference_executor.run(self.ticket_analysis_service.analyze_batch, requests, False)
+            except InferenceQueueFullError:
+                await asyncio.sleep(QUEUE_FULL_RETRY_SECONDS)
+
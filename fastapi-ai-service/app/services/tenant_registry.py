@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from app.services.chatbot_service import ChatbotService
+from app.services.knowledge_base_service import KnowledgeBaseService
+from app.services.message_pipeline import MessagePipeline
+from app.services.model_service import ModelService
+from app.services.sentiment_service import SentimentService
+from app.services.ticket_analysis_service import TicketAnalysisService
+from app.utils.inference_executor import InferenceExecutor
+from app.utils.metrics import REGISTRY
+from app.utils.model_loader import MANIFEST_FILE, resolve_model_path
+from app.utils.result_cache import ResultCache
+from app.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Tenant ids name directories, so they are restricted to a safe file name
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+KNOWLEDGE_BASE_FILE = "knowledge_base.json"
+
+TENANT_LOOKUPS = REGISTRY.counter(
+    "ai_tenant_lookups_total", "Tenant lookups, by whether the tenant was already loaded (hit) or had to be loaded (load).", ("outcome",)
+)
+TENANT_LOAD_DURATION = REGISTRY.histogram("ai_tenant_load_seconds", "Time to load the artifacts of a tenant.")
+TENANT_EVICTIONS = REGISTRY.counter(
+    "ai_tenant_evictions_total", "Tenants unloaded, by reason (memory budget or admin request).", ("reason",)
+)
+
+
+class TenantNotFoundError(Exception):
+    """Raised for a tenant id without a tenant directory."""
+
+
+class TenantLoadError(Exception):
+    """Raised when an artifact in a tenant directory cannot be loaded."""
+
+
+class Tenant(NamedTuple):
+    """The services serving one tenant. Like LoadedModel, replaced as a whole, never modified."""
+    tenant_id: str
+    chatbot_service: ChatbotService
+    sentiment_service: SentimentService
+    knowledge_base_service: KnowledgeBaseService
+    ticket_analysis_service: TicketAnalysisService
+    message_pipeline: MessagePipeline
+    memory_bytes: int # Size of the tenant's own artifacts, counted against the memory budget
+    loaded_at: float
+
+
+class TenantRegistry:
+    """
+    Serves several brands (tenants), each with its own models and knowledge base,
+    from one process.
+
+    The artifacts of tenant <id> live in TENANTS_DIR/<id>/, in the layout of the
+    default models: chatbot/manifest.json or trained_chatbot_model.joblib,
+    sentiment/manifest.json or trained_sentiment_model.joblib (the manifests are
+    what `python -m app.utils.training --registry TENANTS_DIR/<id>` publishes) and
+    knowledge_base.json. An artifact the tenant does not provide is served by the
+    default service; dispatch always uses the default agent roster.
+
+    A tenant is loaded on its first request, in a worker thread. Concurrent first
+    requests share one load (single flight), so a cold-start burst loads each model
+    once. Loaded tenants are kept in LRU order; when the size of their artifacts
+    exceeds the memory budget, the least recently used tenants are unloaded until it
+    fits again (the tenant just loaded is always kept). Requests still running on an
+    unloaded tenant finish on it. Artifact file sizes stand in for the memory a
+    tenant holds, which they approximate well for joblib models and overstate for
+    memory-mapped ones, whose pages are shared. Tenant files are not watched: an
+    unloaded tenant picks up its current files on its next request.
+
+    Each tenant has its own result cache, so evicting it frees its cached results.
+    Tenant inference runs on the inference executor in thread mode; in process mode
+    it runs in a thread executor of the same size in the serving process, since the
+    forked workers only hold the default models.
+    """
+    def __init__(
+        self,
+        default_services: Callable[[], Dict[str, Any]],
+        inference_executor: InferenceExecutor,
+        root_dir: Optional[str] = None,
+        memory_budget_bytes: Optional[int] = None
+    ):
+        """default_services returns the default chatbot, sentiment, knowledge_base and dispatch services."""
+        self.default_services = default_services
+        self.root_dir = root_dir or os.getenv("TENANTS_DIR", "/app/models_data/tenants")
+        self.memory_budget_bytes = (
+            memory_budget_bytes if memory_budget_bytes is not None
+            else int(float(os.getenv("TENANT_MEMORY_BUDGET_MB", "1024")) * 1024 * 1024)
+        )
+        self.result_cache_entries = int(os.getenv("TENANT_RESULT_CACHE_MAX_ENTRIES", "1000"))
+        if inference_executor.mode == "thread":
+            self.executor = inference_executor
+        else:
+            self.executor = InferenceExecutor("thread", inference_executor.max_workers, inference_executor.max_queue)
+        self._owns_executor = self.executor is not inference_executor
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict() # Least recently used first
+        self._loads = SingleFlight()
+
+    def __len__(self):
+        return len(self._tenants)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(tenant.memory_bytes for tenant in self._tenants.values())
+
+    def loaded(self) -> List[Tenant]:
+        """Loaded tenants, least recently used first."""
+        return list(self._tenants.values())
+
+    async def get(self, tenant_id: str) -> Tenant:
+        """Returns the tenant's services, loading them first if needed. Raises TenantNotFoundError or TenantLoadError."""
+        tenant = self._tenants.get(tenant_id)
+        if tenant is not None:
+            self._tenants.move_to_end(tenant_id)
+            TENANT_LOOKUPS.inc(outcome="hit")
+            return tenant
+        if not TENANT_ID_PATTERN.match(tenant_id):
+            raise TenantNotFoundError(f"Invalid tenant id '{tenant_id}'.")
+        return await self._loads.run("tenant_load", tenant_id, lambda: self._load(tenant_id))
+
+    def evict(self, tenant_id: str, reason: str = "admin") -> bool:
+        """Unloads a tenant; it is loaded again from its current files on its next request."""
+        tenant = self._tenants.pop(tenant_id, None)
+        if tenant is None:
+            return False
+        TENANT_EVICTIONS.inc(reason=reason)
+        logger.info(f"Unloaded tenant {tenant_id} ({reason}), freeing {tenant.memory_bytes} bytes")
+        return True
+
+    def shutdown(self):
+        if self._owns_executor:
+            self.executor.shutdown()
+
+    async def _load(self, tenant_id: str) -> Tenant:
+        directory = os.path.join(self.root_dir, tenant_id)
+        if not os.path.isdir(directory):
+            raise TenantNotFoundError(f"Tenant '{tenant_id}' not found.")
+        TENANT_LOOKUPS.inc(outcome="load")
+        with TENANT_LOAD_DURATION.time():
+            tenant = await asyncio.to_thread(self._build, tenant_id, directory, self.default_services())
+        self._tenants[tenant_id] = tenant
+        self._evict_over_budget()
+        logger.info(f"Loaded tenant {tenant_id} ({tenant.memory_bytes} bytes) from {directory}")
+        return tenant
+
+    def _evict_over_budget(self):
+        while len(self._tenants) > 1 and self.memory_bytes > self.memory_budget_bytes:
+            self.evict(next(iter(self._tenants)), reason="memory")
+        if self.memory_bytes > self.memory_budget_bytes:
+            logger.warning(f"Tenant {next(iter(self._tenants))} alone exceeds the tenant memory budget of {self.memory_budget_bytes} bytes")
+
+    def _build(self, tenant_id: str, directory: str, defaults: Dict[str, Any]) -> Tenant:
+        memory_bytes = 0
+        services = {}
+        for name, service_class in (("chatbot", ChatbotService), ("sentiment", SentimentService)):
+            path = self._model_path(directory, name, os.path.basename(service_class.default_model_path))
+            if path is None:
+                services[name] = defaults[name]
+                continue
+            service: ModelService = service_class(load=False, model_path=path)
+            service.load_model()
+            if not service.is_model_loaded():
+                raise TenantLoadError(f"Could not load the {name} model of tenant '{tenant_id}': {service.load_error}")
+            services[name] = service
+            memory_bytes += _artifact_bytes(resolve_model_path(path))
+
+        kb_path = os.path.join(directory, KNOWLEDGE_BASE_FILE)
+        if os.path.exists(kb_path):
+            knowledge_base = KnowledgeBaseService(load=False, kb_path=kb_path)
+            knowledge_base.load_knowledge_base()
+            if knowledge_base.load_error is not None: # An empty knowledge base is valid, it just answers nothing
+                raise TenantLoadError(f"Could not load the knowledge base of tenant '{tenant_id}': {knowledge_base.load_error}")
+            memory_bytes += _artifact_bytes(kb_path) + _artifact_bytes(f"{kb_path}.log")
+        else:
+            knowledge_base = defaults["knowledge_base"]
+
+        analysis = TicketAnalysisService(
+            services["chatbot"], services["sentiment"], knowledge_base, defaults["dispatch"],
+            ResultCache(max_entries=self.result_cache_entries)
+        )
+        pipeline = MessagePipeline(analysis, self.executor, lambda message: self.executor.run(analysis.classify_message, message))
+        return Tenant(
+            tenant_id, services["chatbot"], services["sentiment"], knowledge_base, analysis, pipeline, memory_bytes, time.time()
+        )
+
+    @staticmethod
+    def _model_path(directory: str, model_name: str, default_file: str) -> Optional[str]:
+        for path in (os.path.join(directory, model_name, MANIFEST_FILE), os.path.join(directory, default_file)):
+            if os.path.exists(path):
+                return path
+        return None
+
+
+def _artifact_bytes(path: str) -> int:
+    """Size of an artifact file, or of all files of an artifact directory; 0 if it does not exist."""
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+        )
+    return os.path.getsize(path) if os.path.exists(path) else 0
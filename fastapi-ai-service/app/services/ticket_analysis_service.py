@@ -0,0 +1,329 @@
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.models.ticket_models import TicketAnalysisRequest, TicketAnalysisResponse
+from app.services.chatbot_service import ChatbotService
+from app.services.dispatch_service import DispatchService
+from app.services.knowledge_base_service import KnowledgeBaseService
+from app.services.sentiment_service import SentimentService
+from app.utils.featurizer import MessageFeatures
+from app.utils.log_config import body
+from app.utils.metrics import MODEL_FALLBACKS, STAGE_DURATION
+from app.utils.result_cache import MISSING, ResultCache, normalize_message
+
+logger = logging.getLogger(__name__)
+
+class Classification(NamedTuple):
+    """Per-message sentiment and intent results plus the model versions that produced them."""
+    sentiments: List[Tuple[str, float]]
+    intents: List[Tuple[str, float]]
+    sentiment_model_version: Optional[str]
+    intent_model_version: Optional[str]
+
+class TicketAnalysisService:
+    """
+    Runs the full analysis pipeline for incoming ticket messages:
+    sentiment, intent, knowledge base search, reply generation and dispatch.
+    """
+    def __init__(
+        self,
+        chatbot_service: ChatbotService,
+        sentiment_service: SentimentService,
+        knowledge_base_service: KnowledgeBaseService,
+        dispatch_service: DispatchService,
+        result_cache: Optional[ResultCache] = None
+    ):
+        self.chatbot_service = chatbot_service
+        self.sentiment_service = sentiment_service
+        self.knowledge_base_service = knowledge_base_service
+        self.dispatch_service = dispatch_service
+        # Caching is disabled unless a cache is supplied
+        self.result_cache = result_cache if result_cache is not None else ResultCache(max_entries=0)
+
+    def analyze(self, request: TicketAnalysisRequest, dispatch: bool = True) -> TicketAnalysisResponse:
+        """
+        Analyzes a single incoming message. Errors are raised to the caller.
+        With dispatch=False the agent/priority suggestion is left to apply_dispatch.
+        """
+        logger.info("Processing incoming message for ticket %s: %s", request.ticket_id, body(request.message))
+
+        # Steps 1-2: Sentiment Analysis and Intent Recognition (one shared featurization)
+        classification = self.classify([request.message])
+        sentiment, sentiment_confidence = classification.sentiments[0]
+        intent, intent_confidence = classification.intents[0]
+        if self.sentiment_service.is_model_loaded():
+            logger.info("Sentiment analysis: %s (%.2f)", sentiment, sentiment_confidence)
+        if self.chatbot_service.is_model_loaded():
+            logger.info("Intent recognition: %s (%.2f)", intent, intent_confidence)
+
+        # Steps 3-5: Knowledge Base Search, AI Reply and Dispatch
+        return self._complete_analysis(request, classification, 0, dispatch)
+
+    def analyze_batch(
+        self,
+        requests: List[TicketAnalysisRequest],
+        dispatch: bool = True
+    ) -> List[Tuple[Optional[TicketAnalysisResponse], Optional[str]]]:
+        """
+        Analyzes several incoming messages at once. Sentiment and intent are computed
+        with one vectorized model call each over the whole batch; the remaining steps
+        run per item, except the knowledge base search of the messages that miss the
+        cache, which is also batched. Returns a (response, error) pair per request, in
+        input order, so that a failing item does not fail the rest of the batch.
+        """
+        if not requests:
+            return []
+        messages = [request.message for request in requests]
+        logger.info("Processing a batch of %d incoming messages", len(requests))
+
+        # Steps 1-2: Sentiment Analysis and Intent Recognition (vectorized)
+        classification = self.classify(messages)
+
+        # Step 3: Knowledge Base Search (batched; items it fails for are searched one by one)
+        try:
+            kb_answers = self._prefetch_kb_answers(requests, classification)
+        except Exception as e:
+            logger.error(f"Error searching the knowledge base for a batch of {len(requests)} messages: {e}", exc_info=True)
+            kb_answers = [MISSING] * len(requests)
+
+        results = []
+        for position, request in enumerate(requests):
+            try:
+                response = self._complete_analysis(request, classification, position, dispatch, kb_answers[position])
+                results.append((response, None))
+            except Exception as e:
+                logger.error(f"Error processing batched message for ticket {request.ticket_id}: {e}", exc_info=True)
+                results.append((None, str(e)))
+        return results
+
+    def apply_dispatch(self, request: TicketAnalysisRequest, response: TicketAnalysisResponse) -> TicketAnalysisResponse:
+        """
+        Fills in the suggested agent and priority of an analyzed message. Dispatch
+        updates the agents' load counters, so it must run in the serving process even
+        when the analysis itself ran in an executor worker process.
+        """
+        with STAGE_DURATION.time(stage="dispatch"):
+            response.suggested_agent_id, response.suggested_priority = self.dispatch_service.suggest_dispatch(
+                response.intent, response.sentiment, request.existing_ticket_status
+            )
+        logger.info("Suggested Dispatch - Agent: %s, Priority: %s", response.suggested_agent_id, response.suggested_priority)
+        return response
+
+    def predict_intent(self, message: str) -> Tuple[str, float, Optional[str]]:
+        """(intent, confidence, model version) of a single message, cached when possible."""
+        classification = self.classify([message], include_sentiment=False)
+        intent, confidence = classification.intents[0]
+        return intent, confidence, classification.intent_model_version
+
+    def analyze_sentiment(self, text: str) -> Tuple[str, float, Optional[str]]:
+        """(sentiment, confidence, model version) of a single text, cached when possible."""
+        classification = self.classify([text], include_intent=False)
+        sentiment, confidence = classification.sentiments[0]
+        return sentiment, confidence, classification.sentiment_model_version
+
+    def classify_message(self, message: str) -> Tuple[Tuple[str, float, Optional[str]], Tuple[str, float, Optional[str]]]:
+        """(sentiment, intent) predictions of a single message from one classification, cached when possible."""
+        classification = self.classify([message])
+        (sentiment, sentiment_confidence), (intent, intent_confidence) = classification.sentiments[0], classification.intents[0]
+        return (
+            (sentiment, sentiment_confidence, classification.sentiment_model_version),
+            (intent, intent_confidence, classification.intent_model_version)
+        )
+
+    def classify(
+        self,
+        messages: List[str],
+        include_sentiment: bool = True,
+        include_intent: bool = True
+    ) -> Classification:
+        """
+        Returns the (sentiment, confidence) and (intent, confidence) pairs for each message.
+        Results are looked up in the result cache first. The remaining distinct messages
+        are featurized once and the cached features feed both classifiers. Unloaded
+        (or excluded) models fall back to neutral sentiment and unknown intent.
+
+        Each model snapshot is read once, so a concurrent hot reload cannot mix two
+        model versions within one call.
+        """
+        sentiments = [("neutral", 0.0)] * len(messages)
+        intents = [("unknown", 0.0)] * len(messages)
+
+        sentiment_model = self.sentiment_service.current_model() if include_sentiment else None
+        intent_model = self.chatbot_service.current_model() if include_intent else None
+        run_sentiment = sentiment_model is not None
+        run_intent = intent_model is not None
+        if include_sentiment and not run_sentiment:
+            logger.warning("Sentiment model not loaded, skipping sentiment analysis.")
+            MODEL_FALLBACKS.inc(len(messages), component=self.sentiment_service.model_name, reason="not_loaded")
+        if include_intent and not run_intent:
+            logger.warning("Chatbot model not loaded, skipping intent recognition.")
+            MODEL_FALLBACKS.inc(len(messages), component=self.chatbot_service.model_name, reason="not_loaded")
+
+        sentiment_version = sentiment_model.version if run_sentiment else None
+        intent_version = intent_model.version if run_intent else None
+        if not (run_sentiment or run_intent):
+            return Classification(sentiments, intents, sentiment_version, intent_version)
+
+        # Distinct normalized messages that missed the cache for at least one head,
+        # mapped to the positions they occur at
+        pending: Dict[str, List[int]] = {}
+        for position, message in enumerate(messages):
+            key = normalize_message(message)
+            complete = True
+            if run_sentiment:
+                cached = self.result_cache.get(("sentiment", sentiment_version, key))
+                if cached is MISSING:
+                    complete = False
+                else:
+                    sentiments[position] = cached
+            if run_intent:
+                cached = self.result_cache.get(("intent", intent_version, key))
+                if cached is MISSING:
+                    complete = False
+                else:
+                    intents[position] = cached
+            if not complete:
+                pending.setdefault(key, []).append(position)
+
+        if not pending:
+            return Classification(sentiments, intents, sentiment_version, intent_version)
+
+        unique_messages = [messages[positions[0]] for positions in pending.values()]
+        features = MessageFeatures(unique_messages)
+        # The first head to run also pays for the shared tokenization
+        if run_sentiment:
+            with STAGE_DURATION.time(stage="sentiment"):
+                computed_sentiments = self.sentiment_service.analyze_sentiments(unique_messages, features, sentiment_model)
+        if run_intent:
+            with STAGE_DURATION.time(stage="intent"):
+                computed_intents = self.chatbot_service.predict_intents(unique_messages, features, intent_model)
+
+        for unique_idx, (key, positions) in enumerate(pending.items()):
+            if run_sentiment:
+                self.result_cache.set(("sentiment", sentiment_version, key), computed_sentiments[unique_idx])
+                for position in positions:
+                    sentiments[position] = computed_sentiments[unique_idx]
+            if run_intent:
+                self.result_cache.set(("intent", intent_version, key), computed_intents[unique_idx])
+                for position in positions:
+                    intents[position] = computed_intents[unique_idx]
+
+        return Classification(sentiments, intents, sentiment_version, intent_version)
+
+    def search_knowledge_base(self, message: str, intent: str, kb_answer=MISSING) -> Optional[str]:
+        """
+        Step 3: the knowledge base answer for a classified message, from the result
+        cache or a search, unless kb_answer was prefetched. None when nothing matched
+        or the knowledge base is not loaded.
+        """
+        if not self.knowledge_base_service.is_kb_loaded():
+            logger.warning("Knowledge base not loaded, skipping KB search.")
+            MODEL_FALLBACKS.inc(component="knowledge_base", reason="not_loaded")
+            return None
+        if kb_answer is MISSING:
+            with STAGE_DURATION.time(stage="knowledge_base"):
+                kb_key = ("kb", self.knowledge_base_service.kb_version, intent, normalize_message(message))
+                kb_answer = self.result_cache.get(kb_key)
+                if kb_answer is MISSING:
+                    kb_answer = self.knowledge_base_service.search_knowledge_base(message, intent)
+                    self.result_cache.set(kb_key, kb_answer)
+        if kb_answer:
+            logger.info("Knowledge Base found answer: %s", body(kb_answer))
+        else:
+            logger.info("No relevant answer found in knowledge base.")
+        return kb_answer
+
+    def generate_reply(self, intent: str, message: str) -> Optional[str]:
+        """Step 4 without a knowledge base answer: the canned/rule-based reply of a recognized intent, if any."""
+        ai_reply = None
+        if intent != "unknown" and self.chatbot_service.is_model_loaded():
+            with STAGE_DURATION.time(stage="reply"):
+                ai_reply = self.chatbot_service.get_reply(intent, message)
+            if ai_reply:
+                logger.info("Chatbot generated reply for intent '%s': %s", intent, body(ai_reply))
+            else:
+                logger.info("Chatbot has no specific reply for intent '%s'.", intent)
+        # Otherwise: Add integration with a Generative AI like OpenAI here
+        # For example:
+        # if not ai_reply and os.getenv("OPENAI_API_KEY"):
+        #     try:
+        #         from openai import OpenAI
+        #         client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        #         chat_completion = client.chat.completions.create(
+        #             model="gpt-3.5-turbo",
+        #             messages=[
+        #                 {"role": "system", "content": "You are a helpful customer support assistant."},
+        #                 {"role": "user", "content": message}
+        #             ]
+        #         )
+        #         ai_reply = chat_completion.choices[0].message.content
+        #         logger.info(f"OpenAI generated reply: {ai_reply}")
+        #     except Exception as e:
+        #         logger.error(f"Error calling OpenAI API: {e}", exc_info=True)
+        return ai_reply
+
+    def _prefetch_kb_answers(self, requests: List[TicketAnalysisRequest], classification: Classification) -> List:
+        """
+        Knowledge base answers of classified messages, from the result cache or one
+        batched search over the distinct messages that missed it. MISSING where the
+        knowledge base is not loaded.
+        """
+        answers = [MISSING] * len(requests)
+        if not self.knowledge_base_service.is_kb_loaded():
+            return answers
+        with STAGE_DURATION.time(stage="knowledge_base"):
+            kb_version = self.knowledge_base_service.kb_version
+            pending: Dict[tuple, List[int]] = {}
+            for position, request in enumerate(requests):
+                kb_key = ("kb", kb_version, classification.intents[position][0], normalize_message(request.message))
+                answers[position] = self.result_cache.get(kb_key)
+                if answers[position] is MISSING:
+                    pending.setdefault(kb_key, []).append(position)
+            if pending:
+                found = self.knowledge_base_service.search_batch(
+                    [requests[positions[0]].message for positions in pending.values()],
+                    [kb_key[2] for kb_key in pending]
+                )
+                for (kb_key, positions), kb_answer in zip(pending.items(), found):
+                    self.result_cache.set(kb_key, kb_answer)
+                    for position in positions:
+                        answers[position] = kb_answer
+        return answers
+
+    def _complete_analysis(
+        self,
+        request: TicketAnalysisRequest,
+        classification: Classification,
+        position: int,
+        dispatch: bool = True,
+        kb_answer=MISSING
+    ) -> TicketAnalysisResponse:
+        """
+        Runs the knowledge base, reply and dispatch steps for an already classified
+        message. The knowledge base is searched unless kb_answer was prefetched.
+        """
+        sentiment, sentiment_confidence = classification.sentiments[position]
+        intent, intent_confidence = classification.intents[position]
+
+        # Step 3: Knowledge Base Search
+        kb_answer = self.search_knowledge_base(request.message, intent, kb_answer)
+
+        # Step 4: Generate AI Reply (if applicable); a direct KB answer is used as is
+        ai_reply = kb_answer or self.generate_reply(intent, request.message)
+
+        response = TicketAnalysisResponse(
+            ticket_id=request.ticket_id,
+            sentiment=sentiment,
+            sentiment_confidence=sentiment_confidence,
+            intent=intent,
+            intent_confidence=intent_confidence,
+            ai_reply=ai_reply,
+            knowledge_base_answer=kb_answer,
+            sentiment_model_version=classification.sentiment_model_version,
+            intent_model_version=classification.intent_model_version
+        )
+
+        # Step 5: Intelligent Dispatch (Suggest status/agent)
+        if dispatch:
+            self.apply_dispatch(request, response)
+        return response
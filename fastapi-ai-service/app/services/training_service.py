@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.models.training_models import TrainingRequest, TrainingRunStatus
+
+logger = logging.getLogger(__name__)
+
+# Directory from which `python -m app.utils.training` is run
+SERVICE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TrainingInProgressError(Exception):
+    """Raised when a model is submitted for training while a run for it is still going."""
+
+
+class TrainingRun:
+    def __init__(self, request: TrainingRequest):
+        self.run_id = uuid.uuid4().hex
+        self.request = request
+        self.status = "running"
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.version: Optional[str] = None
+        self.training: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.log_tail: deque = deque(maxlen=50)
+        self.task: Optional[asyncio.Task] = None
+
+    def to_status(self) -> TrainingRunStatus:
+        return TrainingRunStatus(
+            run_id=self.run_id,
+            model=self.request.model,
+            status=self.status,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            version=self.version,
+            training=self.training,
+            error=self.error,
+            log_tail=list(self.log_tail)
+        )
+
+
+class TrainingService:
+    """
+    Runs the offline training pipeline (app.utils.training) in a child process, so
+    fitting and the hyper-parameter search never compete with request handling in
+    the serving process. One run per model at a time. After a run has published a
+    new version, on_published is awaited: the API reloads the model there and
+    returns its reload result ({"message", "version", ...}). The run succeeds if the
+    published version is then serving; otherwise (the new version failed validation,
+    or MODEL_PATH_* does not point at the registry manifest) it ends as
+    'published_not_serving' with the reload message as its error.
+    """
+    def __init__(self, registry_dir: Optional[str] = None, on_published: Optional[Callable[[str], Awaitable[dict]]] = None):
+        self.registry_dir = registry_dir or os.getenv("MODEL_REGISTRY_DIR", "/app/models_data/registry")
+        self.on_published = on_published
+        self._runs: Dict[str, TrainingRun] = {}
+
+    async def start(self, request: TrainingRequest) -> TrainingRun:
+        if any(run.status == "running" and run.request.model == request.model for run in self._runs.values()):
+            raise TrainingInProgressError(f"A {request.model} training run is already in progress.")
+        run = TrainingRun(request)
+        self._runs[run.run_id] = run
+        run.task = asyncio.create_task(self._run(run))
+        logger.info(f"Started {request.model} training run {run.run_id} on {request.data_path}")
+        return run
+
+    def get(self, run_id: str) -> Optional[TrainingRun]:
+        return self._runs.get(run_id)
+
+    def list(self) -> List[TrainingRun]:
+        return sorted(self._runs.values(), key=lambda run: run.started_at)
+
+    async def shutdown(self):
+        for run in self._runs.values():
+            if run.task is not None and not run.task.done():
+                run.task.cancel()
+
+    async def _run(self, run: TrainingRun):
+        request = run.request
+        command = [
+            sys.executable, "-m", "app.utils.training", request.model, request.data_path,
+            "--registry", self.registry_dir, "--calibration", request.calibration, "--pipeline", request.pipeline
+        ]
+        if not request.search:
+            command.append("--no-search")
+        if request.export_mapped:
+            command.append("--export-mapped")
+
+        process = await asyncio.create_subprocess_exec(
+            *command, cwd=SERVICE_ROOT, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        try:
+            async for line in process.stdout:
+                run.log_tail.append(line.decode("utf-8", "replace").rstrip())
+            returncode = await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            run.status, run.error, run.finished_at = "failed", "cancelled", time.time()
+            raise
+
+        run.finished_at = time.time()
+        if returncode != 0:
+            run.status = "failed"
+            run.error = f"training process exited with status {returncode}"
+            logger.error(f"{request.model} training run {run.run_id} failed: {run.log_tail[-1] if run.log_tail else returncode}")
+            return
+        # The CLI's last output line is its JSON summary
+        try:
+            result = json.loads(run.log_tail[-1])
+            run.version, run.training = result["version"], result["training"]
+        except (IndexError, ValueError, KeyError, TypeError):
+            run.status = "failed"
+            run.error = "training process did not report the published version"
+            return
+        logger.info(f"{request.model} training run {run.run_id} published version {run.version}")
+        if self.on_published is not None:
+            try:
+                result = await self.on_published(request.model)
+                if result["version"] != run.version:
+                    run.error = result["message"]
+            except Exception as e:
+                logger.error(f"Error picking up {request.model} model {run.version}: {e}", exc_info=True)
+                run.error = f"{request.model} model reload failed: {e}"
+            if run.error is not None:
+                run.status = "published_not_serving"
+                logger.warning(f"{request.model} model {run.version} was published but is not serving: {run.error}")
+                return
+        # Reported only now, so that a succeeded run's version is already being served
+        run.status = "succeeded"
@@ -0,0 +1,320 @@
+"""
+Admission control of the /ai/ endpoints.
+
+Every request first takes a token from its client's token bucket (client = the
+X-Client-ID header, else the peer address); an empty bucket is answered with 429
+and a Retry-After of the time until the next token. Admitted requests then wait
+for one of max_concurrent slots, in priority order (high, normal, low; first come
+first served within a class). When the wait queue is full, a new request takes the
+place of the newest waiter of a lower class, which is shed; otherwise the new
+request is. Shed requests get 503 with a Retry-After estimated from the queue
+length and the recent request duration.
+
+A request's class is its X-Priority header, if valid; else, for the
+single-message endpoints, a cheap pre-classification of the message (words of
+anger or urgency: high, a bare greeting: low); else its endpoint's default (bulk
+and batch endpoints are low). A request may carry X-Request-Deadline, a Unix
+timestamp after which its caller no longer waits for the answer: past it, the
+request is dropped (503) instead of being computed, whether it arrives late or
+its deadline passes while it is queued. Deadlines compare the caller's clock with
+ours, so both must be synchronized.
+
+Only the wait for a slot is queued here; inference itself is still bounded by the
+inference executor.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from starlette.responses import JSONResponse
+
+from app.utils.metrics import REGISTRY
+
+PRIORITIES = ("high", "normal", "low") # Most important first
+
+ADMISSION_QUEUE_WAIT = REGISTRY.histogram(
+    "ai_admission_queue_wait_seconds", "Time requests waited for an admission slot, by priority and outcome.", ("priority", "outcome"),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+ADMISSION_REJECTED = REGISTRY.counter(
+    "ai_admission_rejected_total", "Requests not admitted, by priority and reason (rate_limited, queue_full, shed, deadline).", ("priority", "reason")
+)
+
+# Default class of each endpoint; unlisted /ai/ endpoints are normal
+ENDPOINT_PRIORITIES = {
+    "/ai/process_incoming_messages": "low",
+    "/ai/process_incoming_messages/stream": "low",
+    "/ai/jobs": "low",
+}
+# Endpoints whose message is pre-classified, and the JSON field holding it
+PRECLASSIFIED_FIELDS = {
+    "/ai/process_incoming_message": "message",
+    "/ai/dispatch_ticket": "message",
+    "/ai/chatbot": "message",
+    "/ai/sentiment": "text",
+}
+PRECLASSIFY_MAX_BYTES = 64 * 1024
+# Long-lived streams are rate limited but do not hold a slot for their whole duration
+UNQUEUED_PATHS = {"/ai/process_incoming_messages/stream"}
+
+URGENT_WORDS = frozenset((
+    "angry", "furious", "terrible", "awful", "worst", "hate", "unacceptable", "ridiculous", "disappointed",
+    "refund", "complaint", "lawyer", "scam", "fraud", "urgent", "immediately", "asap", "broken", "cancel",
+))
+URGENT_PHRASES = ("生氣", "憤怒", "投訴", "客訴", "退款", "退費", "詐騙", "很爛", "失望", "馬上", "立刻", "緊急")
+GREETING_WORDS = frozenset((
+    "hi", "hello", "hey", "thanks", "thank", "you", "good", "morning", "afternoon", "evening", "there", "ok", "okay",
+))
+GREETING_MAX_WORDS = 5
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+
+def pre_classify(message: str) -> Optional[str]:
+    """Priority class of a message from a keyword scan, or None when it has no cue."""
+    text = message.lower()
+    words = WORD_PATTERN.findall(text)
+    if any(word in URGENT_WORDS for word in words) or any(phrase in message for phrase in URGENT_PHRASES) or "!!" in text:
+        return "high"
+    if words and len(words) <= GREETING_MAX_WORDS and all(word in GREETING_WORDS for word in words):
+        return "low"
+    return None
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted; carries the HTTP response it gets."""
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("rank", "seq", "future", "deadline", "priority")
+
+    def __init__(self, rank: int, seq: int, future: asyncio.Future, deadline: Optional[float], priority: str):
+        self.rank, self.seq, self.future, self.deadline, self.priority = rank, seq, future, deadline, priority
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+
+class AdmissionController:
+    """
+    Token buckets and the priority queue for concurrency slots. Used from the event
+    loop only. rate_per_second <= 0 disables rate limiting, max_concurrent <= 0
+    disables the slot limit.
+    """
+    def __init__(
+        self,
+        rate_per_second: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_concurrent: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_clients: Optional[int] = None
+    ):
+        self.enabled = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+        self.rate_per_second = rate_per_second if rate_per_second is not None else float(os.getenv("ADMISSION_RATE_PER_SECOND", "0"))
+        self.burst = burst if burst is not None else float(os.getenv("ADMISSION_BURST", str(max(self.rate_per_second * 2, 1))))
+        self.max_concurrent = max_concurrent if max_concurrent is not None else int(os.getenv("ADMISSION_MAX_CONCURRENT", "64"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+        self.max_clients = max_clients or int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict() # client -> [tokens, last refill], LRU
+        self._active = 0
+        self._waiters: List[_Waiter] = [] # Heap, most important and oldest first
+        self._seq = itertools.count()
+        self._request_seconds = 0.05 # Smoothed duration of admitted requests
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def queued(self) -> Dict[str, int]:
+        counts = {priority: 0 for priority in PRIORITIES}
+        for waiter in self._waiters:
+            counts[waiter.priority] += 1
+        return counts
+
+    def check_rate(self, client: str, priority: str):
+        """Takes a token from the client's bucket; raises AdmissionRejected (429) if it is empty."""
+        if self.rate_per_second <= 0:
+            return
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.burst, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate_per_second)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return
+        retry_after = math.ceil((1 - bucket[0]) / self.rate_per_second)
+        raise self._rejected(429, "rate_limited", priority, f"Rate limit of {self.rate_per_second:g} requests/s exceeded.", retry_after)
+
+    async def acquire(self, priority: str, deadline: Optional[float] = None) -> float:
+        """
+        Waits for a slot, most important request first. Returns the wait in seconds;
+        raises AdmissionRejected (503) if the request is shed or its deadline passes.
+        """
+        if deadline is not None and deadline <= time.time():
+            raise self._rejected(503, "deadline", priority, "Request deadline passed before it was admitted.", 1)
+        if self.max_concurrent <= 0 or (self._active < self.max_concurrent and not self._waiters):
+            self._active += 1
+            ADMISSION_QUEUE_WAIT.observe(0.0, priority=priority, outcome="admitted")
+            return 0.0
+
+        rank = PRIORITIES.index(priority)
+        if len(self._waiters) >= self.max_queue:
+            victim = max(self._waiters, default=None) # Least important, newest
+            if victim is None or victim.rank <= rank:
+                raise self._rejected(503, "queue_full", priority, "AI service is overloaded. Please retry shortly.", self._retry_after())
+            self._remove(victim)
+            victim.future.set_exception(
+                self._rejected(503, "shed", victim.priority, "Shed for a higher-priority request. Please retry shortly.", self._retry_after())
+            )
+
+        waiter = _Waiter(rank, next(self._seq), asyncio.get_running_loop().create_future(), deadline, priority)
+        heapq.heappush(self._waiters, waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter.future, None if deadline is None else deadline - time.time())
+        except asyncio.TimeoutError:
+            self._remove(waiter)
+            ADMISSION_QUEUE_WAIT.observe(time.perf_counter() - started, priority=priority, outcome="dropped")
+            raise self._rejected(503, "deadline", priority, "Request deadline passed while it was queued.", 1)
+        except AdmissionRejected:
+            ADMISSION_QUEUE_WAIT.observe(time.perf_counter() - started, priority=priority, outcome="dropped")
+            raise
+        except asyncio.CancelledError:
+            # The client went away; pass on a slot that was handed over in the meantime
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+        waited = time.perf_counter() - started
+        ADMISSION_QUEUE_WAIT.observe(waited, priority=priority, outcome="admitted")
+        return waited
+
+    def release(self, request_seconds: Optional[float] = None):
+        """Frees a slot, handing it to the most important waiter whose deadline has not passed."""
+        if request_seconds is not None:
+            self._request_seconds += 0.2 * (request_seconds - self._request_seconds)
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():
+                continue
+            if waiter.deadline is not None and waiter.deadline <= time.time():
+                waiter.future.set_exception(
+                    self._rejected(503, "deadline", waiter.priority, "Request deadline passed while it was queued.", 1)
+                )
+                continue
+            waiter.future.set_result(None) # The slot passes to the waiter; _active is unchanged
+            return
+        self._active -= 1
+
+    def _remove(self, waiter: _Waiter):
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._request_seconds * (len(self._waiters) + 1) / max(self.max_concurrent, 1)))
+
+    @staticmethod
+    def _rejected(status_code: int, reason: str, priority: str, detail: str, retry_after: int) -> AdmissionRejected:
+        ADMISSION_REJECTED.inc(priority=priority, reason=reason)
+        return AdmissionRejected(status_code, reason, detail, retry_after)
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware applying an AdmissionController to the /ai/ endpoints."""
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        if scope["type"] != "http" or not controller.enabled or not scope["path"].startswith("/ai/"):
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"].rstrip("/") or "/"
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", ())}
+        client = headers.get("x-client-id") or (scope.get("client") or ("unknown",))[0]
+        priority = headers.get("x-priority", "").strip().lower()
+        try:
+            if priority not in PRIORITIES:
+                priority = ENDPOINT_PRIORITIES.get(path, "normal")
+                if path in PRECLASSIFIED_FIELDS and scope["method"] == "POST":
+                    body, receive = await self._buffer_body(headers, receive)
+                    priority = self._pre_classify(body, PRECLASSIFIED_FIELDS[path]) or priority
+            controller.check_rate(client, priority)
+            if path in UNQUEUED_PATHS:
+                await self.app(scope, receive, send)
+                return
+            await controller.acquire(priority, self._deadline(headers))
+        except AdmissionRejected as e:
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers={"Retry-After": str(e.retry_after)})
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(time.perf_counter() - started)
+
+    @staticmethod
+    async def _buffer_body(headers: Dict[str, str], receive):
+        """Reads a small request body and returns it with a receive callable that replays it."""
+        try:
+            if int(headers.get("content-length", "")) > PRECLASSIFY_MAX_BYTES:
+                return None, receive
+        except ValueError:
+            return None, receive
+        chunks, pending = [], []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request": # The client disconnected; the app sees it after the body
+                pending.append(message)
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        pending.insert(0, {"type": "http.request", "body": body, "more_body": False})
+
+        async def replay():
+            return pending.pop(0) if pending else await receive()
+
+        return body, replay
+
+    @staticmethod
+    def _pre_classify(body: Optional[bytes], field: str) -> Optional[str]:
+        if not body:
+            return None
+        try:
+            message = json.loads(body).get(field)
+        except (ValueError, AttributeError):
+            return None
+        return pre_classify(message) if isinstance(message, str) else None
+
+    @staticmethod
+    def _deadline(headers: Dict[str, str]) -> Optional[float]:
+        try:
+            deadline = float(headers["x-request-deadline"])
+        except (KeyError, ValueError):
+            return None
+        return deadline if math.isfinite(deadline) else None
@@ -0,0 +1,91 @@
+import heapq
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Skill that makes an agent eligible for every intent
+GENERALIST_SKILL = "all"
+
+
+class Agent(NamedTuple):
+    agent_id: int
+    name: str
+    skills: Tuple[str, ...]
+
+
+class AgentPool:
+    """
+    Load-aware agent selection over a fixed roster.
+
+    Agents are indexed by skill when the pool is built. Each skill keeps a min-heap
+    of (open_tickets, agent_id) entries, so the least-loaded eligible agent (lowest
+    id on ties) is found in O(log n). Load changes push a fresh entry instead of
+    searching the heap; outdated entries are dropped lazily when they reach the top,
+    and a heap is rebuilt once outdated entries outnumber live ones.
+
+    Intents are served by the agents listed for them first; generalists (skill
+    'all') only get a ticket when no specialist exists for its intent.
+    """
+    def __init__(self, agents: Iterable[Agent], open_tickets: Optional[Dict[int, int]] = None):
+        self.agents: Dict[int, Agent] = {agent.agent_id: agent for agent in agents}
+        open_tickets = open_tickets or {}
+        self._load: Dict[int, int] = {agent_id: max(0, int(open_tickets.get(agent_id, 0))) for agent_id in self.agents}
+        self._members: Dict[str, List[int]] = {}
+        for agent in self.agents.values():
+            for skill in set(agent.skills):
+                self._members.setdefault(skill, []).append(agent.agent_id)
+        self._heaps: Dict[str, List[Tuple[int, int]]] = {}
+        for skill in self._members:
+            self._rebuild(skill)
+        self._lock = threading.Lock()
+
+    def open_tickets(self) -> Dict[int, int]:
+        with self._lock:
+            return dict(self._load)
+
+    def select(self, intent: str, reserve: bool = True) -> Optional[int]:
+        """
+        Returns the least-loaded agent eligible for the intent, or None if the roster
+        has none. With reserve, the agent's open ticket count is incremented at once,
+        so a burst of tickets is spread out before the backend reports real counts.
+        """
+        with self._lock:
+            skill = intent if intent in self._heaps else GENERALIST_SKILL
+            agent_id = self._peek(skill)
+            if agent_id is not None and reserve:
+                self._set_load(agent_id, self._load[agent_id] + 1)
+            return agent_id
+
+    def set_open_tickets(self, loads: Dict[int, int]) -> List[int]:
+        """Applies open ticket counts reported by the backend; returns the unknown agent ids."""
+        unknown = []
+        with self._lock:
+            for agent_id, count in loads.items():
+                if agent_id in self._load:
+                    self._set_load(agent_id, max(0, int(count)))
+                else:
+                    unknown.append(agent_id)
+        return unknown
+
+    def _set_load(self, agent_id: int, count: int):
+        if self._load[agent_id] == count:
+            return
+        self._load[agent_id] = count
+        for skill in set(self.agents[agent_id].skills):
+            heap = self._heaps[skill]
+            heapq.heappush(heap, (count, agent_id))
+            if len(heap) > 2 * len(self._members[skill]) + 8:
+                self._rebuild(skill)
+
+    def _peek(self, skill: str) -> Optional[int]:
+        heap = self._heaps.get(skill)
+        while heap:
+            count, agent_id = heap[0]
+            if self._load[agent_id] == count:
+                return agent_id
+            heapq.heappop(heap) # Outdated entry
+        return None
+
+    def _rebuild(self, skill: str):
+        heap = [(self._load[agent_id], agent_id) for agent_id in self._members[skill]]
+        heapq.heapify(heap)
+        self._heaps[skill] = heap
@@ -0,0 +1,135 @@
+"""
+Probability calibration of linear classifier scores.
+
+LinearSVC margins are not probabilities, and their scale differs between
+models, so they cannot be compared or thresholded consistently. A
+ScoreCalibrator maps the decision_function output the services already compute
+to class probabilities with a handful of vectorized NumPy operations, so no
+extra model pass is needed:
+
+- sigmoid (Platt scaling): p_k = 1 / (1 + exp(a_k * s_k + b_k)) per class
+- isotonic: a monotone piecewise-linear map of each class's score
+
+Multi-class probabilities are fitted one-vs-rest and normalized to sum to 1, as
+in sklearn's CalibratedClassifierCV. Binary classifiers have one score column,
+the margin of classes[1].
+
+The parameters are fitted at training time on cross-validated scores (see
+app.utils.training) and stored as JSON next to the model artifact.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+CALIBRATION_METHODS = ("sigmoid", "isotonic")
+
+
+class ScoreCalibrator:
+    def __init__(self, method: str, classes: Sequence[str], params: List[Dict[str, List[float]]]):
+        if method not in CALIBRATION_METHODS:
+            raise ValueError(f"Unsupported calibration method: {method}")
+        expected = 1 if len(classes) == 2 else len(classes)
+        if len(params) != expected:
+            raise ValueError(f"Expected {expected} calibration curves for {len(classes)} classes, got {len(params)}")
+        self.method = method
+        self.classes = [str(label) for label in classes]
+        self.params = params
+        if method == "sigmoid":
+            self._a = np.array([curve["a"] for curve in params], dtype=float)
+            self._b = np.array([curve["b"] for curve in params], dtype=float)
+        else:
+            self._x = [np.asarray(curve["x"], dtype=float) for curve in params]
+            self._y = [np.asarray(curve["y"], dtype=float) for curve in params]
+        self.version = hashlib.sha256(json.dumps(self.to_dict(), sort_keys=True).encode("utf-8")).hexdigest()[:6]
+
+    def predict_proba(self, decision_scores) -> np.ndarray:
+        """(n_samples, n_classes) probabilities from a decision_function result."""
+        scores = np.asarray(decision_scores, dtype=float)
+        if scores.ndim == 1:
+            scores = scores[:, None]
+        if self.method == "sigmoid":
+            calibrated = 1.0 / (1.0 + np.exp(np.clip(scores * self._a + self._b, -500, 500)))
+        else:
+            calibrated = np.column_stack([
+                np.interp(scores[:, k], self._x[k], self._y[k]) for k in range(scores.shape[1])
+            ])
+
+        if len(self.classes) == 2:
+            return np.column_stack([1.0 - calibrated[:, 0], calibrated[:, 0]])
+        totals = calibrated.sum(axis=1, keepdims=True)
+        uniform = np.full_like(calibrated, 1.0 / calibrated.shape[1])
+        return np.divide(calibrated, totals, out=uniform, where=totals > 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"method": self.method, "classes": self.classes, "params": self.params}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ScoreCalibrator":
+        return cls(data["method"], data["classes"], data["params"])
+
+
+def fit_calibrator(decision_scores, labels: Sequence[str], classes: Sequence[str], method: str = "sigmoid") -> ScoreCalibrator:
+    """
+    Fits one calibration curve per class (one for binary classifiers) that maps the
+    class's score to the probability that the label is that class. The scores should
+    come from models that did not see the labelled samples (cross-validation).
+    """
+    scores = np.asarray(decision_scores, dtype=float)
+    if scores.ndim == 1:
+        scores = scores[:, None]
+    classes = [str(label) for label in classes]
+    labels = np.asarray([str(label) for label in labels])
+    positive_classes = classes[1:] if len(classes) == 2 else classes
+
+    params = []
+    for k, label in enumerate(positive_classes):
+        targets = (labels == label).astype(float)
+        if method == "sigmoid":
+            params.append(_fit_sigmoid(scores[:, k], targets))
+        elif method == "isotonic":
+            params.append(_fit_isotonic(scores[:, k], targets))
+        else:
+            raise ValueError(f"Unsupported calibration method: {method}")
+    return ScoreCalibrator(method, classes, params)
+
+
+def _fit_sigmoid(scores: np.ndarray, targets: np.ndarray) -> Dict[str, float]:
+    """Platt scaling with the smoothed targets of Platt (1999), fitted by logistic regression."""
+    from sklearn.linear_model import LogisticRegression
+
+    positives = targets.sum()
+    negatives = len(targets) - positives
+    smoothed = np.where(targets > 0, (positives + 1) / (positives + 2), 1 / (negatives + 2))
+    # Each sample counts as a positive with weight t and a negative with weight 1 - t
+    X = np.concatenate([scores, scores])[:, None]
+    y = np.concatenate([np.ones(len(scores)), np.zeros(len(scores))])
+    weights = np.concatenate([smoothed, 1 - smoothed])
+    model = LogisticRegression(C=1e6).fit(X, y, sample_weight=weights)
+    return {"a": float(-model.coef_[0, 0]), "b": float(-model.intercept_[0])}
+
+
+def _fit_isotonic(scores: np.ndarray, targets: np.ndarray) -> Dict[str, List[float]]:
+    from sklearn.isotonic import IsotonicRegression
+
+    model = IsotonicRegression(out_of_bounds="clip", y_min=0.0, y_max=1.0).fit(scores, targets)
+    return {"x": model.X_thresholds_.tolist(), "y": model.y_thresholds_.tolist()}
+
+
+def save_calibrator(calibrator: ScoreCalibrator, path: str):
+    staging_path = f"{path}.tmp-{os.getpid()}"
+    with open(staging_path, "w", encoding="utf-8") as f:
+        json.dump(calibrator.to_dict(), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(staging_path, path)
+
+
+def load_calibrator(path: str) -> Optional[ScoreCalibrator]:
+    """Returns the calibrator stored at path, or None if there is none."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return ScoreCalibrator.from_dict(json.load(f))
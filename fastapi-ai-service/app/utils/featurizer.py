@@ -0,0 +1,128 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from app.utils.linear_engine import CompiledLinearModel
+from app.utils.model_artifacts import MappedTextPipeline
+
+logger = logging.getLogger(__name__)
+
+# Vectorizer parameters that determine how raw text is turned into tokens. Two
+# vectorizers with equal values for all of these produce identical token streams,
+# even if they were fitted on different data and have different vocabularies.
+ANALYZER_PARAMS = (
+    "input", "encoding", "decode_error", "strip_accents", "lowercase",
+    "preprocessor", "tokenizer", "analyzer", "stop_words", "token_pattern", "ngram_range"
+)
+
+
+class MessageFeatures:
+    """
+    Per-request featurization cache for a list of messages.
+
+    Each message is tokenized at most once per distinct analyzer configuration, and
+    the TF-IDF matrix for each fitted vectorizer is built at most once from those
+    tokens. The resulting matrices are identical to vectorizer.transform(messages).
+    """
+    def __init__(self, messages: Sequence[str]):
+        self.messages = list(messages)
+        self._tokens: Dict[tuple, List[List[str]]] = {}
+        self._matrices: Dict[int, Tuple[object, sp.csr_matrix]] = {}
+
+    def transform(self, vectorizer) -> sp.csr_matrix:
+        """Returns the feature matrix of the messages for a fitted vectorizer."""
+        cached = self._matrices.get(id(vectorizer))
+        if cached is not None and cached[0] is vectorizer:
+            return cached[1]
+
+        # scikit-learn is imported on first use (it is already loaded once a model is)
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        if isinstance(vectorizer, TfidfVectorizer):
+            matrix = _tfidf_from_tokens(vectorizer, self.tokens_for(vectorizer))
+        elif hasattr(vectorizer, "transform_tokens"):
+            # Vectorizers that accept pre-analyzed tokens, e.g. memory-mapped artifacts
+            matrix = vectorizer.transform_tokens(self.tokens_for(vectorizer))
+        else:
+            matrix = vectorizer.transform(self.messages)
+        self._matrices[id(vectorizer)] = (vectorizer, matrix)
+        return matrix
+
+    def tokens_for(self, vectorizer) -> List[List[str]]:
+        """Returns the analyzed tokens of the messages for a vectorizer (or anything with its get_params/build_analyzer)."""
+        params = vectorizer.get_params()
+        # repr() keeps unhashable values (e.g. stop word lists) usable as a key;
+        # custom callables compare by identity through their repr.
+        signature = tuple(repr(params.get(name)) for name in ANALYZER_PARAMS)
+        tokens = self._tokens.get(signature)
+        if tokens is None:
+            analyze = vectorizer.build_analyzer()
+            tokens = [analyze(message) for message in self.messages]
+            self._tokens[signature] = tokens
+        return tokens
+
+
+def _tfidf_from_tokens(vectorizer, tokens: List[List[str]]) -> sp.csr_matrix:
+    """Mirrors TfidfVectorizer.transform, starting from already analyzed tokens."""
+    from sklearn.preprocessing import normalize
+
+    vocabulary = vectorizer.vocabulary_
+    j_indices: List[int] = []
+    values: List[int] = []
+    indptr = [0]
+    for doc_tokens in tokens:
+        feature_counter: Dict[int, int] = {}
+        for token in doc_tokens:
+            feature_idx = vocabulary.get(token)
+            if feature_idx is not None:
+                feature_counter[feature_idx] = feature_counter.get(feature_idx, 0) + 1
+        j_indices.extend(feature_counter.keys())
+        values.extend(feature_counter.values())
+        indptr.append(len(j_indices))
+
+    X = sp.csr_matrix(
+        (np.asarray(values, dtype=np.intc), np.asarray(j_indices, dtype=np.int32), np.asarray(indptr, dtype=np.int32)),
+        shape=(len(tokens), len(vocabulary)),
+        dtype=vectorizer.dtype
+    )
+    X.sort_indices()
+    if vectorizer.binary:
+        X.data.fill(1)
+
+    if X.dtype not in (np.float64, np.float32):
+        X = X.astype(np.float64)
+    if vectorizer.sublinear_tf:
+        np.log(X.data, X.data)
+        X.data += 1.0
+    if vectorizer.use_idf:
+        X.data *= vectorizer.idf_[X.indices]
+    if vectorizer.norm is not None:
+        X = normalize(X, norm=vectorizer.norm, copy=False)
+    return X
+
+
+def decision_scores(
+    pipeline,
+    messages: Sequence[str],
+    features: Optional[MessageFeatures] = None,
+    engine: Optional[CompiledLinearModel] = None
+):
+    """
+    Computes pipeline.decision_function(messages). When a compiled engine of the
+    pipeline is given, it scores the messages (from the shared tokens, if any).
+    Otherwise, when shared features are given and the pipeline is a plain
+    (vectorizer, classifier) Pipeline (or a memory-mapped stand-in for one), the
+    classifier head is fed the cached matrix directly instead of re-vectorizing the text.
+    """
+    if engine is not None:
+        if features is not None:
+            return engine.decision_function_tokens(features.tokens_for(engine))
+        return engine.decision_function(messages)
+    from sklearn.pipeline import Pipeline
+
+    if features is not None and isinstance(pipeline, (Pipeline, MappedTextPipeline)) and len(pipeline.steps) == 2:
+        vectorizer, classifier = pipeline.steps[0][1], pipeline.steps[1][1]
+        return classifier.decision_function(features.transform(vectorizer))
+    return pipeline.decision_function(list(messages))
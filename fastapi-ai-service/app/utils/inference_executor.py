@@ -0,0 +1,146 @@
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Services registered for process mode. Worker processes are forked from the API
+# process, so they inherit this registry (and the models already loaded by it)
+# without having to unpickle a copy of each model on every call.
+_registered_targets: Dict[str, Any] = {}
+
+
+class InferenceQueueFullError(Exception):
+    """Raised when the inference executor has no free worker and its queue is full."""
+
+
+def _invoke_registered(target_name: str, method_name: str, args: tuple, kwargs: dict):
+    """Entry point executed inside process pool workers."""
+    return getattr(_registered_targets[target_name], method_name)(*args, **kwargs)
+
+
+class InferenceExecutor:
+    """
+    Runs blocking model inference off the asyncio event loop.
+
+    In "thread" mode (default) work runs in a thread pool; scikit-learn and numpy
+    release the GIL for most of the numeric work. In "process" mode work runs in a
+    forked process pool, which suits CPU-bound models that hold the GIL.
+
+    The number of submitted-but-unfinished tasks is bounded by
+    max_workers + max_queue. Submissions beyond that bound fail fast with
+    InferenceQueueFullError instead of queueing without limit.
+    """
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None
+    ):
+        self.mode = (mode or os.getenv("INFERENCE_EXECUTOR_MODE", "thread")).lower()
+        if self.mode not in ("thread", "process"):
+            raise ValueError(f"Unsupported inference executor mode: {self.mode}")
+        self.max_workers = max_workers or int(os.getenv("INFERENCE_MAX_WORKERS", str(os.cpu_count() or 1)))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("INFERENCE_MAX_QUEUE", "64"))
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self.rejected = 0 # Submissions refused because the queue was full
+        self._lock = threading.Lock()
+
+    def register(self, name: str, target: Any):
+        """
+        Registers a service so that its bound methods can be called by name in process
+        mode. Must be called before the first submission (i.e. before workers fork),
+        or followed by restart() so that new workers see the current object.
+        """
+        _registered_targets[name] = target
+
+    @property
+    def pending(self) -> int:
+        """Number of tasks submitted and not yet finished (running + queued)."""
+        return self._pending
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of tasks waiting for a free worker."""
+        return max(0, self._pending - self.max_workers)
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Runs fn(*args, **kwargs) on the executor and awaits its result."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise InferenceQueueFullError(
+                    f"Inference queue is full ({self._pending} pending, max {self.max_workers + self.max_queue})."
+                )
+            self._pending += 1
+
+        try:
+            future = self._get_executor().submit(*self._prepare_call(fn, args, kwargs))
+        except Exception:
+            self._task_done(None)
+            raise
+        # Release the slot when the work itself finishes, not when the awaiting request
+        # goes away, so a cancelled request cannot make the queue look emptier than it is.
+        future.add_done_callback(self._task_done)
+        return await asyncio.wrap_future(future)
+
+    def restart(self):
+        """
+        Replaces the worker pool. In process mode this makes workers pick up objects
+        registered or reloaded after the previous workers were forked.
+        """
+        old_executor, self._executor = self._executor, None
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _task_done(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def _prepare_call(self, fn: Callable, args: tuple, kwargs: dict) -> tuple:
+        if self.mode == "process":
+            # Call registered services by name so the worker uses its inherited copy
+            # instead of receiving the pickled service (and its model) on every call.
+            owner = getattr(fn, "__self__", None)
+            for name, target in _registered_targets.items():
+                if target is owner:
+                    return (_invoke_registered, name, fn.__name__, args, kwargs)
+            if kwargs:
+                return (_call_with_kwargs, fn, args, kwargs)
+            return (fn,) + args
+        # Threads run the call in a copy of the caller's context, so request-scoped
+        # state (e.g. the log sampling decision) applies to the work it hands off
+        context = contextvars.copy_context()
+        if kwargs:
+            return (context.run, _call_with_kwargs, fn, args, kwargs)
+        return (context.run, fn) + args
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("fork")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="inference"
+                )
+            logger.info(f"Inference executor started in {self.mode} mode with {self.max_workers} workers (queue limit {self.max_queue}).")
+        return self._executor
+
+
+def _call_with_kwargs(fn: Callable, args: tuple, kwargs: dict):
+    return fn(*args, **kwargs)
@@ -0,0 +1,221 @@
+import heapq
+import math
+import re
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+# Same token definition as scikit-learn's default TfidfVectorizer token_pattern
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+# Keywords are curated for matching, so they count more than words of the question
+KEYWORD_WEIGHT = 2.0
+
+# Standard Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+_stop_words: Optional[FrozenSet[str]] = None
+
+
+def _english_stop_words() -> FrozenSet[str]:
+    # scikit-learn's list, imported on first use to keep it out of the service's import time
+    global _stop_words
+    if _stop_words is None:
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+        _stop_words = ENGLISH_STOP_WORDS
+    return _stop_words
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases and splits text into word tokens, dropping English stop words."""
+    stop_words = _stop_words or _english_stop_words()
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in stop_words]
+
+
+def question_key(text: str) -> str:
+    """Key under which a message matches a question exactly: its words, ignoring case and punctuation."""
+    return " ".join(TOKEN_PATTERN.findall(text.lower()))
+
+
+def _intent(entry: Dict) -> str:
+    return (entry.get("intent_keyword") or "").lower()
+
+
+def _question(entry: Dict) -> str:
+    return question_key(entry.get("question") or "")
+
+
+def _term_weights(entry: Dict) -> Dict[str, float]:
+    term_weights: Dict[str, float] = {}
+    for token in tokenize(entry.get("question", "")):
+        term_weights[token] = term_weights.get(token, 0.0) + 1.0
+    for keyword in entry.get("keywords", []):
+        for token in tokenize(keyword):
+            term_weights[token] = term_weights.get(token, 0.0) + KEYWORD_WEIGHT
+    return term_weights
+
+
+class KnowledgeBaseIndex:
+    """
+    Immutable search index over a list of knowledge base entries.
+
+    Holds intent_keyword -> entry and exact question -> entry hash maps and an inverted index from token to the
+    weighted term frequencies of the entries containing it. Queries are scored with
+    BM25 over the question and keyword fields, touching only the posting lists of the
+    query tokens instead of scanning every entry. An optional semantic index (see
+    app.utils.kb_vectors) over the same entries travels with it, so both are
+    swapped together when the knowledge base changes.
+
+    with_changes() derives the index of an edited knowledge base without rebuilding
+    it: entry ids (positions in entries) stay stable, deleted entries leave a None
+    slot behind, and only the posting lists of the edited entries' tokens are copied.
+    """
+    def __init__(self, entries: List[Optional[Dict]], semantic=None):
+        self.entries = entries
+        self.semantic = semantic # SemanticIndex over the same entries, if semantic retrieval is enabled
+        self.version: Optional[str] = None # Knowledge base version the entries belong to
+        self.intent_map: Dict[str, int] = {}
+        self.question_map: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.doc_lengths: List[float] = [0.0] * len(entries)
+        self.ids: Dict[str, int] = {} # entry["id"] -> position, for entries that have one
+        self.live_entries = 0
+        self.total_length = 0.0
+
+        for doc_id, entry in enumerate(entries):
+            if entry is not None:
+                self._add(doc_id, entry, None)
+
+    @property
+    def avg_doc_length(self) -> float:
+        return self.total_length / self.live_entries if self.total_length else 1.0
+
+    def __len__(self):
+        return self.live_entries
+
+    def live(self) -> List[Dict]:
+        """The entries that have not been deleted, in knowledge base order."""
+        return [entry for entry in self.entries if entry is not None]
+
+    def with_changes(self, upserts: List[Dict], deletes: List[str]) -> "KnowledgeBaseIndex":
+        """
+        Returns a new index in which the entries with the given ids are deleted and the
+        upserted entries replace the entry with the same id, or are appended. This
+        index is left unchanged, so searches running on it are not affected. The
+        semantic index is not carried over.
+        """
+        index = KnowledgeBaseIndex([])
+        index.entries = list(self.entries)
+        index.intent_map = dict(self.intent_map)
+        index.question_map = dict(self.question_map)
+        index.postings = dict(self.postings) # Posting lists are shared until they are modified
+        index.doc_lengths = list(self.doc_lengths)
+        index.ids = dict(self.ids)
+        index.live_entries, index.total_length = self.live_entries, self.total_length
+
+        owned: Set[str] = set()
+        changed_intents: Set[str] = set()
+        changed_questions: Set[str] = set()
+        for entry_id in deletes:
+            doc_id = index.ids.get(entry_id)
+            if doc_id is not None:
+                changed_intents.add(_intent(index.entries[doc_id]))
+                changed_questions.add(_question(index.entries[doc_id]))
+                index._remove(doc_id, owned)
+        for entry in upserts:
+            doc_id = index.ids.get(entry["id"])
+            if doc_id is None:
+                doc_id = len(index.entries)
+                index.entries.append(None)
+                index.doc_lengths.append(0.0)
+            else:
+                changed_intents.add(_intent(index.entries[doc_id]))
+                changed_questions.add(_question(index.entries[doc_id]))
+                index._remove(doc_id, owned)
+            index._add(doc_id, entry, owned)
+
+        # An intent or question whose first entry was edited or deleted falls to its next entry, if any
+        index._refresh_first_entries(index.intent_map, changed_intents, _intent)
+        index._refresh_first_entries(index.question_map, changed_questions, _question)
+        return index
+
+    def _refresh_first_entries(self, first_entries: Dict[str, int], changed: Set[str], key_of):
+        for key in changed - {""}:
+            doc_id = first_entries.get(key)
+            if doc_id is None or self.entries[doc_id] is None or key_of(self.entries[doc_id]) != key:
+                first_entries.pop(key, None)
+                doc_id = next((i for i, entry in enumerate(self.entries) if entry is not None and key_of(entry) == key), None)
+                if doc_id is not None:
+                    first_entries[key] = doc_id
+
+    def _add(self, doc_id: int, entry: Dict, owned: Optional[Set[str]]):
+        self.entries[doc_id] = entry
+        intent = _intent(entry)
+        # Keep the first entry for an intent, as the linear scan did
+        if intent and self.intent_map.get(intent, doc_id) >= doc_id:
+            self.intent_map[intent] = doc_id
+        question = _question(entry)
+        if question and self.question_map.get(question, doc_id) >= doc_id:
+            self.question_map[question] = doc_id
+        if entry.get("id") is not None:
+            self.ids[entry["id"]] = doc_id
+
+        term_weights = _term_weights(entry)
+        for token, weight in term_weights.items():
+            self._posting(token, owned)[doc_id] = weight
+        self.doc_lengths[doc_id] = sum(term_weights.values())
+        self.total_length += self.doc_lengths[doc_id]
+        self.live_entries += 1
+
+    def _remove(self, doc_id: int, owned: Set[str]):
+        entry = self.entries[doc_id]
+        for token in _term_weights(entry):
+            posting = self._posting(token, owned)
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[token]
+        if entry.get("id") is not None:
+            self.ids.pop(entry["id"], None)
+        self.total_length -= self.doc_lengths[doc_id]
+        self.doc_lengths[doc_id] = 0.0
+        self.live_entries -= 1
+        self.entries[doc_id] = None
+
+    def _posting(self, token: str, owned: Optional[Set[str]]) -> Dict[int, float]:
+        """The posting list of a token, copied first if it is still shared with another index."""
+        if owned is None:
+            return self.postings.setdefault(token, {})
+        if token not in owned or token not in self.postings:
+            self.postings[token] = dict(self.postings.get(token, {}))
+            owned.add(token)
+        return self.postings[token]
+
+    def lookup_intent(self, intent: Optional[str]) -> Optional[int]:
+        """Returns the id of the entry registered for an intent, if any."""
+        if not intent:
+            return None
+        return self.intent_map.get(intent.lower())
+
+    def lookup_question(self, query: str) -> Optional[int]:
+        """Returns the id of the entry whose question the query repeats word for word, if any."""
+        return self.question_map.get(question_key(query))
+
+    def search(self, query: str, top_k: int = 1) -> List[Tuple[int, float]]:
+        """Returns up to top_k (entry id, BM25 score) pairs, best first."""
+        if top_k <= 0 or not self.live_entries:
+            return []
+
+        n_docs = self.live_entries
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            posting = self.postings.get(token)
+            if not posting:
+                continue
+            idf = math.log(1.0 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                length_norm = 1.0 - BM25_B + BM25_B * self.doc_lengths[doc_id] / self.avg_doc_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + BM25_K1 * length_norm)
+
+        # Ties are broken in favour of the entry that appears first in the knowledge base
+        best = heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(doc_id, score) for doc_id, score in best]
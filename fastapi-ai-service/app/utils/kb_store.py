@@ -0,0 +1,230 @@
+"""
+On-disk storage of the knowledge base: the JSON array file plus an append-only
+change log.
+
+Entry edits made through the API are appended to the log as one JSON line each
+and fsynced before they are applied, so they survive a restart without rewriting
+the (possibly large) knowledge base file. The log starts with a header naming
+the version of the knowledge base file it applies to:
+
+    {"format": "kb-log", "base": "<file version>"}
+    {"op": "upsert", "entry": {"id": "...", "question": "...", ...}}
+    {"op": "delete", "id": "..."}
+
+Compaction writes the current entries to the knowledge base file (atomically
+replaced) and then starts a new log for the new file version. A crash between
+the two steps leaves a log whose base no longer matches the file; such a log is
+moved aside on load, which is correct because the file already contains its
+changes. The same applies when the file is replaced by hand.
+
+Several server workers can serve the same knowledge base file. Each holds its
+own index, so a worker that appends, compacts or loads holds an exclusive lock
+on `<log>.lock` (flock) and first reads the records the others appended since it
+last read the log (read_new); a log replaced by another worker's compaction
+means the file has to be read again.
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError: # Windows: no locking between processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "kb-log"
+
+
+def iter_json_array(f: IO[str], chunk_size: int = 1024 * 1024) -> Iterator[Any]:
+    """
+    Yields the elements of the JSON array in a text file one at a time, reading it
+    in chunks, so neither the whole file text nor a second copy of the parsed array
+    is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+    expect = "["
+
+    def more() -> bool:
+        nonlocal buffer, position, eof
+        data = f.read(chunk_size)
+        buffer = buffer[position:] + data
+        position = 0
+        eof = not data
+        return bool(data)
+
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position == len(buffer):
+            if more():
+                continue
+            raise json.JSONDecodeError("Unexpected end of knowledge base file", buffer, position)
+
+        char = buffer[position]
+        if expect == "[":
+            if char != "[":
+                raise ValueError("knowledge base must be a JSON array of entries")
+            position += 1
+            expect = "value or ]"
+        elif expect in ("value or ]", ", or ]") and char == "]":
+            return
+        elif expect == ", or ]":
+            if char != ",":
+                raise json.JSONDecodeError("Expected ',' or ']'", buffer, position)
+            position += 1
+            expect = "value"
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if more():
+                    continue
+                raise
+            if end == len(buffer) and not eof and more():
+                continue # A number may continue in the next chunk
+            position = end
+            expect = ", or ]"
+            yield value
+
+
+def write_json_array_atomic(path: str, entries: List[Dict]):
+    """Writes entries as a JSON array next to path and renames it into place."""
+    staging_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(staging_path, "w", encoding="utf-8") as f:
+            f.write("[\n")
+            for position, entry in enumerate(entries):
+                f.write(",\n" if position else "")
+                f.write(json.dumps(entry, ensure_ascii=False))
+            f.write("\n]\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(staging_path, path)
+    except BaseException:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+        raise
+
+
+class KnowledgeBaseLog:
+    """
+    The append-only change log of a knowledge base file. Not thread-safe; callers
+    serialize writes within a process and hold locked() across processes.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.base: Optional[str] = None # File version the log applies to
+        self.records = 0 # Change records in the log
+        self.offset = 0 # Bytes of the log this process has read or written
+        self._file_id: Optional[Tuple[int, int]] = None # (device, inode) of that log file
+
+    @contextmanager
+    def locked(self):
+        """Holds the lock that serializes log reads and writes of all processes."""
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            yield # Closing the file releases the lock
+
+    def read(self, base: str) -> List[Dict]:
+        """
+        Returns the change records that apply to the given knowledge base file
+        version and opens the log for appending to it. A log for another version is
+        moved aside, and a torn last record (a crash during an append) is cut off.
+        """
+        records: List[Dict] = []
+        self.offset, self._file_id = 0, None
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                header = _parse_line(f.readline())
+                if header is None or header.get("format") != LOG_FORMAT or header.get("base") != base:
+                    stale_path = f"{self.path}.stale-{int(time.time())}"
+                    os.replace(self.path, stale_path)
+                    logger.warning(f"Knowledge base log does not apply to file version {base}; moved it to {stale_path}")
+                else:
+                    records = self._read_records(f, f.tell())
+        self.base, self.records = base, len(records)
+        return records
+
+    def read_new(self) -> Optional[List[Dict]]:
+        """
+        Returns the records other processes appended since this process last read or
+        wrote the log, or None if the log was replaced meanwhile (compacted into a new
+        file version), in which case the knowledge base file has to be read again.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return [] if self._file_id is None else None
+        with f:
+            stat = os.fstat(f.fileno())
+            if self._file_id is None:
+                # Started by another process since this one read the knowledge base
+                header = _parse_line(f.readline())
+                if header is None or header.get("format") != LOG_FORMAT or header.get("base") != self.base:
+                    return None
+                records = self._read_records(f, f.tell())
+            elif (stat.st_dev, stat.st_ino) != self._file_id:
+                return None
+            else:
+                records = self._read_records(f, self.offset)
+        self.records += len(records)
+        return records
+
+    def _read_records(self, f, start: int) -> List[Dict]:
+        """Reads the records from start to the end of the log, cutting off a torn last record."""
+        records: List[Dict] = []
+        f.seek(start)
+        valid_end = start
+        for line in f:
+            record = _parse_line(line)
+            if record is None:
+                break
+            records.append(record)
+            valid_end = f.tell()
+        stat = os.fstat(f.fileno())
+        if valid_end < stat.st_size:
+            logger.warning(f"Discarding a torn record at the end of {self.path}")
+            os.truncate(self.path, valid_end)
+        self.offset, self._file_id = valid_end, (stat.st_dev, stat.st_ino)
+        return records
+
+    def append(self, records: List[Dict]):
+        """Appends change records and waits until they are on disk."""
+        if not os.path.exists(self.path):
+            self.reset(self.base)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            self.offset = os.fstat(f.fileno()).st_size
+        self.records += len(records)
+
+    def reset(self, base: str):
+        """Replaces the log with an empty one for the given knowledge base file version."""
+        staging_path = f"{self.path}.tmp-{os.getpid()}"
+        with open(staging_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"format": LOG_FORMAT, "base": base}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            stat = os.fstat(f.fileno())
+        os.replace(staging_path, self.path)
+        self.base, self.records = base, 0
+        self.offset, self._file_id = stat.st_size, (stat.st_dev, stat.st_ino)
+
+
+def _parse_line(line: bytes) -> Optional[Dict]:
+    if not line.endswith(b"\n"):
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
@@ -0,0 +1,312 @@
+"""
+Semantic nearest-neighbour retrieval over knowledge base entries.
+
+Entries are embedded in a latent semantic (LSA) space learned from the knowledge
+base itself: TF-IDF over word unigrams and bigrams, reduced with a truncated SVD,
+so terms that co-occur across entries ("log in", "password", "login page") end up
+close together and paraphrases match without shared keywords. Everything runs
+locally with scikit-learn and NumPy; no model download or network access is
+needed.
+
+The L2-normalized embeddings form one contiguous float32 matrix, so a batch of
+queries is answered by a single matrix product followed by an argpartition top-k.
+Once the knowledge base exceeds ivf_min_entries, an inverted-file (IVF) index
+narrows each query to the entries of its nprobe nearest k-means clusters.
+
+When the knowledge base changes, update() reuses the rows of unchanged entries
+and embeds only new or edited ones in the existing space; the space itself is
+refitted only after a large share of the entries changed. With a cache
+directory, the matrix is written to disk and memory-mapped, so processes on a
+host share its pages, and a restart with an unchanged knowledge base loads the
+space and matrix instead of fitting and embedding again.
+"""
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def entry_text(entry: Optional[Dict]) -> str:
+    """The text an entry is embedded from: its question, keywords and answer (nothing for a deleted entry)."""
+    if entry is None:
+        return ""
+    return " ".join([entry.get("question") or "", " ".join(entry.get("keywords") or []), entry.get("answer") or ""])
+
+
+def entry_key(entry: Dict) -> str:
+    return hashlib.sha1(entry_text(entry).encode("utf-8")).hexdigest()
+
+
+class EmbeddingSpace:
+    """TF-IDF vectorizer plus an optional LSA projection; embeds texts as normalized float32 rows."""
+    def __init__(self, vectorizer, projection: Optional[np.ndarray]):
+        self.vectorizer = vectorizer
+        self.projection = projection # (n_terms, dim), None when the KB is too small to reduce
+        self.dim = projection.shape[1] if projection is not None else len(vectorizer.vocabulary_)
+
+    @classmethod
+    def fit(cls, texts: List[str], dim: int) -> "EmbeddingSpace":
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, stop_words="english", dtype=np.float32)
+        tfidf = vectorizer.fit_transform(texts)
+        n_components = min(dim, tfidf.shape[0] - 1, tfidf.shape[1] - 1)
+        if n_components < 2:
+            return cls(vectorizer, None)
+        svd = TruncatedSVD(n_components=n_components, random_state=0).fit(tfidf)
+        # Stored transposed, so that projecting a sparse TF-IDF batch does not copy it
+        return cls(vectorizer, np.ascontiguousarray(svd.components_.T, dtype=np.float32))
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        tfidf = self.vectorizer.transform(texts)
+        vectors = tfidf @ self.projection if self.projection is not None else tfidf.toarray()
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+class IVFIndex:
+    """Inverted file: entry ids grouped by their nearest k-means centroid."""
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(len(centroids) + 1))
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray) -> "IVFIndex":
+        from sklearn.cluster import MiniBatchKMeans
+
+        n_lists = max(1, int(np.sqrt(len(embeddings))))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=0, n_init=3, batch_size=4096).fit(embeddings)
+        centroids = np.ascontiguousarray(kmeans.cluster_centers_, dtype=np.float32)
+        return cls(centroids, kmeans.labels_.astype(np.int32))
+
+    def assign(self, embeddings: np.ndarray) -> np.ndarray:
+        return np.argmax(embeddings @ self.centroids.T, axis=1).astype(np.int32)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        similarities = self.centroids @ query
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-similarities, nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes])
+
+
+class SemanticIndex:
+    """
+    Immutable embedding index over a list of knowledge base entries; row i of the
+    matrix is entry i. Build with build(), derive the index of a changed knowledge
+    base with update().
+    """
+    def __init__(
+        self,
+        space: EmbeddingSpace,
+        keys: List[str],
+        embeddings: np.ndarray,
+        ivf: Optional[IVFIndex] = None,
+        nprobe: int = 8
+    ):
+        self.space = space
+        self.keys = keys
+        self.embeddings = embeddings
+        self.ivf = ivf
+        self.nprobe = nprobe
+        self.embedded_since_fit = 0 # Entries embedded into the space after it was fitted
+
+    @classmethod
+    def build(
+        cls,
+        entries: List[Dict],
+        dim: int = 128,
+        ivf_min_entries: int = 50000,
+        nprobe: int = 8,
+        cache_dir: Optional[str] = None
+    ) -> "SemanticIndex":
+        keys = [entry_key(entry) for entry in entries]
+        cached = _load_cached(cache_dir, keys, dim)
+        if cached is not None:
+            space, embeddings = cached
+        else:
+            space = EmbeddingSpace.fit([entry_text(entry) for entry in entries], dim)
+            embeddings = _store_cached(cache_dir, keys, dim, space, space.embed([entry_text(entry) for entry in entries]))
+        ivf = IVFIndex.build(embeddings) if len(entries) >= ivf_min_entries else None
+        logger.info(
+            f"Semantic KB index {'loaded' if cached is not None else 'built'}: {len(entries)} entries, "
+            f"{space.dim} dimensions, {'IVF' if ivf else 'exact'} search"
+        )
+        return cls(space, keys, embeddings, ivf, nprobe)
+
+    def update(
+        self,
+        entries: List[Dict],
+        refit_fraction: float = 0.2,
+        dim: int = 128,
+        ivf_min_entries: int = 50000,
+        cache_dir: Optional[str] = None
+    ) -> "SemanticIndex":
+        """
+        Returns the index of a changed knowledge base. Rows of unchanged entries are
+        copied, and only new or edited entries are embedded. The embedding space (and
+        the IVF clustering) is refitted from scratch once more than refit_fraction of
+        the entries were embedded after the last fit.
+        """
+        keys = [entry_key(entry) for entry in entries]
+        previous_rows = {key: row for row, key in enumerate(self.keys)}
+        new_positions = [position for position, key in enumerate(keys) if key not in previous_rows]
+        if not entries or self.embedded_since_fit + len(new_positions) > refit_fraction * len(entries):
+            return SemanticIndex.build(entries, dim, ivf_min_entries, self.nprobe, cache_dir)
+
+        embeddings = np.zeros((len(entries), self.space.dim), dtype=np.float32)
+        reused = [(position, previous_rows[key]) for position, key in enumerate(keys) if key in previous_rows]
+        if reused:
+            positions, rows = map(np.asarray, zip(*reused))
+            embeddings[positions] = self.embeddings[rows]
+        if new_positions:
+            embeddings[new_positions] = self.space.embed([entry_text(entries[position]) for position in new_positions])
+        embeddings = _store_cached(cache_dir, keys, dim, self.space, embeddings)
+
+        ivf = None
+        if len(entries) >= ivf_min_entries:
+            if self.ivf is None:
+                ivf = IVFIndex.build(embeddings)
+            else:
+                assignments = np.empty(len(entries), dtype=np.int32)
+                if reused:
+                    assignments[positions] = self.ivf.assignments[rows]
+                if new_positions:
+                    assignments[new_positions] = self.ivf.assign(embeddings[new_positions])
+                ivf = IVFIndex(self.ivf.centroids, assignments)
+
+        index = SemanticIndex(self.space, keys, embeddings, ivf, self.nprobe)
+        index.embedded_since_fit = self.embedded_since_fit + len(new_positions)
+        logger.info(f"Semantic KB index updated: {len(new_positions)} entries embedded, {len(reused)} reused")
+        return index
+
+    def with_changes(
+        self,
+        changes: Dict[int, Optional[Dict]],
+        entries: List[Optional[Dict]],
+        refit_fraction: float = 0.2,
+        dim: int = 128,
+        ivf_min_entries: int = 50000
+    ) -> "SemanticIndex":
+        """
+        Returns the index after the entries at the given positions changed (None for a
+        deleted entry, whose row becomes zero and never matches); entries is the full
+        new entry list, positions past the current end are appended. Only the changed
+        rows are embedded; the matrix is copied so that searches running on this index
+        are not affected. Falls back to update() when a refit is due.
+        """
+        embedded = sum(1 for entry in changes.values() if entry is not None)
+        if self.embedded_since_fit + embedded > refit_fraction * len(entries):
+            return self.update(entries, refit_fraction, dim, ivf_min_entries)
+
+        embeddings = np.zeros((len(entries), self.space.dim), dtype=np.float32)
+        embeddings[:len(self.keys)] = self.embeddings
+        keys = self.keys + [""] * (len(entries) - len(self.keys))
+        positions = sorted(changes)
+        embeddings[positions] = self.space.embed([entry_text(changes[position]) for position in positions])
+        for position in positions:
+            keys[position] = entry_key(changes[position]) if changes[position] is not None else ""
+
+        ivf = None
+        if self.ivf is not None:
+            assignments = np.zeros(len(entries), dtype=np.int32)
+            assignments[:len(self.keys)] = self.ivf.assignments
+            assignments[positions] = self.ivf.assign(embeddings[positions])
+            ivf = IVFIndex(self.ivf.centroids, assignments)
+        elif len(entries) >= ivf_min_entries:
+            ivf = IVFIndex.build(embeddings)
+
+        index = SemanticIndex(self.space, keys, embeddings, ivf, self.nprobe)
+        index.embedded_since_fit = self.embedded_since_fit + embedded
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search_batch(self, queries: Sequence[str], top_k: int = 1) -> List[List[Tuple[int, float]]]:
+        """Returns up to top_k (entry id, cosine similarity) pairs per query, best first."""
+        if top_k <= 0 or not len(self.keys) or not queries:
+            return [[] for _ in queries]
+        query_vectors = self.space.embed(queries)
+
+        if self.ivf is None:
+            similarities = query_vectors @ self.embeddings.T # (n_queries, n_entries)
+            return [_top_k(np.arange(len(self.keys)), row, top_k) for row in similarities]
+
+        results = []
+        for query_vector in query_vectors:
+            candidates = self.ivf.candidates(query_vector, self.nprobe)
+            results.append(_top_k(candidates, self.embeddings[candidates] @ query_vector, top_k))
+        return results
+
+
+def _top_k(ids: np.ndarray, similarities: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    if len(ids) > top_k:
+        best = np.argpartition(-similarities, top_k - 1)[:top_k]
+        ids, similarities = ids[best], similarities[best]
+    # Ties are broken in favour of the entry that appears first in the knowledge base
+    order = np.lexsort((ids, -similarities))
+    return [(int(ids[i]), float(similarities[i])) for i in order if similarities[i] > 0]
+
+
+def _cache_paths(cache_dir: str, keys: List[str], dim: int) -> Tuple[str, str]:
+    digest = hashlib.sha1(f"{dim}:".encode("utf-8"))
+    for key in keys:
+        digest.update(key.encode("utf-8"))
+    prefix = os.path.join(cache_dir, f"kb-vectors-{digest.hexdigest()[:16]}")
+    return f"{prefix}.npy", f"{prefix}.space.joblib"
+
+
+def _load_cached(cache_dir: Optional[str], keys: List[str], dim: int) -> Optional[Tuple[EmbeddingSpace, np.ndarray]]:
+    """The embedding space and memory-mapped matrix stored for exactly these entries, if any."""
+    if not cache_dir:
+        return None
+    embeddings_path, space_path = _cache_paths(cache_dir, keys, dim)
+    if not (os.path.exists(embeddings_path) and os.path.exists(space_path)):
+        return None
+    try:
+        import joblib
+
+        embeddings = np.load(embeddings_path, mmap_mode="r")
+        space = joblib.load(space_path)
+        if embeddings.shape != (len(keys), space.dim):
+            raise ValueError(f"unexpected matrix shape {embeddings.shape}")
+        return space, embeddings
+    except Exception as e:
+        logger.warning(f"Ignoring cached KB embeddings in {cache_dir}: {e}")
+        return None
+
+
+def _store_cached(cache_dir: Optional[str], keys: List[str], dim: int, space: EmbeddingSpace, embeddings: np.ndarray) -> np.ndarray:
+    """
+    With a cache directory, stores the space and matrix there (replacing those of
+    earlier knowledge base versions) and returns a read-only memory map of the matrix.
+    """
+    if not cache_dir:
+        return embeddings
+    embeddings_path, space_path = _cache_paths(cache_dir, keys, dim)
+    try:
+        import joblib
+
+        os.makedirs(cache_dir, exist_ok=True)
+        staging_suffix = f".tmp-{os.getpid()}"
+        joblib.dump(space, space_path + staging_suffix)
+        os.replace(space_path + staging_suffix, space_path)
+        with open(embeddings_path + staging_suffix, "wb") as f:
+            np.save(f, np.ascontiguousarray(embeddings))
+        os.replace(embeddings_path + staging_suffix, embeddings_path)
+        current = {os.path.basename(embeddings_path), os.path.basename(space_path)}
+        for name in os.listdir(cache_dir):
+            if name.startswith("kb-vectors-") and name not in current:
+                os.remove(os.path.join(cache_dir, name))
+        return np.load(embeddings_path, mmap_mode="r")
+    except Exception as e:
+        logger.warning(f"Keeping KB embeddings in memory, could not store them in {cache_dir}: {e}")
+        return embeddings
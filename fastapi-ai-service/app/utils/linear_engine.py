@@ -0,0 +1,118 @@
+"""
+Compiled inference path for TF-IDF + linear classifier pipelines.
+
+For one short message, most of the time spent in pipeline.decision_function is
+sklearn's input validation, sparse matrix construction and estimator dispatch
+rather than arithmetic. CompiledLinearModel extracts the fitted state once
+(vocabulary dict, idf weights, transposed coefficients, intercepts) and scores
+each message with a dict lookup per token and a dot product over the few rows
+of the coefficient matrix the message touches.
+
+The arithmetic follows sklearn's operation order (TfidfTransformer weighting,
+row normalization, then the CSR x dense product of the classifier), so the scores
+are bit-for-bit identical to pipeline.decision_function.
+"""
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledLinearModel:
+    """Scores text like a fitted Pipeline([('tfidf', TfidfVectorizer), ('clf', linear classifier)])."""
+    def __init__(self, pipeline):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.pipeline import Pipeline
+
+        if not isinstance(pipeline, Pipeline) or len(pipeline.steps) != 2:
+            raise ValueError(f"{type(pipeline).__name__} is not a two-step (vectorizer, classifier) Pipeline.")
+        vectorizer, classifier = pipeline.steps[0][1], pipeline.steps[1][1]
+        if not isinstance(vectorizer, TfidfVectorizer):
+            raise ValueError("Only TfidfVectorizer pipelines can be compiled.")
+        if not hasattr(classifier, "coef_") or not hasattr(classifier, "intercept_"):
+            raise ValueError(f"{type(classifier).__name__} is not a fitted linear classifier.")
+
+        self._params = vectorizer.get_params()
+        self._analyzer = vectorizer.build_analyzer()
+        self.vocabulary: Dict[str, int] = dict(vectorizer.vocabulary_)
+        self.binary = vectorizer.binary
+        self.sublinear_tf = vectorizer.sublinear_tf
+        self.norm = vectorizer.norm
+        self.idf_ = np.asarray(vectorizer.idf_, dtype=np.float64) if vectorizer.use_idf else None
+        # Row j holds the weights of feature j for every class, so a message only reads
+        # the rows of its own tokens.
+        self.coef_t = np.ascontiguousarray(np.asarray(classifier.coef_, dtype=np.float64).T)
+        self.intercept_ = np.asarray(classifier.intercept_, dtype=np.float64)
+        self.classes_ = classifier.classes_
+        self.n_outputs = self.coef_t.shape[1]
+
+    def get_params(self, deep: bool = True) -> dict:
+        """Vectorizer parameters, so shared MessageFeatures can reuse tokens across models."""
+        return self._params
+
+    def build_analyzer(self):
+        return self._analyzer
+
+    def decision_function(self, texts: Sequence[str]) -> np.ndarray:
+        return self.decision_function_tokens([self._analyzer(text) for text in texts])
+
+    def decision_function_tokens(self, tokens: List[List[str]]) -> np.ndarray:
+        """Scores already analyzed messages; same shape as the classifier's decision_function."""
+        counts = [self._count(doc_tokens) for doc_tokens in tokens]
+        width = max((len(doc_counts) for doc_counts in counts), default=0)
+        scores = np.zeros((len(tokens), self.n_outputs), dtype=np.float64)
+        if width:
+            # One row per message holding its sorted feature columns, padded with zero
+            # weights at the end. Appending zeros to a sum leaves it unchanged.
+            columns = np.zeros((len(tokens), width), dtype=np.intp)
+            weights = np.zeros((len(tokens), width), dtype=np.float64)
+            for row, doc_counts in enumerate(counts):
+                doc_columns = sorted(doc_counts)
+                columns[row, :len(doc_columns)] = doc_columns
+                weights[row, :len(doc_columns)] = [doc_counts[column] for column in doc_columns]
+            weights = self._tfidf_weights(columns, weights)
+            # cumsum adds the terms strictly in ascending column order, like scipy's
+            # CSR x dense kernel, so the rounding matches exactly.
+            scores = np.cumsum(weights[:, :, None] * self.coef_t[columns], axis=1)[:, -1, :]
+        scores += self.intercept_
+        return scores.ravel() if self.n_outputs == 1 else scores
+
+    def _count(self, doc_tokens: List[str]) -> Dict[int, int]:
+        vocabulary = self.vocabulary
+        counts: Dict[int, int] = {}
+        for token in doc_tokens:
+            column = vocabulary.get(token)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        return counts
+
+    def _tfidf_weights(self, columns: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Applies TfidfTransformer's weighting and row normalization to padded term counts."""
+        present = weights > 0
+        if self.binary:
+            weights[present] = 1
+        if self.sublinear_tf:
+            np.log(weights, out=weights, where=present)
+            weights[present] += 1.0
+        if self.idf_ is not None:
+            weights *= self.idf_[columns]
+        if self.norm is not None:
+            # Sequential row sums, as in sklearn's in-place CSR row normalization
+            magnitudes = weights * weights if self.norm == "l2" else np.abs(weights)
+            totals = np.cumsum(magnitudes, axis=1)[:, -1]
+            if self.norm == "l2":
+                totals = np.sqrt(totals)
+            totals[totals == 0.0] = 1.0
+            weights /= totals[:, None]
+        return weights
+
+
+def compile_pipeline(pipeline) -> Optional[CompiledLinearModel]:
+    """Compiles a pipeline, or returns None (sklearn path) if it is not a supported shape."""
+    try:
+        return CompiledLinearModel(pipeline)
+    except ValueError as e:
+        logger.warning(f"Falling back to the sklearn inference path: {e}")
+        return None
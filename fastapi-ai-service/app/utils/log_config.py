@@ -0,0 +1,185 @@
+"""
+Logging setup of the API process.
+
+Log calls only put the record on an in-memory queue (QueueHandler); a background
+QueueListener thread formats it and writes it out, so request handlers never
+block on handler I/O. Records are formatted lazily, in that thread: hot-path log
+calls pass their values as %-style arguments instead of f-strings, and the
+arguments must not be modified after the call. When the queue is full, records
+are dropped and counted instead of blocking the caller.
+
+Per-request records are sampled: RequestLogContextMiddleware decides once per
+request, with probability LOG_SAMPLE_RATE, whether its DEBUG/INFO records are
+kept, so a request is logged completely or not at all. Warnings and errors are
+always kept, as are records emitted outside of a request (startup, reloads).
+Customer text (messages, replies, knowledge base answers) is logged through
+body(), which truncates or hashes it according to LOG_BODY_MODE.
+
+LOG_FORMAT=json writes one JSON object per record, with the request id of the
+request that emitted it.
+"""
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.utils.metrics import REGISTRY
+
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "ai_log_records_dropped_total", "Log records not written, by reason (sampled out or queue full).", ("reason",)
+)
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("log_request_id", default=None)
+_request_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar("log_request_sampled", default=True)
+
+_body_mode = os.getenv("LOG_BODY_MODE", "truncate").lower()
+_body_max_chars = int(os.getenv("LOG_BODY_MAX_CHARS", "80"))
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+_output: Optional[logging.Handler] = None
+
+
+class LoggedBody:
+    """Customer text in a log record, truncated or hashed only if the record is written."""
+    __slots__ = ("text",)
+
+    def __init__(self, text: Optional[str]):
+        self.text = text
+
+    def __str__(self) -> str:
+        text = self.text
+        if text is None:
+            return "None"
+        if _body_mode == "hash":
+            return f"<sha256:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]} len={len(text)}>"
+        if _body_mode == "truncate" and len(text) > _body_max_chars:
+            return repr(text[:_body_max_chars]) + f"...(+{len(text) - _body_max_chars} chars)"
+        return repr(text)
+
+
+def body(text: Optional[str]) -> LoggedBody:
+    """Wraps customer text passed as a log argument (see LOG_BODY_MODE)."""
+    return LoggedBody(text)
+
+
+class RequestSamplingFilter(logging.Filter):
+    """Drops the DEBUG/INFO records of requests that were not sampled and tags records with the request id."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        if record.levelno >= logging.WARNING or _request_sampled.get():
+            return True
+        LOG_RECORDS_DROPPED.inc(reason="sampled")
+        return False
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener formats the record; QueueHandler would format it here, in the caller
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(reason="queue_full")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestLogContextMiddleware:
+    """
+    ASGI middleware that gives every HTTP request a request id (the X-Request-ID
+    header, or a generated one) and decides whether its DEBUG/INFO records are
+    written, with probability sample_rate.
+    """
+    def __init__(self, app, sample_rate: Optional[float] = None):
+        self.app = app
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv("LOG_SAMPLE_RATE", "1"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        id_token = _request_id.set(request_id or uuid.uuid4().hex[:16])
+        sampled_token = _request_sampled.set(self.sample_rate >= 1 or random.random() < self.sample_rate)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_sampled.reset(sampled_token)
+            _request_id.reset(id_token)
+
+
+def configure_logging():
+    """
+    Routes the root logger through a bounded queue to a background listener thread.
+    Replaces the handlers of an earlier call.
+    """
+    global _listener, _queue_handler, _output
+    stop_logging()
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+
+    _output = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        _output.setFormatter(JsonFormatter())
+    else:
+        _output.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    _queue_handler = _NonBlockingQueueHandler(queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000"))))
+    _queue_handler.addFilter(RequestSamplingFilter())
+    root.addHandler(_queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _listener = QueueListener(_queue_handler.queue, _output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Writes out the queued records and stops the listener thread."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def _log_directly_after_fork():
+    # Forked inference workers do not inherit the listener thread: they write their records themselves
+    global _listener, _queue_handler
+    if _queue_handler is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    _output.addFilter(RequestSamplingFilter())
+    root.addHandler(_output)
+    _listener, _queue_handler = None, None
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_log_directly_after_fork)
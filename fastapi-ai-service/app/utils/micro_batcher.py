@@ -0,0 +1,175 @@
+import asyncio
+import contextvars
+import math
+import os
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from app.utils.metrics import REGISTRY
+
+MICROBATCH_SIZE = REGISTRY.histogram(
+    "ai_microbatch_size", "Requests per micro-batch of the single-message endpoints.", ("operation",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+MICROBATCH_QUEUE_DELAY = REGISTRY.histogram(
+    "ai_microbatch_queue_delay_seconds", "Time a request waited for its micro-batch to be dispatched.", ("operation",),
+    buckets=(0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25)
+)
+
+# Smoothing of the arrival-rate and batch-duration estimates (weight of the newest observation)
+EWMA_ALPHA = 0.2
+
+# A queued request: (item, the caller's future, enqueue time)
+Pending = Tuple[Any, asyncio.Future, float]
+
+
+class MicroBatcher:
+    """
+    Groups concurrent single-item requests into vectorized batch calls.
+
+    Callers submit() one item and await its result. A collector task dispatches the
+    queued items as one process_batch call once target_size items are queued, or
+    max_wait_seconds after the first of them arrived, whichever comes first; items
+    that queued up in the meantime join the batch up to max_batch_size. At most
+    max_concurrency batches run at once (one per inference worker); while they all
+    run, new requests accumulate into the next batch.
+
+    target_size adapts to the observed load: it is the number of requests expected
+    to arrive while a batch runs (arrival rate x batch duration, shared between the
+    concurrent batches). Under light load it stays at 1, so a lone request is
+    dispatched at once and pays no batching delay; under heavy load batches grow
+    towards max_batch_size and the per-request model overhead is amortized.
+
+    process_batch returns one result per item, in order; an Exception instance in
+    place of a result is raised to that item's caller only. An exception raised by
+    process_batch itself fails every item of the batch.
+    """
+    def __init__(
+        self,
+        operation: str,
+        process_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: Optional[int] = None,
+        max_wait_seconds: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        enabled: Optional[bool] = None
+    ):
+        self.operation = operation
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size or int(os.getenv("MICROBATCH_MAX_SIZE", "32"))
+        self.max_wait_seconds = max_wait_seconds if max_wait_seconds is not None else float(os.getenv("MICROBATCH_MAX_WAIT_MS", "5")) / 1000
+        self.max_concurrency = max_concurrency or int(os.getenv("MICROBATCH_MAX_CONCURRENCY", str(os.cpu_count() or 1)))
+        self.enabled = enabled if enabled is not None else os.getenv("MICROBATCH_ENABLED", "true").lower() == "true"
+        self.target_size = 1
+        self._mean_interarrival: Optional[float] = None # Seconds between submissions
+        self._mean_batch_seconds = 0.0
+        self._last_arrival: Optional[float] = None
+        # Event-loop bound state, created on first use in a loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        if not self.enabled:
+            result = (await self.process_batch([item]))[0]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        loop = self._start()
+        now = loop.time()
+        self._observe_arrival(now)
+        future = loop.create_future()
+        self._queue.put_nowait((item, future, now))
+        return await future
+
+    async def shutdown(self):
+        collector, self._collector = self._collector, None
+        # A collector of another (already closed) event loop cannot be awaited; it is simply dropped
+        if collector is not None and self._loop is asyncio.get_running_loop():
+            collector.cancel()
+            await asyncio.gather(collector, return_exceptions=True)
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._collector is None or self._collector.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._running = set()
+            # The collector serves every caller: it must not inherit the request context of the first one
+            self._collector = loop.create_task(self._collect(), context=contextvars.Context())
+        return loop
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            # While every slot is busy, requests keep queueing and join this batch
+            await self._slots.acquire()
+            batch = [first]
+            deadline = first[2] + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if len(batch) >= self.target_size or timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [pending for pending in batch if not pending[1].done()] # Drop callers that went away
+            if not batch:
+                self._slots.release()
+                continue
+            task = loop.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Pending]):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        MICROBATCH_SIZE.observe(len(batch), operation=self.operation)
+        for _, _, enqueued in batch:
+            MICROBATCH_QUEUE_DELAY.observe(started - enqueued, operation=self.operation)
+        try:
+            results = await self.process_batch([item for item, _, _ in batch])
+            for (_, future, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.cancel()
+            self._observe_batch(loop.time() - started)
+            self._slots.release()
+
+    def _observe_arrival(self, now: float):
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            self._mean_interarrival = gap if self._mean_interarrival is None else (
+                EWMA_ALPHA * gap + (1 - EWMA_ALPHA) * self._mean_interarrival
+            )
+        self._last_arrival = now
+        self._update_target()
+
+    def _observe_batch(self, seconds: float):
+        self._mean_batch_seconds = EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self._mean_batch_seconds
+        self._update_target()
+
+    def _update_target(self):
+        if self._mean_interarrival is None:
+            self.target_size = 1
+            return
+        expected = self._mean_batch_seconds / max(self._mean_interarrival, 1e-6) / self.max_concurrency
+        self.target_size = max(1, min(self.max_batch_size, math.ceil(expected)))
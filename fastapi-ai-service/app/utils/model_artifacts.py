@@ -0,0 +1,228 @@
+"""
+Memory-mappable model artifacts.
+
+A trained TF-IDF + linear classifier pipeline is exported as a directory of raw
+NumPy arrays plus a small JSON manifest:
+
+    meta.json          classes, vectorizer settings, content hash
+    vocabulary.npy     sorted vocabulary terms (fixed-width unicode)
+    feature_index.npy  feature column of each sorted term
+    idf.npy            idf weights per feature column
+    coef.npy           classifier coefficients (n_classes or 1, n_features)
+    intercept.npy      classifier intercepts
+
+Arrays are opened with np.load(mmap_mode='r'), so every uvicorn worker on a host
+maps the same page-cache pages instead of unpickling its own copy, and loading is
+independent of model size. The vocabulary is searched with np.searchsorted on the
+mapped array, which avoids building a per-process Python dict.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from typing import List, Optional, Sequence
+
+import numpy as np
+import scipy.sparse as sp
+
+FORMAT_NAME = "mapped-linear-text-classifier"
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+ARRAY_FILES = ("vocabulary", "feature_index", "idf", "coef", "intercept")
+
+# Vectorizer settings that are stored in meta.json and restored on load
+VECTORIZER_PARAMS = (
+    "lowercase", "strip_accents", "token_pattern", "ngram_range", "stop_words",
+    "analyzer", "binary", "norm", "use_idf", "sublinear_tf"
+)
+
+
+def is_mapped_artifact(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def export_mapped_artifact(pipeline, output_dir: str) -> str:
+    """
+    Writes a fitted Pipeline([('tfidf', TfidfVectorizer), ('clf', linear classifier)])
+    as a memory-mappable artifact directory. The directory is written next to its
+    final location and renamed into place, so readers never see a partial artifact.
+    Returns the artifact's content hash.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer, classifier = pipeline.steps[0][1], pipeline.steps[-1][1]
+    if not isinstance(vectorizer, TfidfVectorizer):
+        raise ValueError("Only TfidfVectorizer pipelines can be exported as mapped artifacts.")
+    params = vectorizer.get_params()
+    if params["analyzer"] != "word" or params["preprocessor"] is not None or params["tokenizer"] is not None:
+        raise ValueError("Mapped artifacts support the built-in word analyzer only.")
+    if isinstance(params["stop_words"], (list, set, frozenset, tuple)):
+        params["stop_words"] = sorted(params["stop_words"])
+
+    terms = sorted(vectorizer.vocabulary_)
+    width = max((len(term) for term in terms), default=1)
+    arrays = {
+        "vocabulary": np.array(terms, dtype=f"<U{width}"),
+        "feature_index": np.array([vectorizer.vocabulary_[term] for term in terms], dtype=np.int32),
+        "idf": np.ascontiguousarray(vectorizer.idf_ if vectorizer.use_idf else np.ones(len(terms)), dtype=np.float64),
+        "coef": np.ascontiguousarray(classifier.coef_, dtype=np.float64),
+        "intercept": np.ascontiguousarray(np.atleast_1d(classifier.intercept_), dtype=np.float64),
+    }
+
+    output_dir = os.path.abspath(output_dir)
+    staging_dir = f"{output_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    digest = hashlib.sha256()
+    for name in ARRAY_FILES:
+        np.save(os.path.join(staging_dir, f"{name}.npy"), arrays[name])
+        digest.update(arrays[name].tobytes())
+    classes = np.asarray(classifier.classes_).tolist()
+    digest.update(json.dumps(classes).encode("utf-8"))
+
+    meta = {
+        "format": FORMAT_NAME,
+        "format_version": FORMAT_VERSION,
+        "content_hash": digest.hexdigest()[:12],
+        "classes": classes,
+        "n_features": len(terms),
+        "vectorizer": {name: params[name] for name in VECTORIZER_PARAMS},
+    }
+    with open(os.path.join(staging_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    if os.path.exists(output_dir):
+        retired_dir = f"{output_dir}.old-{os.getpid()}"
+        os.replace(output_dir, retired_dir)
+        os.replace(staging_dir, output_dir)
+        shutil.rmtree(retired_dir, ignore_errors=True)
+    else:
+        os.replace(staging_dir, output_dir)
+    return meta["content_hash"]
+
+
+class MappedTfidfVectorizer:
+    """Transforms text like the exported TfidfVectorizer, using memory-mapped arrays."""
+    def __init__(self, settings: dict, vocabulary: np.ndarray, feature_index: np.ndarray, idf: np.ndarray):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        settings = dict(settings)
+        settings["ngram_range"] = tuple(settings["ngram_range"])
+        self._settings = settings
+        # An unfitted vectorizer is only used to build the (stateless) analyzer
+        self._analyzer_source = TfidfVectorizer(**{k: settings[k] for k in ("lowercase", "strip_accents", "token_pattern", "ngram_range", "stop_words", "analyzer")})
+        self.vocabulary = vocabulary
+        self.feature_index = feature_index
+        self.idf_ = idf
+        self.n_features = len(idf)
+        self._max_term_length = vocabulary.dtype.itemsize // 4 if len(vocabulary) else 0
+
+    def get_params(self, deep: bool = True) -> dict:
+        params = self._analyzer_source.get_params()
+        params.update({k: self._settings[k] for k in ("binary", "norm", "use_idf", "sublinear_tf")})
+        return params
+
+    def build_analyzer(self):
+        return self._analyzer_source.build_analyzer()
+
+    def transform(self, texts: Sequence[str]) -> sp.csr_matrix:
+        analyze = self.build_analyzer()
+        return self.transform_tokens([analyze(text) for text in texts])
+
+    def lookup(self, tokens: List[str]) -> np.ndarray:
+        """Returns the feature columns of the in-vocabulary tokens."""
+        candidates = [token for token in tokens if len(token) <= self._max_term_length]
+        if not candidates:
+            return np.empty(0, dtype=np.int64)
+        query = np.asarray(candidates, dtype=self.vocabulary.dtype)
+        positions = np.searchsorted(self.vocabulary, query)
+        positions[positions >= len(self.vocabulary)] = 0
+        found = self.vocabulary[positions] == query
+        return np.asarray(self.feature_index[positions[found]], dtype=np.int64)
+
+    def transform_tokens(self, tokens: List[List[str]]) -> sp.csr_matrix:
+        """Builds the TF-IDF matrix from analyzed tokens, matching TfidfVectorizer.transform."""
+        from sklearn.preprocessing import normalize
+
+        indices, values, indptr = [], [], [0]
+        for doc_tokens in tokens:
+            columns, counts = np.unique(self.lookup(doc_tokens), return_counts=True)
+            indices.append(columns)
+            values.append(counts)
+            indptr.append(indptr[-1] + len(columns))
+        X = sp.csr_matrix(
+            (
+                np.concatenate(values).astype(np.float64) if values else np.empty(0),
+                np.concatenate(indices).astype(np.int32) if indices else np.empty(0, dtype=np.int32),
+                np.asarray(indptr, dtype=np.int32)
+            ),
+            shape=(len(tokens), self.n_features)
+        )
+        if self._settings["binary"]:
+            X.data.fill(1)
+        if self._settings["sublinear_tf"]:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        if self._settings["use_idf"]:
+            X.data *= self.idf_[X.indices]
+        if self._settings["norm"] is not None:
+            X = normalize(X, norm=self._settings["norm"], copy=False)
+        return X
+
+
+class MappedLinearClassifier:
+    """Linear decision function over memory-mapped coefficients."""
+    def __init__(self, classes: list, coef: np.ndarray, intercept: np.ndarray):
+        self.classes_ = np.asarray(classes)
+        self.coef_ = coef
+        self.intercept_ = intercept
+
+    def decision_function(self, X) -> np.ndarray:
+        scores = np.asarray(X @ self.coef_.T) + self.intercept_
+        return scores.ravel() if self.coef_.shape[0] == 1 else scores
+
+
+class MappedTextPipeline:
+    """
+    Read-only stand-in for the exported sklearn Pipeline. Exposes the parts of the
+    Pipeline interface the services use: steps/named_steps and decision_function.
+    """
+    def __init__(self, path: str, mmap_mode: Optional[str] = "r"):
+        from sklearn.utils import Bunch
+
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_NAME or self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported model artifact format in {path}")
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_FILES}
+        vectorizer = MappedTfidfVectorizer(self.meta["vectorizer"], arrays["vocabulary"], arrays["feature_index"], arrays["idf"])
+        classifier = MappedLinearClassifier(self.meta["classes"], arrays["coef"], arrays["intercept"])
+        self.steps = [("tfidf", vectorizer), ("clf", classifier)]
+        self.named_steps = Bunch(tfidf=vectorizer, clf=classifier)
+        self.version = self.meta["content_hash"]
+
+    def decision_function(self, texts: Sequence[str]) -> np.ndarray:
+        return self.named_steps.clf.decision_function(self.named_steps.tfidf.transform(texts))
+
+    def predict(self, texts: Sequence[str]) -> np.ndarray:
+        scores = self.decision_function(texts)
+        if scores.ndim == 1:
+            return self.named_steps.clf.classes_[(scores > 0).astype(int)]
+        return self.named_steps.clf.classes_[np.argmax(scores, axis=1)]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export a joblib text classification pipeline as a memory-mapped artifact.")
+    parser.add_argument("model_path", help="Path of the trained .joblib pipeline")
+    parser.add_argument("output_dir", help="Artifact directory to create or replace")
+    args = parser.parse_args(argv)
+
+    import joblib
+    content_hash = export_mapped_artifact(joblib.load(args.model_path), args.output_dir)
+    print(f"Exported {args.model_path} to {args.output_dir} (version {content_hash})")
+
+
+if __name__ == "__main__":
+    main()
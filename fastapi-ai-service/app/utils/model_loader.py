@@ -1,21 +1,92 @@
-import joblib
+import hashlib
+import json
 import os
 import logging
+from app.utils.model_artifacts import META_FILE, MappedTextPipeline, is_mapped_artifact
 
 logger = logging.getLogger(__name__)
 
+# Manifest published by the offline training pipeline (see app.utils.training)
+MANIFEST_FILE = "manifest.json"
+MANIFEST_FORMAT = "model-manifest"
+
+def _read_manifest(path: str):
+    if not (path.endswith(".json") and os.path.isfile(path)):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return manifest if isinstance(manifest, dict) and manifest.get("format") == MANIFEST_FORMAT else None
+
+def resolve_model_path(path: str) -> str:
+    """A training manifest resolves to the artifact of the version it publishes; other paths to themselves."""
+    manifest = _read_manifest(path)
+    if manifest is None:
+        return path
+    return os.path.join(os.path.dirname(os.path.abspath(path)), manifest["artifact"])
+
+def manifest_version(path: str):
+    """The registry version a training manifest publishes; None for other paths."""
+    manifest = _read_manifest(path)
+    return manifest["version"] if manifest is not None else None
+
+def calibration_path(path: str) -> str:
+    """
+    Where the probability calibration of a model is stored: the file named by its
+    training manifest, else `<artifact>.calibration.json` next to the artifact.
+    """
+    manifest = _read_manifest(path)
+    if manifest is not None and manifest.get("calibration"):
+        return os.path.join(os.path.dirname(os.path.abspath(path)), manifest["calibration"])
+    return resolve_model_path(path).rstrip("/") + ".calibration.json"
+
 def load_model_from_path(model_path: str):
     """
     Loads a machine learning model from a given file path using joblib.
+    A directory holding a memory-mapped artifact (see app.utils.model_artifacts)
+    is opened with its arrays mapped read-only instead of unpickled, and a
+    training manifest loads the version it names.
     Raises FileNotFoundError if the file does not exist.
     """
+    model_path = resolve_model_path(model_path)
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Model file not found: {model_path}")
     
     try:
-        model = joblib.load(model_path)
+        if is_mapped_artifact(model_path):
+            model = MappedTextPipeline(model_path)
+        else:
+            import joblib # Deferred: pulls in the libraries of the pickled model
+            model = joblib.load(model_path)
         logger.info(f"Model loaded successfully from {model_path}")
         return model
     except Exception as e:
         logger.error(f"Error loading model from {model_path}: {e}")
         raise
+
+def import_model_libraries():
+    """
+    Imports the libraries the models are unpickled into. A first import of
+    scikit-learn from several threads at once can fail on its circular imports,
+    so this runs once before artifacts are loaded concurrently.
+    """
+    import joblib # noqa: F401
+    import sklearn.feature_extraction.text # noqa: F401
+    import sklearn.pipeline # noqa: F401
+    import sklearn.linear_model # noqa: F401
+    import sklearn.svm # noqa: F401
+
+def file_version(path: str) -> str:
+    """
+    Returns a short content hash identifying the version of an artifact file.
+    Used to tag results with the model that produced them and to key caches.
+    Memory-mapped artifact directories carry their content hash in meta.json.
+    """
+    path = resolve_model_path(path)
+    if is_mapped_artifact(path):
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)["content_hash"]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
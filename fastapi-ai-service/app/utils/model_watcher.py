@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _fingerprint(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+class ModelWatcher:
+    """
+    Polls artifact files and triggers a reload callback when any of them changes.
+
+    A change is a different (mtime, size) pair from the previous poll. The callback
+    runs on the event loop, so it must hand blocking work (loading and validating
+    models) to a thread.
+    """
+    def __init__(
+        self,
+        get_paths: Callable[[], List[str]],
+        on_change: Callable[[List[str]], Awaitable[None]],
+        interval_seconds: float
+    ):
+        self.get_paths = get_paths
+        self.on_change = on_change
+        self.interval_seconds = interval_seconds
+        self._fingerprints: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval_seconds <= 0 or self._task is not None:
+            return
+        self._fingerprints = {path: _fingerprint(path) for path in self.get_paths()}
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Watching model artifacts every {self.interval_seconds}s: {list(self._fingerprints)}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def check(self) -> List[str]:
+        """Polls once; returns the changed paths after running the callback for them."""
+        changed = []
+        for path in self.get_paths():
+            fingerprint = _fingerprint(path)
+            if self._fingerprints.get(path) != fingerprint:
+                self._fingerprints[path] = fingerprint
+                if fingerprint is not None:
+                    changed.append(path)
+        if changed:
+            logger.info(f"Detected changed model artifacts: {changed}")
+            await self.on_change(changed)
+        return changed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Error while checking model artifacts for changes: {e}", exc_info=True)
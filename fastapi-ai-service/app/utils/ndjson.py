@@ -0,0 +1,68 @@
+import json
+from typing import AsyncIterable, AsyncIterator, Optional, Tuple
+
+from pydantic import ValidationError
+from starlette.responses import StreamingResponse
+
+from app.models.ticket_models import TicketAnalysisRequest, TicketBatchItemResult
+
+
+class RecordTooLargeError(ValueError):
+    """Raised when an NDJSON record exceeds the allowed line length."""
+
+
+async def iter_ndjson_lines(body: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """
+    Splits a streamed request body into its non-blank lines. At most one line is
+    buffered at a time, so a long-lived stream uses constant memory.
+    """
+    buffer = b""
+    async for data in body:
+        buffer += data
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            if len(line) > max_line_bytes:
+                raise RecordTooLargeError(f"Record exceeds {max_line_bytes} bytes.")
+            if line.strip():
+                yield line
+        if len(buffer) > max_line_bytes:
+            raise RecordTooLargeError(f"Record exceeds {max_line_bytes} bytes.")
+    if buffer.strip():
+        yield buffer
+
+
+def parse_analysis_record(index: int, line: bytes) -> Tuple[Optional[TicketAnalysisRequest], Optional[TicketBatchItemResult]]:
+    """Parses one JSONL record into a request, or into the error result reported for it."""
+    item = None
+    try:
+        item = json.loads(line)
+        if not isinstance(item, dict):
+            raise ValueError("Each record must be a JSON object.")
+        request = TicketAnalysisRequest(**item)
+        if request.tenant_id is not None:
+            raise ValueError("tenant_id is not supported for streamed and bulk analysis; use /ai/process_incoming_messages.")
+        return request, None
+    except (ValidationError, ValueError) as e:
+        ticket_id = item.get("ticket_id") if isinstance(item, dict) else None
+        return None, TicketBatchItemResult(
+            index=index,
+            ticket_id=ticket_id if isinstance(ticket_id, int) else None,
+            status="error",
+            error=f"Invalid record: {e}"
+        )
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that can be sent while the request body is still being read.
+
+    StreamingResponse watches for client disconnects by calling receive() alongside
+    the response, which would swallow the body chunks of a request that is streamed
+    in both directions. Here the endpoint's own body reader consumes receive();
+    a disconnect surfaces there (ClientDisconnect) or as a failed send.
+    """
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Returned by ResultCache.get on a miss, since None can be a legitimate cached value
+MISSING = object()
+
+
+def normalize_message(text: str) -> str:
+    """
+    Normalizes a message for use in cache keys: lowercase with collapsed whitespace.
+    This matches what the default TF-IDF analyzers already ignore, so messages that
+    normalize to the same key get the same predictions.
+    """
+    return " ".join(text.lower().split())
+
+
+class ResultCache:
+    """
+    Thread-safe, bounded LRU cache with a per-entry time-to-live.
+
+    Keys are tuples of (namespace, ...); callers include the versions of the
+    models/knowledge base a result depends on, so results of a previous model are
+    never served after a reload even before they are evicted. Hit and miss counters
+    are kept per namespace. max_entries=0 disables caching.
+    """
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> Any:
+        """Returns the cached value for key, or MISSING."""
+        if not self.enabled:
+            return MISSING
+        namespace = key[0]
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits[namespace] = self.hits.get(namespace, 0) + 1
+                    return value
+                del self._entries[key]
+            self.misses[namespace] = self.misses.get(namespace, 0) + 1
+            return MISSING
+
+    def set(self, key: Tuple, value: Any):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drops every cached result, e.g. after models or the knowledge base reload."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            namespaces = sorted(set(self.hits) | set(self.misses))
+            per_namespace = {}
+            for namespace in namespaces:
+                hits, misses = self.hits.get(namespace, 0), self.misses.get(namespace, 0)
+                per_namespace[namespace] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0
+                }
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self.evictions,
+                "namespaces": per_namespace
+            }
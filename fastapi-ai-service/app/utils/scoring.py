@@ -0,0 +1,14 @@
+import numpy as np
+
+
+def as_score_matrix(decision_scores) -> np.ndarray:
+    """
+    Normalizes decision_function output to a 2-D (n_samples, n_classes) float array.
+    Binary linear classifiers return a 1-D array of margins for the positive class
+    (classes_[1]); these are expanded to [-margin, margin] so that argmax over the
+    columns picks the same class as the classifier's own predict.
+    """
+    scores = np.asarray(decision_scores, dtype=float)
+    if scores.ndim == 1:
+        scores = np.column_stack([-scores, scores])
+    return scores
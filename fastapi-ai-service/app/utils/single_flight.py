@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+COALESCED_REQUESTS = REGISTRY.counter(
+    "ai_coalesced_requests_total", "Requests answered by an identical computation that was already in flight.", ("operation",)
+)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical computations ("single flight").
+
+    The first caller for an (operation, key) pair starts the computation; callers
+    that arrive with the same pair while it is still running wait for it instead of
+    starting their own, and all of them receive its result or exception. Nothing is
+    kept once the computation finishes, so this is not a cache: it only removes the
+    duplicate work of a burst, such as a template email campaign whose identical
+    replies arrive within milliseconds of each other.
+
+    The computation runs in its own task, so a caller that is cancelled (e.g. its
+    client disconnected) does not cancel it for the others. Results are shared
+    objects; callers must copy them before modifying them.
+    """
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._in_flight: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    async def run(self, operation: str, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        if not self.enabled:
+            return await compute()
+        flight_key = (operation, key)
+        task = self._in_flight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._in_flight[flight_key] = task
+            task.add_done_callback(lambda done: self._finish(flight_key, done))
+        else:
+            COALESCED_REQUESTS.inc(operation=operation)
+        return await asyncio.shield(task)
+
+    def _finish(self, flight_key: Tuple[str, Hashable], task: asyncio.Task):
+        if self._in_flight.get(flight_key) is task:
+            del self._in_flight[flight_key]
+        # Retrieve the exception even if every caller was cancelled, so it is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
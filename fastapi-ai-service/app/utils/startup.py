@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (loaded, version, error) of a component after its load function ran
+ComponentState = Tuple[bool, Optional[str], Optional[str]]
+
+
+class _Component:
+    def __init__(self, name: str, load: Callable[[], Any], state: Callable[[], ComponentState], required: bool):
+        self.name = name
+        self.load = load
+        self.state = state
+        self.required = required
+        self.status = "pending" # pending -> loading -> loaded | not_loaded | failed
+        self.duration_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class StartupLoader:
+    """
+    Loads every artifact of the service once, concurrently, and tracks the outcome
+    of each load for the readiness probe.
+
+    Each component's load function runs in its own thread, so a large model does
+    not delay the others and the event loop stays free to answer /health while the
+    artifacts are read. The service is ready once all loads have finished and every
+    required component is loaded.
+    """
+    def __init__(self):
+        self._components: Dict[str, _Component] = {}
+        self.started_at: Optional[float] = None
+        self.duration_seconds: Optional[float] = None
+
+    def add(self, name: str, load: Callable[[], Any], state: Callable[[], ComponentState], required: bool = True):
+        self._components[name] = _Component(name, load, state, required)
+
+    @property
+    def finished(self) -> bool:
+        return self.duration_seconds is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished and all(
+            component.status == "loaded" for component in self._components.values() if component.required
+        )
+
+    async def load_all(self):
+        self.started_at = time.perf_counter()
+        self.duration_seconds = None
+        await asyncio.gather(*(self._load(component) for component in self._components.values()))
+        self.duration_seconds = time.perf_counter() - self.started_at
+        statuses = ", ".join(f"{c.name}={c.status} ({c.duration_seconds:.2f}s)" for c in self._components.values())
+        logger.info(f"Startup loading finished in {self.duration_seconds:.2f}s: {statuses}")
+
+    async def _load(self, component: _Component):
+        component.status = "loading"
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(component.load)
+            loaded, _, error = component.state()
+            component.status = "loaded" if loaded else "not_loaded"
+            component.error = None if loaded else error
+        except Exception as e:
+            logger.error(f"Loading {component.name} failed at startup: {e}", exc_info=True)
+            component.status = "failed"
+            component.error = str(e)
+        component.duration_seconds = time.perf_counter() - started
+
+    def report(self) -> Dict[str, Any]:
+        components: Dict[str, Dict[str, Any]] = {}
+        for component in self._components.values():
+            loaded, version, _ = component.state()
+            components[component.name] = {
+                "status": component.status,
+                "loaded": loaded, # Current state; hot reloads may have changed it since startup
+                "version": version,
+                "required": component.required,
+                "load_duration_seconds": component.duration_seconds,
+                "error": component.error,
+            }
+        return {"ready": self.ready, "load_duration_seconds": self.duration_seconds, "components": components}
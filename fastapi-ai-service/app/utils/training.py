@@ -0,0 +1,342 @@
+"""
+Offline training of the chatbot (intent) and sentiment models.
+
+Trains the TF-IDF + LinearSVC pipeline the services serve, optionally choosing
+its hyper-parameters with a cross-validated grid search that runs on all cores,
+or (--pipeline online) the hashing + SGD pipeline that the service can keep
+updating from agent feedback (see app.services.online_learning_service),
+fits a probability calibration on cross-validated scores, and publishes the
+result as a new version in a model registry directory:
+
+    <registry>/<model>/manifest.json              current version, training summary
+    <registry>/<model>/<version>/model.joblib     the fitted pipeline
+    <registry>/<model>/<version>/mapped/          memory-mapped export (--export-mapped)
+    <registry>/<model>/<version>/calibration.json probability calibration (see app.utils.calibration)
+    <registry>/<model>/<version>/training.json    parameters, CV score, data summary
+
+A version directory is completed under a temporary name and renamed into place,
+and the manifest is replaced atomically after it, so a crash at any point leaves
+the previous version serving. Point MODEL_PATH_CHATBOT / MODEL_PATH_SENTIMENT at
+the manifest and the service loads whatever version it names, reloading when it
+changes.
+
+    python -m app.utils.training chatbot data/training_chatbot.csv
+    python -m app.utils.training sentiment data/sentiment.jsonl --no-search --export-mapped
+    python -m app.utils.training chatbot data/training_chatbot.csv --pipeline online
+
+Training data is CSV (a header row, then text and label columns) or JSONL with
+one {"text": ..., "label": ...} object per line.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.calibration import CALIBRATION_METHODS, ScoreCalibrator, fit_calibrator, save_calibrator
+from app.utils.model_artifacts import export_mapped_artifact
+from app.utils.model_loader import MANIFEST_FILE, MANIFEST_FORMAT, file_version
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAMES = ("chatbot", "sentiment")
+PIPELINE_KINDS = ("tfidf", "online")
+
+# Hashed feature space of online pipelines: no vocabulary to refit, 2 MB of weights per class
+ONLINE_HASH_FEATURES = 2 ** 18
+
+# Searched by default; the first value of each parameter is the serving default
+DEFAULT_PARAM_GRID = {
+    "tfidf__max_features": [1000, 20000],
+    "tfidf__ngram_range": [(1, 1), (1, 2)],
+    "tfidf__sublinear_tf": [False, True],
+    "clf__C": [1.0, 0.1, 10.0],
+}
+
+
+def load_training_data(path: str) -> Tuple[List[str], List[str]]:
+    """Reads (texts, labels) from a CSV file with a header row or from a JSONL file."""
+    texts, labels = [], []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = csv.reader(f)
+            next(rows, None) # header
+            for row in rows:
+                if len(row) >= 2 and row[0].strip():
+                    texts.append(row[0])
+                    labels.append(row[1].strip())
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if not isinstance(record, dict) or "text" not in record or "label" not in record:
+                    raise ValueError(f"{path}:{line_number}: expected an object with 'text' and 'label'")
+                texts.append(str(record["text"]))
+                labels.append(str(record["label"]))
+    if not texts:
+        raise ValueError(f"No training samples in {path}")
+    return texts, labels
+
+
+def build_pipeline():
+    """The untrained pipeline served by ModelService."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.pipeline import Pipeline
+    from sklearn.svm import LinearSVC
+
+    return Pipeline([
+        ('tfidf', TfidfVectorizer(max_features=1000)),
+        ('clf', LinearSVC()) # Linear Support Vector Classification
+    ])
+
+
+def build_online_pipeline():
+    """
+    The untrained pipeline of online learning mode: a stateless hashing featurizer,
+    so new feedback never requires refitting a vocabulary, and a linear SVM trained
+    by SGD, whose partial_fit applies mini-batch updates to the fitted weights.
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.pipeline import Pipeline
+
+    return Pipeline([
+        ('hashing', HashingVectorizer(n_features=ONLINE_HASH_FEATURES, alternate_sign=False, ngram_range=(1, 2))),
+        ('clf', SGDClassifier(loss="hinge", alpha=1e-4, random_state=0))
+    ])
+
+
+def is_online_pipeline(pipeline) -> bool:
+    """True for a fitted (hashing featurizer, partial_fit classifier) pipeline."""
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.pipeline import Pipeline
+
+    if not isinstance(pipeline, Pipeline) or len(pipeline.steps) != 2:
+        return False
+    vectorizer, classifier = pipeline.steps[0][1], pipeline.steps[1][1]
+    return isinstance(vectorizer, HashingVectorizer) and hasattr(classifier, "partial_fit") and hasattr(classifier, "classes_")
+
+
+def fit_pipeline(
+    texts: List[str],
+    labels: List[str],
+    search: bool = True,
+    param_grid: Optional[Dict[str, list]] = None,
+    cv: int = 3,
+    n_jobs: int = -1,
+    pipeline_kind: str = "tfidf"
+) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Fits the serving pipeline. With search=True the hyper-parameters are chosen by
+    a grid search whose candidate/fold fits run in n_jobs worker processes (-1 uses
+    every core). The search is skipped when a class has fewer than two samples.
+    The online pipeline is fitted with its defaults, without a search.
+    Returns the fitted pipeline and a summary of how it was trained.
+    """
+    if len(texts) != len(labels):
+        raise ValueError("texts and labels differ in length")
+    class_counts = Counter(labels)
+    if len(class_counts) < 2:
+        raise ValueError("training data needs at least two distinct labels")
+    summary: Dict[str, Any] = {"samples": len(texts), "classes": dict(sorted(class_counts.items())), "search": False}
+    if pipeline_kind == "online":
+        pipeline = build_online_pipeline()
+        pipeline.fit(texts, labels)
+        summary["pipeline"] = "online"
+        return pipeline, summary
+
+    folds = min(cv, min(class_counts.values()))
+    if search and folds >= 2:
+        from sklearn.model_selection import GridSearchCV
+
+        grid = GridSearchCV(build_pipeline(), param_grid or DEFAULT_PARAM_GRID, cv=folds, n_jobs=n_jobs, refit=True)
+        started = time.perf_counter()
+        grid.fit(texts, labels)
+        summary.update({
+            "search": True,
+            "folds": folds,
+            "candidates": len(grid.cv_results_["params"]),
+            "best_params": grid.best_params_,
+            "cv_score": float(grid.best_score_),
+            "search_seconds": time.perf_counter() - started,
+        })
+        return grid.best_estimator_, summary
+
+    if search:
+        logger.warning(f"Skipping hyper-parameter search: a class has only {min(class_counts.values())} sample(s)")
+    pipeline = build_pipeline()
+    pipeline.fit(texts, labels)
+    return pipeline, summary
+
+
+def fit_calibration(
+    pipeline,
+    texts: List[str],
+    labels: List[str],
+    method: str = "sigmoid",
+    cv: int = 3,
+    n_jobs: int = -1
+) -> ScoreCalibrator:
+    """
+    Fits a calibrator for a fitted pipeline on cross-validated decision scores of the
+    training data, i.e. scores of models that did not see the sample being scored.
+    Falls back to the pipeline's own (optimistic) scores when a class has fewer than
+    two samples.
+    """
+    folds = min(cv, min(Counter(labels).values()))
+    if folds >= 2:
+        from sklearn.base import clone
+        from sklearn.model_selection import cross_val_predict
+
+        scores = cross_val_predict(clone(pipeline), texts, labels, cv=folds, method="decision_function", n_jobs=n_jobs)
+    else:
+        logger.warning("Calibrating on training scores: a class has fewer than two samples")
+        scores = pipeline.decision_function(texts)
+    return fit_calibrator(scores, labels, pipeline.classes_, method)
+
+
+def save_joblib_atomic(obj, path: str):
+    """Dumps obj next to path and renames it into place, so path is never partially written."""
+    import joblib
+
+    staging_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        joblib.dump(obj, staging_path)
+        _fsync(staging_path)
+        os.replace(staging_path, path)
+    except BaseException:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+        raise
+
+
+def publish_version(
+    registry_dir: str,
+    model_name: str,
+    pipeline,
+    summary: Dict[str, Any],
+    export_mapped: bool = False,
+    keep: int = 5,
+    calibrator: Optional[ScoreCalibrator] = None
+) -> Dict[str, Any]:
+    """
+    Writes the fitted pipeline as a new version of model_name in the registry and
+    points the model's manifest at it. Versions beyond the newest `keep` are
+    deleted. Returns the new manifest.
+    """
+    model_dir = os.path.join(os.path.abspath(registry_dir), model_name)
+    os.makedirs(model_dir, exist_ok=True)
+    staging_dir = os.path.join(model_dir, f".staging-{uuid.uuid4().hex}")
+    os.makedirs(staging_dir)
+    try:
+        joblib_path = os.path.join(staging_dir, "model.joblib")
+        save_joblib_atomic(pipeline, joblib_path)
+        version = f"{time.strftime('%Y%m%dT%H%M%S')}-{file_version(joblib_path)}"
+        artifact = "model.joblib"
+        if export_mapped:
+            export_mapped_artifact(pipeline, os.path.join(staging_dir, "mapped"))
+            artifact = "mapped"
+        if calibrator is not None:
+            save_calibrator(calibrator, os.path.join(staging_dir, "calibration.json"))
+        with open(os.path.join(staging_dir, "training.json"), "w", encoding="utf-8") as f:
+            json.dump({"model": model_name, "version": version, **summary}, f, indent=2)
+
+        version_dir = os.path.join(model_dir, version)
+        if os.path.exists(version_dir): # The same model published within the same second
+            shutil.rmtree(staging_dir)
+        else:
+            os.replace(staging_dir, version_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    manifest_path = os.path.join(model_dir, MANIFEST_FILE)
+    previous = read_manifest(manifest_path)
+    history = [version] + [v for v in (previous or {}).get("history", []) if v != version]
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "model": model_name,
+        "version": version,
+        "artifact": f"{version}/{artifact}",
+        "calibration": f"{version}/calibration.json" if calibrator is not None else None,
+        "published_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "training": summary,
+        "history": history[:keep],
+    }
+    staging_manifest = f"{manifest_path}.tmp-{os.getpid()}"
+    with open(staging_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(staging_manifest, manifest_path)
+
+    for stale in history[keep:]:
+        shutil.rmtree(os.path.join(model_dir, stale), ignore_errors=True)
+    logger.info(f"Published {model_name} model {version} to {model_dir}")
+    return manifest
+
+
+def read_manifest(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def parse_param_grid(value: str) -> Dict[str, list]:
+    """
+    Parses a --param-grid JSON object. JSON has no tuples, so nested lists become
+    tuples, e.g. "tfidf__ngram_range": [[1, 2]] searches ngram_range=(1, 2).
+    """
+    return {
+        name: [tuple(candidate) if isinstance(candidate, list) else candidate for candidate in candidates]
+        for name, candidates in json.loads(value).items()
+    }
+
+
+def _fsync(path: str):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", choices=MODEL_NAMES)
+    parser.add_argument("data_path", help="Training data (.csv with a header row, or .jsonl)")
+    parser.add_argument("--registry", default=os.getenv("MODEL_REGISTRY_DIR", "/app/models_data/registry"))
+    parser.add_argument("--pipeline", choices=PIPELINE_KINDS, default="tfidf", help="TF-IDF + LinearSVC, or hashing + SGD for online updates")
+    parser.add_argument("--no-search", action="store_true", help="Fit the default parameters without a grid search")
+    parser.add_argument("--param-grid", help="JSON object of parameter lists to search instead of the default grid (nested lists are tuples)")
+    parser.add_argument("--cv", type=int, default=3, help="Cross-validation folds of the search")
+    parser.add_argument("--n-jobs", type=int, default=int(os.getenv("TRAINING_N_JOBS", "-1")), help="Search worker processes (-1: all cores)")
+    parser.add_argument("--calibration", choices=CALIBRATION_METHODS + ("none",), default="sigmoid", help="Probability calibration fitted on cross-validated scores")
+    parser.add_argument("--export-mapped", action="store_true", help="Publish a memory-mapped artifact instead of the joblib file")
+    parser.add_argument("--keep", type=int, default=5, help="Number of versions kept in the registry")
+    args = parser.parse_args(argv)
+    if args.pipeline == "online" and args.export_mapped:
+        parser.error("online pipelines cannot be exported as mapped artifacts")
+
+    logging.basicConfig(level=logging.INFO)
+    texts, labels = load_training_data(args.data_path)
+    pipeline, summary = fit_pipeline(
+        texts, labels, search=not args.no_search,
+        param_grid=parse_param_grid(args.param_grid) if args.param_grid else None,
+        cv=args.cv, n_jobs=args.n_jobs, pipeline_kind=args.pipeline
+    )
+    calibrator = None
+    if args.calibration != "none":
+        calibrator = fit_calibration(pipeline, texts, labels, args.calibration, args.cv, args.n_jobs)
+        summary["calibration"] = args.calibration
+    manifest = publish_version(args.registry, args.model, pipeline, summary, args.export_mapped, args.keep, calibrator)
+    print(json.dumps({"model": args.model, "version": manifest["version"], "training": summary}))
+
+
+if __name__ == "__main__":
+    main()
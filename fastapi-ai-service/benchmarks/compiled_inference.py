@@ -0,0 +1,72 @@
+"""
+Microbenchmark of the compiled linear inference path against the sklearn Pipeline.
+
+Trains a TF-IDF + LinearSVC pipeline on synthetic support messages, then times
+decision_function for single messages and for a batch on both paths.
+
+    python -m benchmarks.compiled_inference --classes 8 --vocabulary 5000 --repeat 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.linear_engine import CompiledLinearModel  # noqa: E402
+
+
+def synthetic_corpus(n_classes: int, vocabulary_size: int, n_samples: int, seed: int = 0):
+    """Messages whose words are drawn mostly from a per-class slice of the vocabulary."""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(vocabulary_size)]
+    slice_size = max(1, vocabulary_size // n_classes)
+    texts, labels = [], []
+    for i in range(n_samples):
+        label = i % n_classes
+        own = words[label * slice_size:(label + 1) * slice_size]
+        texts.append(" ".join(rng.choice(own) if rng.random() < 0.7 else rng.choice(words) for _ in range(rng.randint(4, 20))))
+        labels.append(f"intent_{label}")
+    return texts, labels
+
+
+def time_per_call(fn, payload, repeat: int) -> float:
+    fn(payload)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(payload)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classes", type=int, default=8)
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--samples", type=int, default=4000)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.pipeline import Pipeline
+    from sklearn.svm import LinearSVC
+
+    texts, labels = synthetic_corpus(args.classes, args.vocabulary, args.samples)
+    pipeline = Pipeline([('tfidf', TfidfVectorizer()), ('clf', LinearSVC())]).fit(texts, labels)
+    engine = CompiledLinearModel(pipeline)
+    queries, _ = synthetic_corpus(args.classes, args.vocabulary, args.batch, seed=1)
+    assert np.array_equal(engine.decision_function(queries), pipeline.decision_function(queries))
+
+    print(f"{args.classes} classes, {len(pipeline.named_steps.tfidf.vocabulary_)} features")
+    print(f"{'payload':<12} {'sklearn us':>11} {'compiled us':>12} {'speedup':>8}")
+    for name, payload, repeat in (("1 message", queries[:1], args.repeat), (f"{args.batch} messages", queries, max(1, args.repeat // 20))):
+        baseline = time_per_call(pipeline.decision_function, payload, repeat) * 1e6
+        compiled = time_per_call(engine.decision_function, payload, repeat) * 1e6
+        print(f"{name:<12} {baseline:>11.1f} {compiled:>12.1f} {baseline / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
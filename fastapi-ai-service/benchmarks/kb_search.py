@@ -0,0 +1,109 @@
+"""
+Microbenchmark of KnowledgeBaseService.search_knowledge_base as the knowledge base grows.
+
+For each size, a synthetic knowledge base is written to disk and loaded through
+KnowledgeBaseService (load time includes building the index), then a fixed set
+of queries is searched by keywords only and with a recognized intent. With
+--retrieval-mode semantic or hybrid, the load includes embedding the entries, and
+the queries are also answered by one batched search_batch call.
+
+    python -m benchmarks.kb_search --sizes 100,1000,10000,100000 --queries 500 --output kb.json
+    python -m benchmarks.kb_search --retrieval-mode semantic --sizes 1000,100000
+    python -m benchmarks.kb_search --compare kb.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.report import compare_results, latency_summary, load_baseline, memory_mb, run_metadata, save_results  # noqa: E402
+from benchmarks.synthetic import make_knowledge_base, make_messages  # noqa: E402
+
+REGRESSION_METRICS = {"load_s": "lower", "mean_ms": "lower", "p95_ms": "lower"}
+
+
+def time_queries(search, queries: List[tuple]) -> Dict[str, float]:
+    latencies = []
+    started = time.perf_counter()
+    for query, intent in queries:
+        query_started = time.perf_counter()
+        search(query, intent)
+        latencies.append(time.perf_counter() - query_started)
+    return latency_summary(latencies, 0, time.perf_counter() - started)
+
+
+def benchmark_size(size: int, queries: List[tuple], workdir: str) -> Dict[str, Dict]:
+    from app.services.knowledge_base_service import KnowledgeBaseService
+
+    path = os.path.join(workdir, f"kb_{size}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(make_knowledge_base(size), f)
+    os.environ["KNOWLEDGE_BASE_PATH"] = path
+
+    started = time.perf_counter()
+    service = KnowledgeBaseService()
+    load_seconds = time.perf_counter() - started
+    memory = memory_mb()
+
+    results = {}
+    for mode, mode_queries in (("keywords", [(query, None) for query, _ in queries]), ("intent", queries)):
+        summary = time_queries(service.search_knowledge_base, mode_queries)
+        results[f"kb_{size}_{mode}"] = {"entries": size, "load_s": load_seconds, **summary, **memory}
+
+    if service.retrieval_mode != "keyword":
+        started = time.perf_counter()
+        service.search_batch([query for query, _ in queries])
+        elapsed = time.perf_counter() - started
+        summary = latency_summary([elapsed / len(queries)] * len(queries), 0, elapsed)
+        results[f"kb_{size}_batched"] = {"entries": size, "load_s": load_seconds, **summary, **memory}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000,50000", help="Comma-separated knowledge base sizes")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--retrieval-mode", choices=("keyword", "semantic", "hybrid"), default="keyword", help="KB_RETRIEVAL_MODE of the service")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative change before a regression")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    os.environ["KB_RETRIEVAL_MODE"] = args.retrieval_mode
+
+    # Searches log every match at INFO
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    queries = [(text, intent) for text, intent, _ in make_messages(args.queries, seed=2)]
+    results: Dict[str, Dict] = {}
+    print(f"{'benchmark':<24} {'load s':>8} {'mean ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            for name, summary in benchmark_size(size, queries, workdir).items():
+                results[name] = summary
+                print(
+                    f"{name:<24} {summary['load_s']:>8.3f} {summary['mean_ms']:>9.4f} "
+                    f"{summary['p95_ms']:>9.4f} {summary['p99_ms']:>9.4f} {summary['rss_mb'] or 0:>8.1f}"
+                )
+
+    meta = run_metadata(sizes=sizes, queries=args.queries, retrieval_mode=args.retrieval_mode)
+    if args.output:
+        save_results(args.output, meta, results)
+    if args.compare:
+        regressions = compare_results(load_baseline(args.compare, meta, ["queries", "retrieval_mode", "cpu_count"]), results, REGRESSION_METRICS, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
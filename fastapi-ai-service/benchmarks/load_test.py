@@ -0,0 +1,204 @@
+"""
+Load test of the AI service endpoints.
+
+Trains small chatbot and sentiment models on synthetic support messages, then
+drives /ai/chatbot, /ai/sentiment, /ai/dispatch_ticket and
+/ai/process_incoming_message with a fixed number of concurrent clients and
+reports throughput, latency percentiles and the server's resident memory.
+
+    # ASGI app in this process (no network)
+    python -m benchmarks.load_test --mode inprocess --concurrency 8 --requests 2000 --output base.json
+    # uvicorn server in a subprocess, over HTTP
+    python -m benchmarks.load_test --mode http --concurrency 32 --compare base.json
+    # an already running service (uses whatever models it serves)
+    python -m benchmarks.load_test --mode http --url http://localhost:8001
+
+Messages are drawn from a pool of --unique-messages distinct texts, which sets
+the result cache hit rate; --no-cache disables the cache. With --compare the
+run exits with status 1 if any endpoint's RPS dropped or p95/p99 grew by more
+than --tolerance.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.report import (  # noqa: E402
+    compare_results, latency_summary, load_baseline, memory_mb, run_metadata, save_results
+)
+from benchmarks.synthetic import make_messages, prepare_artifacts  # noqa: E402
+
+ENDPOINTS: Dict[str, Tuple[str, Callable[[str, int], Dict]]] = {
+    "chatbot": ("/ai/chatbot", lambda text, i: {"message": text}),
+    "sentiment": ("/ai/sentiment", lambda text, i: {"text": text}),
+    "dispatch_ticket": ("/ai/dispatch_ticket", lambda text, i: {"ticket_id": i, "message": text}),
+    "process_incoming_message": ("/ai/process_incoming_message", lambda text, i: {"ticket_id": i, "message": text}),
+}
+
+REGRESSION_METRICS = {"rps": "higher", "p95_ms": "lower", "p99_ms": "lower"}
+
+# Runs the app under uvicorn with the application's own INFO request logging muted
+SERVER_SCRIPT = (
+    "import logging, sys, uvicorn\n"
+    "from app.main import app\n"
+    "logging.getLogger().setLevel(logging.WARNING)\n"
+    "uvicorn.run(app, host='127.0.0.1', port=int(sys.argv[1]), log_level='warning')\n"
+)
+
+
+async def drive(client: httpx.AsyncClient, path: str, payloads: List[Dict], concurrency: int, total: int):
+    """Sends total requests from concurrency clients; returns (latencies, errors, elapsed seconds)."""
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal errors, next_index
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=payloads[index % len(payloads)])
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run_endpoints(client: httpx.AsyncClient, args, server_pid: Optional[int]) -> Dict[str, Dict]:
+    messages = [text for text, _, _ in make_messages(args.unique_messages, seed=1)]
+    results = {}
+    for name in args.endpoints:
+        path, make_payload = ENDPOINTS[name]
+        payloads = [make_payload(text, i + 1) for i, text in enumerate(messages)]
+        if args.warmup:
+            await drive(client, path, payloads, args.concurrency, args.warmup)
+        latencies, errors, elapsed = await drive(client, path, payloads, args.concurrency, args.requests)
+        results[name] = {**latency_summary(latencies, errors, elapsed), **memory_mb(server_pid)}
+        summary = results[name]
+        print(
+            f"{name:<26} {summary['rps']:>8.1f} {summary.get('p50_ms', 0):>8.2f} {summary.get('p95_ms', 0):>8.2f} "
+            f"{summary.get('p99_ms', 0):>8.2f} {summary['errors']:>6} {summary['rss_mb'] or 0:>8.1f}"
+        )
+    return results
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env: Dict[str, str]) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    process = subprocess.Popen([sys.executable, "-c", SERVER_SCRIPT, str(port)], cwd=root, env={**os.environ, **env})
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"AI service exited with status {process.returncode} during startup")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("AI service did not become healthy within 60s")
+
+
+async def main_async(args, env: Dict[str, str]) -> Dict[str, Dict]:
+    print(f"{'endpoint':<26} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'rss MB':>8}")
+    if args.mode == "inprocess":
+        os.environ.update(env)
+        import logging
+        from app.main import app, load_artifacts
+        logging.getLogger().setLevel(logging.WARNING)
+        # ASGITransport does not send lifespan events, so load the artifacts here
+        await load_artifacts()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            return await run_endpoints(client, args, None)
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_server(env)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+            return await run_endpoints(client, args, server.pid if server else None)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+    parser.add_argument("--url", help="Benchmark a running service instead of starting one (http mode)")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated subset of: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests per endpoint")
+    parser.add_argument("--unique-messages", type=int, default=5000)
+    parser.add_argument("--no-cache", action="store_true", help="Disable the result cache")
+    parser.add_argument("--training-samples", type=int, default=2000)
+    parser.add_argument("--kb-entries", type=int, default=200)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative change before a regression")
+    args = parser.parse_args()
+    args.endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+    if args.url and args.mode != "http":
+        parser.error("--url requires --mode http")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {"MODEL_WATCH_INTERVAL_SECONDS": "0"}
+        if args.no_cache:
+            env["RESULT_CACHE_MAX_ENTRIES"] = "0"
+        if args.url is None:
+            env.update(prepare_artifacts(workdir, args.training_samples, args.kb_entries))
+        results = asyncio.run(main_async(args, env))
+
+    meta = run_metadata(
+        mode=args.mode, url=args.url, concurrency=args.concurrency, requests=args.requests,
+        unique_messages=args.unique_messages, cache=not args.no_cache, training_samples=args.training_samples,
+        kb_entries=args.kb_entries,
+    )
+    if args.output:
+        save_results(args.output, meta, results)
+    if args.compare:
+        baseline = load_baseline(args.compare, meta, ["mode", "url", "concurrency", "unique_messages", "cache", "cpu_count"])
+        regressions = compare_results(baseline, results, REGRESSION_METRICS, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
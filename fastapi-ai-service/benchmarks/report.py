@@ -0,0 +1,102 @@
+"""
+Result files and regression checks shared by the benchmarks.
+
+A result file is JSON of the form {"meta": {...}, "results": {name: {metric: value}}}.
+compare_results checks every metric listed in a direction map against a baseline
+file: "higher" metrics (e.g. rps) regress when they drop by more than the
+tolerance, "lower" metrics (e.g. p95_ms) when they grow by more than it.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def latency_summary(latencies_seconds: List[float], errors: int, elapsed_seconds: float) -> Dict[str, float]:
+    latencies = np.asarray(latencies_seconds, dtype=float) * 1000
+    total = len(latencies) + errors
+    summary = {"requests": total, "errors": errors, "rps": total / elapsed_seconds if elapsed_seconds > 0 else 0.0}
+    if len(latencies):
+        summary.update({
+            "mean_ms": float(latencies.mean()),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+        })
+    return summary
+
+
+def memory_mb(pid: Optional[int] = None) -> Dict[str, Optional[float]]:
+    """Current (VmRSS) and peak (VmHWM) resident memory of a process, from /proc."""
+    fields = {"VmRSS": None, "VmHWM": None}
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                key = line.split(":", 1)[0]
+                if key in fields:
+                    fields[key] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return {"rss_mb": fields["VmRSS"], "peak_rss_mb": fields["VmHWM"]}
+
+
+def run_metadata(**settings) -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        **settings,
+    }
+
+
+def save_results(path: str, meta: Dict, results: Dict[str, Dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2, sort_keys=True)
+    print(f"Saved results to {path}")
+
+
+def compare_results(
+    baseline: Dict[str, Dict],
+    current: Dict[str, Dict],
+    directions: Dict[str, str],
+    tolerance: float
+) -> List[str]:
+    """Prints a comparison table and returns a description of each regression."""
+    regressions = []
+    print(f"{'benchmark':<32} {'metric':<10} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name in sorted(set(baseline) & set(current)):
+        for metric, direction in directions.items():
+            before, after = baseline[name].get(metric), current[name].get(metric)
+            if before is None or after is None or before == 0:
+                continue
+            change = (after - before) / before
+            regressed = change < -tolerance if direction == "higher" else change > tolerance
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<32} {metric:<10} {before:>12.3f} {after:>12.3f} {change:>+7.1%}{flag}")
+            if regressed:
+                regressions.append(f"{name} {metric}: {before:.3f} -> {after:.3f} ({change:+.1%})")
+    return regressions
+
+
+def load_baseline(path: str, meta: Dict, settings: List[str]) -> Dict[str, Dict]:
+    """Reads a baseline file's results, warning about settings that differ from this run."""
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    for key in settings:
+        before, after = baseline.get("meta", {}).get(key), meta.get(key)
+        if before != after:
+            print(f"Warning: baseline was run with {key}={before!r}, this run uses {key}={after!r}")
+    return baseline["results"]
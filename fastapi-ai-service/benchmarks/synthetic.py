@@ -0,0 +1,95 @@
+"""
+Synthetic customer-support data for the benchmarks.
+
+Messages are composed from per-intent and per-sentiment phrase templates plus
+random product nouns and order numbers, so any number of distinct but realistic
+messages can be generated from a seed. The models trained here use the same
+pipeline as ModelService._train_and_save_model.
+"""
+import json
+import os
+import random
+from typing import Dict, List, Tuple
+
+import joblib
+
+INTENT_PHRASES = {
+    "greeting": ["hello there", "hi, good morning", "hey, anyone around", "good afternoon team"],
+    "password_reset": ["i forgot my password", "how do i reset my password", "password reset link is not working", "cannot log in, need a new password"],
+    "order_status": ["where is my order", "what is the status of order", "my order has not arrived yet", "tracking for my package shows nothing"],
+    "technical_support": ["the app keeps crashing", "error message when i open the software", "my internet connection is not working", "the device will not turn on"],
+    "billing_inquiry": ["i was charged twice", "question about my invoice", "why is my bill higher this month", "please refund the extra payment"],
+    "product_inquiry": ["does this come in another color", "is the product in stock", "what are the specs of", "can you tell me more about"],
+    "thanks": ["thank you so much", "thanks for the help", "appreciate your support", "many thanks"],
+    "goodbye": ["goodbye", "bye for now", "see you later", "that is all, bye"],
+}
+
+SENTIMENT_PHRASES = {
+    "positive": ["great service", "i love it", "you are wonderful", "very happy with this"],
+    "negative": ["this is terrible", "i am very angry", "worst experience ever", "really disappointed"],
+    "neutral": ["please check", "just a question", "let me know", "when you can"],
+}
+
+NOUNS = ["laptop", "phone", "router", "headphones", "subscription", "account", "tablet", "camera", "monitor", "charger"]
+
+
+def make_messages(count: int, seed: int = 0) -> List[Tuple[str, str, str]]:
+    """Returns (message, intent, sentiment) triples; messages are distinct with high probability."""
+    rng = random.Random(seed)
+    intents, sentiments = sorted(INTENT_PHRASES), sorted(SENTIMENT_PHRASES)
+    samples = []
+    for _ in range(count):
+        intent, sentiment = rng.choice(intents), rng.choice(sentiments)
+        parts = [rng.choice(INTENT_PHRASES[intent]), rng.choice(NOUNS), rng.choice(SENTIMENT_PHRASES[sentiment])]
+        if rng.random() < 0.5:
+            parts.append(f"order {rng.randint(10000, 99999)}")
+        rng.shuffle(parts)
+        samples.append((", ".join(parts), intent, sentiment))
+    return samples
+
+
+def make_knowledge_base(count: int, seed: int = 0) -> List[Dict]:
+    """Knowledge base entries in the format of knowledge_base.json."""
+    rng = random.Random(seed)
+    intents = sorted(INTENT_PHRASES)
+    entries = []
+    for i in range(count):
+        intent = intents[i % len(intents)]
+        noun = rng.choice(NOUNS)
+        phrase = rng.choice(INTENT_PHRASES[intent])
+        entries.append({
+            "question": f"{phrase} ({noun} #{i})?",
+            "answer": f"Answer {i}: see the {noun} help page for '{phrase}'.",
+            "keywords": sorted({noun, f"topic{i}"} | set(rng.sample(phrase.split(), min(2, len(phrase.split()))))),
+            # Only the first entry per intent is registered for intent matching
+            "intent_keyword": intent if i < len(intents) else None,
+        })
+    return entries
+
+
+def train_pipeline(texts: List[str], labels: List[str]):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.pipeline import Pipeline
+    from sklearn.svm import LinearSVC
+
+    return Pipeline([('tfidf', TfidfVectorizer(max_features=1000)), ('clf', LinearSVC())]).fit(texts, labels)
+
+
+def prepare_artifacts(workdir: str, training_samples: int = 2000, kb_entries: int = 200, seed: int = 0) -> Dict[str, str]:
+    """
+    Trains chatbot and sentiment models and writes a knowledge base into workdir.
+    Returns the environment variables that point the service at them.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    samples = make_messages(training_samples, seed)
+    texts = [text for text, _, _ in samples]
+    paths = {
+        "MODEL_PATH_CHATBOT": os.path.join(workdir, "chatbot.joblib"),
+        "MODEL_PATH_SENTIMENT": os.path.join(workdir, "sentiment.joblib"),
+        "KNOWLEDGE_BASE_PATH": os.path.join(workdir, "knowledge_base.json"),
+    }
+    joblib.dump(train_pipeline(texts, [intent for _, intent, _ in samples]), paths["MODEL_PATH_CHATBOT"])
+    joblib.dump(train_pipeline(texts, [sentiment for _, _, sentiment in samples]), paths["MODEL_PATH_SENTIMENT"])
+    with open(paths["KNOWLEDGE_BASE_PATH"], "w", encoding="utf-8") as f:
+        json.dump(make_knowledge_base(kb_entries, seed), f)
+    return paths
@@ -0,0 +1,119 @@
+"""
+Compares per-worker memory of joblib vs memory-mapped model artifacts.
+
+Starts N fresh worker processes per format. Each loads the same model, runs one
+prediction and reports its RSS and PSS (proportional set size, which splits shared
+pages between the processes mapping them) while all N workers are alive.
+
+    python -m benchmarks.worker_memory --workers 4 --features 300000 --classes 20
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.model_artifacts import export_mapped_artifact  # noqa: E402
+
+
+def build_large_pipeline(n_features: int, n_classes: int, seed: int = 0):
+    """A TF-IDF + LinearSVC pipeline with a synthetic vocabulary and coefficients of the requested size."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.pipeline import Pipeline
+    from sklearn.svm import LinearSVC
+
+    rng = np.random.default_rng(seed)
+    texts = [f"term{i:07d} term{(i + 1) % n_classes:07d}" for i in range(n_classes)]
+    labels = [f"intent_{i}" for i in range(n_classes)]
+    pipeline = Pipeline([('tfidf', TfidfVectorizer()), ('clf', LinearSVC())]).fit(texts, labels)
+
+    vectorizer, classifier = pipeline.named_steps.tfidf, pipeline.named_steps.clf
+    vectorizer.vocabulary_ = {f"term{i:07d}": i for i in range(n_features)}
+    vectorizer.idf_ = rng.uniform(1.0, 10.0, n_features)
+    classifier.coef_ = rng.normal(size=(n_classes, n_features))
+    classifier.intercept_ = rng.normal(size=n_classes)
+    vectorizer._tfidf.n_features_in_ = classifier.n_features_in_ = n_features
+    return pipeline
+
+
+def _memory_kb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].rstrip(":") in ("Rss", "Pss"):
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields["Rss"], fields["Pss"]
+
+
+def _worker(model_path, results, all_loaded, done):
+    from app.utils.model_loader import load_model_from_path
+
+    try:
+        started = time.perf_counter()
+        model = load_model_from_path(model_path)
+        model.decision_function(["term0000001 term0000002 unknown words"])
+        sample = time.perf_counter() - started
+    except Exception as e:
+        sample = e
+    # Measure only once every worker holds its model
+    all_loaded.wait()
+    if isinstance(sample, Exception):
+        results.put(sample)
+    else:
+        rss, pss = _memory_kb()
+        results.put((rss, pss, sample))
+    done.wait()
+
+
+def measure(model_path: str, workers: int):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    all_loaded, done = context.Barrier(workers + 1), context.Event()
+    processes = [context.Process(target=_worker, args=(model_path, results, all_loaded, done)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    all_loaded.wait()
+    samples = [results.get() for _ in processes]
+    done.set()
+    for process in processes:
+        process.join()
+    errors = [sample for sample in samples if isinstance(sample, Exception)]
+    if errors:
+        raise RuntimeError(f"{len(errors)} worker(s) failed to load {model_path}: {errors[0]}")
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--features", type=int, default=300_000)
+    parser.add_argument("--classes", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pipeline = build_large_pipeline(args.features, args.classes)
+        joblib_path = os.path.join(tmp, "model.joblib")
+        mapped_path = os.path.join(tmp, "model_mapped")
+        joblib.dump(pipeline, joblib_path)
+        export_mapped_artifact(pipeline, mapped_path)
+        del pipeline
+
+        print(f"{args.features} features x {args.classes} classes, {args.workers} workers")
+        print(f"{'format':<8} {'RSS/worker MB':>14} {'PSS/worker MB':>14} {'PSS total MB':>13} {'load s':>8}")
+        for name, path in (("joblib", joblib_path), ("mmap", mapped_path)):
+            samples = measure(path, args.workers)
+            rss = np.mean([s[0] for s in samples]) / 1024
+            pss = np.mean([s[1] for s in samples]) / 1024
+            load = np.mean([s[2] for s in samples])
+            print(f"{name:<8} {rss:>14.1f} {pss:>14.1f} {pss * args.workers:>13.1f} {load:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
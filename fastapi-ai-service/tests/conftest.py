@@ -0,0 +1,109 @@
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import joblib
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+CHATBOT_TRAINING_DATA = [
+    ("hello there", "greeting"),
+    ("hi, good morning", "greeting"),
+    ("hey, hello", "greeting"),
+    ("i forgot my password", "password_reset"),
+    ("how do i reset my password", "password_reset"),
+    ("password reset link not working", "password_reset"),
+    ("where is my order", "order_status"),
+    ("what is the status of my order", "order_status"),
+    ("my order has not arrived yet", "order_status"),
+    ("my internet is not working", "technical_support"),
+    ("the app keeps crashing, need technical support", "technical_support"),
+    ("error message when i open the software", "technical_support"),
+]
+
+SENTIMENT_TRAINING_DATA = [
+    ("i love this, great service", "positive"),
+    ("thank you, this is wonderful", "positive"),
+    ("excellent support, very happy", "positive"),
+    ("this is terrible, i am angry", "negative"),
+    ("awful experience, very disappointed", "negative"),
+    ("i hate this, worst service ever", "negative"),
+    ("i have a question about my account", "neutral"),
+    ("please check my order", "neutral"),
+    ("how do i change my settings", "neutral"),
+]
+
+KNOWLEDGE_BASE_DATA = [
+    {"question": "How to reset password?", "answer": "You can reset your password on the login page.", "keywords": ["reset", "password", "forgot"], "intent_keyword": "password_reset"},
+    {"question": "What is my order status?", "answer": "Please provide your order number to check status.", "keywords": ["order", "tracking"], "intent_keyword": "order_status"},
+]
+
+
+def train_pipeline(samples):
+    """Fits the same TF-IDF + LinearSVC pipeline the services train, on a small labelled sample."""
+    texts, labels = zip(*samples)
+    pipeline = Pipeline([
+        ('tfidf', TfidfVectorizer(max_features=1000)),
+        ('clf', LinearSVC())
+    ])
+    pipeline.fit(list(texts), list(labels))
+    return pipeline
+
+
+@pytest.fixture
+def ai_services(tmp_path, monkeypatch):
+    """Trains real models into tmp_path and wires fresh services into app.main."""
+    chatbot_path = tmp_path / "chatbot.joblib"
+    sentiment_path = tmp_path / "sentiment.joblib"
+    kb_path = tmp_path / "knowledge_base.json"
+    joblib.dump(train_pipeline(CHATBOT_TRAINING_DATA), chatbot_path)
+    joblib.dump(train_pipeline(SENTIMENT_TRAINING_DATA), sentiment_path)
+    kb_path.write_text(json.dumps(KNOWLEDGE_BASE_DATA), encoding='utf-8')
+
+    monkeypatch.setenv("MODEL_PATH_CHATBOT", str(chatbot_path))
+    monkeypatch.setenv("MODEL_PATH_SENTIMENT", str(sentiment_path))
+    monkeypatch.setenv("KNOWLEDGE_BASE_PATH", str(kb_path))
+
+    from app import main
+    from app.services.chatbot_service import ChatbotService
+    from app.services.sentiment_service import SentimentService
+    from app.services.dispatch_service import DispatchService
+    from app.services.knowledge_base_service import KnowledgeBaseService
+    from app.services.ticket_analysis_service import TicketAnalysisService
+    from app.services.stream_analysis_service import StreamAnalysisService
+    from app.services.message_pipeline import MessagePipeline
+    from app.utils.result_cache import ResultCache
+
+    services = SimpleNamespace(
+        chatbot=ChatbotService(),
+        sentiment=SentimentService(),
+        dispatch=DispatchService(),
+        knowledge_base=KnowledgeBaseService(),
+        result_cache=ResultCache(max_entries=1000, ttl_seconds=300),
+    )
+    services.analysis = TicketAnalysisService(
+        services.chatbot, services.sentiment, services.knowledge_base, services.dispatch, services.result_cache
+    )
+    monkeypatch.setattr(main, "chatbot_service", services.chatbot)
+    monkeypatch.setattr(main, "sentiment_service", services.sentiment)
+    monkeypatch.setattr(main, "dispatch_service", services.dispatch)
+    monkeypatch.setattr(main, "knowledge_base_service", services.knowledge_base)
+    monkeypatch.setattr(main, "result_cache", services.result_cache)
+    monkeypatch.setattr(main, "ticket_analysis_service", services.analysis)
+    monkeypatch.setattr(main, "stream_analysis_service", StreamAnalysisService(services.analysis, main.inference_executor))
+    monkeypatch.setattr(main, "message_pipeline", MessagePipeline(
+        services.analysis, main.inference_executor, main.micro_batchers["classify"].submit
+    ))
+    return services
+
+
+@pytest.fixture
+def api_client(ai_services):
+    from app.main import app
+    return TestClient(app)
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+from app.utils.admission import ADMISSION_REJECTED, AdmissionController, AdmissionRejected, pre_classify
+
+
+def test_pre_classification():
+    assert pre_classify("This is TERRIBLE, I want a refund") == "high"
+    assert pre_classify("我要退款") == "high"
+    assert pre_classify("where is my order!!") == "high"
+    assert pre_classify("Hi there, good morning") == "low"
+    assert pre_classify("hello, my order has not arrived") is None
+
+
+def test_slots_go_to_the_most_important_waiter_and_low_priority_is_shed():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue=2)
+        await controller.acquire("normal") # Holds the only slot
+        admitted = []
+
+        async def request(priority):
+            try:
+                await controller.acquire(priority)
+            except AdmissionRejected as e:
+                admitted.append((priority, e.reason))
+                return
+            admitted.append(priority)
+            controller.release()
+
+        low = asyncio.ensure_future(request("low"))
+        normal = asyncio.ensure_future(request("normal"))
+        await asyncio.sleep(0)
+        high = asyncio.ensure_future(request("high")) # Queue full: takes the low request's place
+        await asyncio.sleep(0)
+        rejected = asyncio.ensure_future(request("low")) # Nothing less important to shed
+        await asyncio.sleep(0)
+        assert controller.queued() == {"high": 1, "normal": 1, "low": 0}
+        controller.release()
+        await asyncio.gather(low, normal, high, rejected)
+        return admitted, controller.active
+
+    admitted, active = asyncio.run(main())
+    assert admitted == [("low", "shed"), ("low", "queue_full"), "high", "normal"]
+    assert active == 0
+
+
+def test_deadlines_drop_queued_requests():
+    async def main():
+        controller = AdmissionController(max_concurrent=1)
+        await controller.acquire("normal")
+        with pytest.raises(AdmissionRejected) as late:
+            await controller.acquire("high", deadline=time.time() - 1)
+        dropped = ADMISSION_REJECTED.value(priority="normal", reason="deadline")
+        with pytest.raises(AdmissionRejected) as expired:
+            await controller.acquire("normal", deadline=time.time() + 0.05)
+        assert ADMISSION_REJECTED.value(priority="normal", reason="deadline") == dropped + 1
+        controller.release()
+        return late.value, expired.value, controller.active, controller.queued()
+
+    late, expired, active, queued = asyncio.run(main())
+    assert (late.status_code, late.reason) == (503, "deadline")
+    assert (expired.status_code, expired.reason) == (503, "deadline")
+    assert active == 0 and sum(queued.values()) == 0
+
+
+def test_token_buckets_are_per_client():
+    controller = AdmissionController(rate_per_second=0.5, burst=2)
+    controller.check_rate("a", "normal")
+    controller.check_rate("a", "normal")
+    with pytest.raises(AdmissionRejected) as limited:
+        controller.check_rate("a", "normal")
+    assert (limited.value.status_code, limited.value.retry_after) == (429, 2)
+    controller.check_rate("b", "normal")
+
+
+def test_middleware_rejects_with_retry_after(api_client, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main.admission_controller, "rate_per_second", 1.0)
+    monkeypatch.setattr(main.admission_controller, "burst", 1.0)
+    headers = {"X-Client-ID": "admission-test"}
+    # The body was read for pre-classification and is replayed to the endpoint
+    first = api_client.post("/ai/sentiment", json={"text": "this is terrible"}, headers=headers)
+    assert first.status_code == 200 and first.json()["sentiment"] == "negative"
+    second = api_client.post("/ai/sentiment", json={"text": "this is terrible"}, headers=headers)
+    assert second.status_code == 429 and second.headers["Retry-After"] == "1"
+    assert api_client.get("/health").status_code == 200 # Only /ai/ endpoints are admission controlled
+
+    late = api_client.post(
+        "/ai/process_incoming_message", json={"ticket_id": 1, "message": "hello"},
+        headers={"X-Client-ID": "admission-deadline", "X-Request-Deadline": str(time.time() - 5)}
+    )
+    assert late.status_code == 503 and "Retry-After" in late.headers
+    metrics = api_client.get("/metrics").text
+    assert 'ai_admission_rejected_total{priority="low",reason="deadline"}' in metrics
+    assert "ai_admission_queue_wait_seconds_count" in metrics
+    assert 'ai_http_request_duration_seconds_count{method="POST",route="/ai/sentiment",status="429"}' in metrics
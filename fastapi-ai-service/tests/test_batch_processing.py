@@ -0,0 +1,79 @@
+def test_batch_matches_single_message_results(api_client):
+    items = [
+        {"ticket_id": 1, "message": "I forgot my password"},
+        {"ticket_id": 2, "message": "where is my order, this is terrible"},
+        {"ticket_id": 3, "message": "hello there", "existing_ticket_status": "in_progress"},
+    ]
+    response = api_client.post("/ai/process_incoming_messages", json=items)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["succeeded"] == 3 and data["failed"] == 0
+    assert [r["index"] for r in data["results"]] == [0, 1, 2]
+    assert [r["ticket_id"] for r in data["results"]] == [1, 2, 3]
+
+    for item, batched in zip(items, data["results"]):
+        single = api_client.post("/ai/process_incoming_message", json=item).json()
+        assert batched["status"] == "ok"
+        assert batched["result"]["intent"] == single["intent"]
+        assert batched["result"]["sentiment"] == single["sentiment"]
+        assert batched["result"]["intent_confidence"] == single["intent_confidence"]
+        assert batched["result"]["ai_reply"] == single["ai_reply"]
+        assert batched["result"]["suggested_priority"] == single["suggested_priority"]
+
+
+def test_batch_invalid_item_does_not_fail_the_rest(api_client):
+    response = api_client.post("/ai/process_incoming_messages", json=[
+        {"ticket_id": 1, "message": "I forgot my password"},
+        {"ticket_id": "not-a-number"},
+        "just a string",
+        {"ticket_id": 4, "message": "where is my order"},
+    ])
+    assert response.status_code == 200
+    data = response.json()
+    assert data["succeeded"] == 2 and data["failed"] == 2
+    statuses = [r["status"] for r in data["results"]]
+    assert statuses == ["ok", "error", "error", "ok"]
+    assert data["results"][1]["error"].startswith("Invalid request")
+    assert data["results"][3]["result"]["intent"] == "order_status"
+
+
+def test_batch_processing_error_is_isolated_per_item(ai_services, api_client, monkeypatch):
+    original = ai_services.dispatch.suggest_dispatch
+
+    def flaky_dispatch(intent, sentiment, current_status='pending'):
+        if current_status == "broken":
+            raise RuntimeError("dispatch failed")
+        return original(intent, sentiment, current_status)
+
+    monkeypatch.setattr(ai_services.dispatch, "suggest_dispatch", flaky_dispatch)
+    response = api_client.post("/ai/process_incoming_messages", json=[
+        {"ticket_id": 1, "message": "hello", "existing_ticket_status": "broken"},
+        {"ticket_id": 2, "message": "hello"},
+    ])
+    data = response.json()
+    assert [r["status"] for r in data["results"]] == ["error", "ok"]
+    assert "dispatch failed" in data["results"][0]["error"]
+
+
+def test_batch_uses_one_model_call_per_head(ai_services):
+    calls = []
+    classifier = ai_services.chatbot.pipeline.named_steps.clf
+    original = classifier.decision_function
+
+    def counting_decision_function(X):
+        calls.append(X.shape[0])
+        return original(X)
+
+    classifier.decision_function = counting_decision_function
+    from app.models.ticket_models import TicketAnalysisRequest
+    requests = [TicketAnalysisRequest(ticket_id=i, message=f"where is my order {i}") for i in range(10)]
+    results = ai_services.analysis.analyze_batch(requests)
+    assert calls == [10]
+    assert all(error is None for _, error in results)
+
+
+def test_batch_too_large_is_rejected(api_client, monkeypatch):
+    from app import main
+    monkeypatch.setattr(main, "MAX_BATCH_SIZE", 2)
+    response = api_client.post("/ai/process_incoming_messages", json=[{"ticket_id": i, "message": "hi"} for i in range(3)])
+    assert response.status_code == 413
@@ -0,0 +1,18 @@
+from benchmarks.report import compare_results, latency_summary
+
+
+def test_latency_summary_reports_throughput_and_percentiles():
+    summary = latency_summary([0.001 * i for i in range(1, 101)], errors=4, elapsed_seconds=2.0)
+    assert summary["requests"] == 104 and summary["errors"] == 4
+    assert summary["rps"] == 52.0
+    assert summary["p50_ms"] == 50.5
+    assert round(summary["p99_ms"], 2) == 99.01
+
+
+def test_regressions_respect_metric_direction_and_tolerance():
+    baseline = {"chatbot": {"rps": 1000.0, "p95_ms": 10.0}, "removed": {"rps": 1.0}}
+    current = {"chatbot": {"rps": 850.0, "p95_ms": 10.5}, "added": {"rps": 1.0}}
+    directions = {"rps": "higher", "p95_ms": "lower"}
+    assert compare_results(baseline, current, directions, tolerance=0.2) == []
+    regressions = compare_results(baseline, current, directions, tolerance=0.1)
+    assert regressions == ["chatbot rps: 1000.000 -> 850.000 (-15.0%)"]
@@ -0,0 +1,81 @@
+import json
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+from app.services.bulk_job_service import BulkJobService
+from app.services.ticket_analysis_service import TicketAnalysisService
+
+
+def make_bulk_job_service(ai_services, monkeypatch, job_dir, **kwargs):
+    from app import main
+    analysis = TicketAnalysisService(ai_services.chatbot, ai_services.sentiment, ai_services.knowledge_base, ai_services.dispatch)
+    service = BulkJobService(analysis, main.inference_executor, job_dir=str(job_dir), **kwargs)
+    monkeypatch.setattr(main, "bulk_job_service", service)
+    return service
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/ai/jobs/{job_id}").json()
+        if status["status"] not in ("queued", "running"):
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_bulk_job_streams_results_in_input_order(ai_services, monkeypatch, tmp_path):
+    from app.main import app
+    service = make_bulk_job_service(ai_services, monkeypatch, tmp_path / "jobs", chunk_size=2, parallel_chunks=2)
+    records = [
+        json.dumps({"ticket_id": 1, "message": "how do i reset my password"}),
+        "not json",
+        "",
+        json.dumps({"ticket_id": 3, "message": "where is my order"}),
+        json.dumps({"ticket_id": "x", "message": "hello"}),
+        json.dumps({"ticket_id": 5, "message": "i love this, great service"}),
+    ]
+    body = ("\n".join(records)).encode("utf-8") # no trailing newline
+
+    with TestClient(app) as client:
+        response = client.post("/ai/jobs", content=body, headers={"Content-Type": "application/x-ndjson"})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.json()["input_bytes"] == len(body)
+
+        status = wait_for_job(client, job_id)
+        assert status["status"] == "completed"
+        assert status["progress"] == 1.0 and status["processed_bytes"] == len(body)
+        assert (status["processed"], status["succeeded"], status["failed"]) == (5, 3, 2)
+        # The input is removed once processed
+        assert not os.path.exists(service.get(job_id).input_path)
+
+        lines = client.get(status["results_url"]).text.splitlines()
+        results = [json.loads(line) for line in lines]
+        assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+        assert [result["status"] for result in results] == ["ok", "error", "ok", "error", "ok"]
+        assert [result["ticket_id"] for result in results] == [1, None, 3, None, 5]
+        assert results[0]["result"]["intent"] == "password_reset"
+        assert results[2]["result"]["knowledge_base_answer"] == "Please provide your order number to check status."
+        # Re-scoring historical tickets does not dispatch them again
+        assert results[0]["result"]["suggested_agent_id"] is None
+        assert ai_services.dispatch.get_roster()[0].open_tickets == 0
+
+        assert [job["job_id"] for job in client.get("/ai/jobs").json()["jobs"]] == [job_id]
+        assert client.delete(f"/ai/jobs/{job_id}").status_code == 200
+        assert client.get(f"/ai/jobs/{job_id}").status_code == 404
+        assert os.listdir(tmp_path / "jobs") == []
+
+
+def test_bulk_job_rejects_oversized_input(ai_services, monkeypatch, tmp_path):
+    from app.main import app
+    service = make_bulk_job_service(ai_services, monkeypatch, tmp_path / "jobs")
+    service.max_input_bytes = 10
+
+    with TestClient(app) as client:
+        response = client.post("/ai/jobs", content=b'{"ticket_id": 1, "message": "hello"}\n')
+        assert response.status_code == 413
+        assert client.get("/ai/jobs").json()["jobs"] == []
+    assert os.listdir(tmp_path / "jobs") == []
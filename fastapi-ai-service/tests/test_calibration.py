@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+
+from app.services.chatbot_service import ChatbotService
+from app.services.sentiment_service import SentimentService
+from app.utils.calibration import ScoreCalibrator, fit_calibrator
+from app.utils.training import fit_calibration
+from conftest import CHATBOT_TRAINING_DATA, SENTIMENT_TRAINING_DATA, train_pipeline
+
+
+def test_calibrated_probabilities_are_normalized_and_monotone():
+    texts, labels = map(list, zip(*CHATBOT_TRAINING_DATA))
+    pipeline = train_pipeline(CHATBOT_TRAINING_DATA)
+    scores = pipeline.decision_function(texts)
+    for method in ("sigmoid", "isotonic"):
+        calibrator = fit_calibration(pipeline, texts, labels, method, n_jobs=1)
+        probabilities = calibrator.predict_proba(scores)
+        assert probabilities.shape == (len(texts), len(pipeline.classes_))
+        assert np.allclose(probabilities.sum(axis=1), 1.0)
+        assert np.all((probabilities >= 0) & (probabilities <= 1))
+        # Survives the JSON round trip it is stored in
+        restored = ScoreCalibrator.from_dict(json.loads(json.dumps(calibrator.to_dict())))
+        assert np.array_equal(restored.predict_proba(scores), probabilities)
+
+    # Binary: one curve for classes[1], a higher margin means a higher probability
+    margins = np.array([-3.0, -1.0, 0.0, 1.0, 3.0] * 4)
+    binary = fit_calibrator(margins, ["neg", "neg", "pos", "pos", "pos"] * 4, ["neg", "pos"])
+    probabilities = binary.predict_proba(np.array([-2.0, 0.5, 2.0]))
+    assert np.allclose(probabilities.sum(axis=1), 1.0)
+    assert np.all(np.diff(probabilities[:, 1]) > 0)
+
+
+def test_services_report_calibrated_confidence_from_the_same_scores(ai_services):
+    texts, labels = map(list, zip(*SENTIMENT_TRAINING_DATA))
+    sentiment = ai_services.sentiment
+    raw_version = sentiment.model_version
+    calibrator = fit_calibration(sentiment.pipeline, texts, labels, n_jobs=1)
+    with open(f"{sentiment.model_path}.calibration.json", "w", encoding="utf-8") as f:
+        json.dump(calibrator.to_dict(), f)
+
+    reloaded = SentimentService()
+    assert reloaded.model_version == f"{raw_version}-{calibrator.version}"
+    messages = ["i love this, great service", "this is terrible", "please check my order"]
+    expected = calibrator.predict_proba(reloaded.pipeline.decision_function(messages))
+    predictions = reloaded.analyze_sentiments(messages)
+    assert [label for label, _ in predictions] == [reloaded.labels[i] for i in expected.argmax(axis=1)]
+    assert np.allclose([confidence for _, confidence in predictions], expected.max(axis=1))
+
+
+def test_low_confidence_intent_falls_back_before_reply(api_client, ai_services, monkeypatch):
+    message = {"ticket_id": 1, "message": "hello there"}
+    assert api_client.post("/ai/process_incoming_message", json=message).json()["ai_reply"] is not None
+
+    monkeypatch.setenv("INTENT_CONFIDENCE_THRESHOLD", "1000")
+    strict = ChatbotService()
+    assert strict.predict_intent("hello there")[0] == "unknown"
+
+    ai_services.chatbot.confidence_threshold = 1000
+    ai_services.result_cache.invalidate()
+    response = api_client.post("/ai/process_incoming_message", json=message).json()
+    assert response["intent"] == "unknown"
+    assert response["ai_reply"] is None
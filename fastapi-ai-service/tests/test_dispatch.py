@@ -0,0 +1,76 @@
+import json
+
+from app.services.dispatch_service import DispatchService
+from app.utils.agent_pool import Agent, AgentPool
+
+ROSTER = [
+    {"id": 1, "name": "John Doe", "skills": ["technical_support", "billing_inquiry"]},
+    {"id": 2, "name": "Jane Smith", "skills": ["order_status", "technical_support"]},
+    {"id": 3, "name": "Admin User", "skills": ["all"]},
+]
+
+
+def make_pool(open_tickets=None):
+    return AgentPool([Agent(a["id"], a["name"], tuple(a["skills"])) for a in ROSTER], open_tickets)
+
+
+def test_least_loaded_specialist_is_selected():
+    pool = make_pool({1: 4, 2: 1})
+    assert pool.select("technical_support") == 2
+    assert pool.select("technical_support") == 2
+    # Agent 2 now has 3 open tickets, agent 1 still 4; ties go to the lower id
+    assert pool.select("technical_support") == 2
+    assert pool.select("technical_support") == 1
+    assert pool.open_tickets() == {1: 5, 2: 4, 3: 0}
+
+
+def test_generalists_take_intents_without_specialists():
+    pool = make_pool({3: 7})
+    assert pool.select("product_inquiry") == 3
+    assert pool.select("billing_inquiry") == 1
+    assert AgentPool([]).select("billing_inquiry") is None
+
+
+def test_reported_load_overrides_reservations_and_heaps_stay_bounded():
+    pool = make_pool()
+    for _ in range(1000):
+        pool.select("technical_support")
+    assert pool.set_open_tickets({1: 0, 2: 3, 99: 1}) == [99]
+    assert pool.select("technical_support", reserve=False) == 1
+    assert len(pool._heaps["technical_support"]) <= 2 * 2 + 8
+
+
+def test_roster_is_loaded_from_file_and_kept_on_bad_reload(tmp_path, monkeypatch):
+    roster_path = tmp_path / "agents.json"
+    roster_path.write_text(json.dumps({"agents": ROSTER}), encoding="utf-8")
+    monkeypatch.setenv("DISPATCH_ROSTER_PATH", str(roster_path))
+    service = DispatchService()
+    assert service.agent_skills[2]["skills"] == ["order_status", "technical_support"]
+    service.update_open_tickets({1: 2})
+
+    roster_path.write_text("[{\"id\": \"not a number\"}]", encoding="utf-8")
+    assert service.load_roster() is False
+    assert [agent.open_tickets for agent in service.get_roster()] == [2, 0, 0]
+    assert service.suggest_dispatch("technical_support", "negative") == (2, "urgent")
+
+
+def test_default_roster_spreads_tickets_across_agents(monkeypatch):
+    monkeypatch.delenv("DISPATCH_ROSTER_PATH", raising=False)
+    service = DispatchService()
+    service.set_roster(service.get_roster() + [service.get_roster()[0].model_copy(update={"id": 4, "name": "Second Tech"})])
+    agents = [service.suggest_dispatch("technical_support", "neutral")[0] for _ in range(4)]
+    assert sorted(agents) == [1, 1, 4, 4]
+
+
+def test_admin_endpoints_update_roster_and_load(api_client, ai_services):
+    response = api_client.put("/admin/dispatch/agents", json={"agents": ROSTER})
+    assert response.status_code == 200
+    assert [agent["id"] for agent in response.json()["agents"]] == [1, 2, 3]
+
+    response = api_client.post("/admin/dispatch/load", json={"open_tickets": {"1": 5, "42": 1}})
+    assert response.json() == {"status": "ok", "updated": 1, "unknown_agent_ids": [42]}
+
+    response = api_client.post("/ai/process_incoming_message", json={"ticket_id": 1, "message": "my internet is not working"})
+    assert response.json()["suggested_agent_id"] == 2
+    loads = {agent["id"]: agent["open_tickets"] for agent in api_client.get("/admin/dispatch/agents").json()["agents"]}
+    assert loads == {1: 5, 2: 1, 3: 0}
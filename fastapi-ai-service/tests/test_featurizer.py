@@ -0,0 +1,56 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.utils.featurizer import MessageFeatures, decision_scores
+from conftest import CHATBOT_TRAINING_DATA, SENTIMENT_TRAINING_DATA, train_pipeline
+
+MESSAGES = ["I forgot my password!!", "where is my order? This is terrible", "hello", "zzz unseen words"]
+
+
+def test_features_match_vectorizer_transform():
+    pipeline = train_pipeline(CHATBOT_TRAINING_DATA)
+    vectorizer = pipeline.named_steps.tfidf
+    features = MessageFeatures(MESSAGES)
+    expected = vectorizer.transform(MESSAGES)
+    actual = features.transform(vectorizer)
+    assert (actual != expected).nnz == 0
+    assert actual.dtype == expected.dtype
+
+
+def test_sublinear_binary_and_ngram_vectorizers_match():
+    texts = [text for text, _ in CHATBOT_TRAINING_DATA]
+    for params in ({"sublinear_tf": True}, {"binary": True, "norm": "l1"}, {"ngram_range": (1, 2), "use_idf": False}):
+        vectorizer = TfidfVectorizer(**params).fit(texts)
+        actual = MessageFeatures(MESSAGES).transform(vectorizer)
+        assert np.array_equal(actual.toarray(), vectorizer.transform(MESSAGES).toarray())
+
+
+def test_messages_are_tokenized_once_for_both_heads(monkeypatch):
+    chatbot = train_pipeline(CHATBOT_TRAINING_DATA)
+    sentiment = train_pipeline(SENTIMENT_TRAINING_DATA)
+    analyzer_builds = []
+    original_build = TfidfVectorizer.build_analyzer
+
+    def counting_build(self):
+        analyzer_builds.append(self)
+        return original_build(self)
+
+    monkeypatch.setattr(TfidfVectorizer, "build_analyzer", counting_build)
+    features = MessageFeatures(MESSAGES)
+    chatbot_scores = decision_scores(chatbot, MESSAGES, features)
+    sentiment_scores = decision_scores(sentiment, MESSAGES, features)
+    # Repeated lookups are served from the per-request cache
+    decision_scores(chatbot, MESSAGES, features)
+    assert len(analyzer_builds) == 1
+
+    monkeypatch.setattr(TfidfVectorizer, "build_analyzer", original_build)
+    assert np.array_equal(chatbot_scores, chatbot.decision_function(MESSAGES))
+    assert np.array_equal(sentiment_scores, sentiment.decision_function(MESSAGES))
+
+
+def test_services_derive_labels_from_decision_function(ai_services):
+    pipeline = ai_services.sentiment.pipeline
+    features = MessageFeatures(MESSAGES)
+    results = ai_services.sentiment.analyze_sentiments(MESSAGES, features)
+    expected = pipeline.predict(MESSAGES)
+    assert [label for label, _ in results] == list(expected)
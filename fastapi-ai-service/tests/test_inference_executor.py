@@ -0,0 +1,72 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from app.utils.inference_executor import InferenceExecutor, InferenceQueueFullError
+
+
+class _PidService:
+    def worker_pid(self, offset=0):
+        return os.getpid() + offset
+
+
+def test_thread_executor_runs_off_event_loop():
+    executor = InferenceExecutor(mode="thread", max_workers=2, max_queue=0)
+
+    async def main():
+        loop_thread = threading.get_ident()
+        worker_thread = await executor.run(threading.get_ident)
+        return loop_thread, worker_thread
+
+    loop_thread, worker_thread = asyncio.run(main())
+    executor.shutdown()
+    assert loop_thread != worker_thread
+    assert executor.pending == 0
+
+
+def test_executor_rejects_when_queue_is_full():
+    executor = InferenceExecutor(mode="thread", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.ensure_future(executor.run(release.wait))
+        queued = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        assert executor.pending == 2
+        assert executor.queue_depth == 1
+        with pytest.raises(InferenceQueueFullError):
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(main())
+    executor.shutdown()
+    assert executor.pending == 0
+
+
+def test_process_executor_calls_registered_service_in_worker():
+    executor = InferenceExecutor(mode="process", max_workers=1, max_queue=4)
+    service = _PidService()
+    executor.register("pid_service", service)
+
+    async def main():
+        return await executor.run(service.worker_pid, offset=0)
+
+    worker_pid = asyncio.run(main())
+    executor.shutdown()
+    assert worker_pid != os.getpid()
+
+
+def test_endpoint_returns_503_when_inference_queue_is_full(api_client, monkeypatch):
+    from app import main
+    saturated = InferenceExecutor(mode="thread", max_workers=1, max_queue=0)
+    monkeypatch.setattr(saturated, "_pending", 1)
+    monkeypatch.setattr(main, "inference_executor", saturated)
+
+    response = api_client.post("/ai/process_incoming_message", json={"ticket_id": 1, "message": "hello"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    # Health checks never touch the executor
+    assert api_client.get("/health").status_code == 200
@@ -0,0 +1,147 @@
+import io
+import json
+
+import pytest
+
+from app.utils.kb_index import KnowledgeBaseIndex
+from app.utils.kb_store import KnowledgeBaseLog, iter_json_array
+from conftest import KNOWLEDGE_BASE_DATA
+
+ENTRIES = [
+    {"id": "a", "question": "How do I reset my password?", "answer": "reset", "keywords": ["reset", "password"], "intent_keyword": "password_reset"},
+    {"id": "b", "question": "What is the status of my order?", "answer": "order", "keywords": ["order", "status"], "intent_keyword": "order_status"},
+    {"id": "c", "question": "How can I track my order shipment?", "answer": "tracking", "keywords": ["tracking", "order"], "intent_keyword": "order_status"},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_iter_json_array_matches_json_load(chunk_size):
+    data = [{"question": "Ünïcode [x]", "n": 12345, "nested": {"list": [1, 2.5, None]}}, 123456789, "text, with ] and ,", []]
+    assert list(iter_json_array(io.StringIO(json.dumps(data, indent=1)), chunk_size)) == data
+    assert list(iter_json_array(io.StringIO(" [ ] "), chunk_size)) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('{"not": "an array"}'), chunk_size))
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO('[{"a": 1}, {"b": '), chunk_size))
+
+
+def test_with_changes_matches_a_rebuilt_index():
+    index = KnowledgeBaseIndex(ENTRIES)
+    edited = {"id": "b", "question": "Where is my refund?", "answer": "refund", "keywords": ["refund"], "intent_keyword": "billing"}
+    added = {"id": "d", "question": "What are your opening hours?", "answer": "hours", "keywords": ["hours"]}
+    changed = index.with_changes([edited, added], ["a"])
+    rebuilt = KnowledgeBaseIndex([edited, ENTRIES[2], added])
+
+    assert len(changed) == 3 and changed.live() == rebuilt.live()
+    for query in ("order tracking", "refund", "opening hours", "reset password"):
+        assert [changed.entries[i]["id"] for i, _ in changed.search(query, 3)] == [rebuilt.entries[i]["id"] for i, _ in rebuilt.search(query, 3)]
+        assert [score for _, score in changed.search(query, 3)] == pytest.approx([score for _, score in rebuilt.search(query, 3)])
+    # The order_status intent falls to the next entry, password_reset is gone
+    assert changed.entries[changed.lookup_intent("order_status")]["id"] == "c"
+    assert changed.lookup_intent("password_reset") is None
+    assert changed.entries[changed.lookup_intent("billing")]["id"] == "b"
+    # Exact question matches follow the edits too
+    assert changed.entries[changed.lookup_question("where is my REFUND")]["id"] == "b"
+    assert changed.lookup_question("What is the status of my order?") is None
+    assert changed.lookup_question("How do I reset my password?") is None
+    # The original index is untouched
+    assert [entry["id"] for entry in index.live()] == ["a", "b", "c"]
+    assert index.search("reset password", 1)[0][0] == 0
+    assert index.search("refund", 1) == []
+    assert index.lookup_question("how do i reset my password") == 0
+
+
+def test_log_ignores_torn_records_and_other_versions(tmp_path):
+    log = KnowledgeBaseLog(str(tmp_path / "kb.json.log"))
+    assert log.read("v1") == []
+    log.append([{"op": "delete", "id": "a"}])
+    with open(log.path, "a", encoding="utf-8") as f:
+        f.write('{"op": "upsert", "entry": {"id"') # Crash during an append
+
+    assert KnowledgeBaseLog(log.path).read("v1") == [{"op": "delete", "id": "a"}]
+    assert KnowledgeBaseLog(log.path).read("v2") == []
+    assert len(list(tmp_path.glob("kb.json.log.stale-*"))) == 1
+
+
+def test_edits_survive_restart_and_compaction(ai_services, monkeypatch):
+    from app.services.knowledge_base_service import KnowledgeBaseService
+
+    kb = ai_services.knowledge_base
+    base_version = kb.kb_version
+    created = kb.create_entry({"question": "What are your opening hours?", "answer": "9 to 5.", "keywords": ["hours", "opening"]})
+    kb.update_entry("1", {**KNOWLEDGE_BASE_DATA[1], "answer": "Send us your order number."})
+    assert kb.delete_entry("0") and not kb.delete_entry("0")
+    assert kb.kb_version == f"{base_version}+3"
+    assert kb.search_knowledge_base("when are you open, opening hours?") == "9 to 5."
+    assert kb.search_knowledge_base("anything", "order_status") == "Send us your order number."
+    assert kb.search_knowledge_base("forgot my password") is None
+
+    restarted = KnowledgeBaseService()
+    assert restarted.knowledge_base_data == kb.knowledge_base_data
+    assert restarted.kb_version == kb.kb_version
+
+    assert kb.compact()
+    assert kb.kb_version != base_version and "+" not in kb.kb_version
+    with open(kb.kb_path, encoding="utf-8") as f:
+        assert [entry["id"] for entry in json.load(f)] == ["1", created["id"]]
+    assert not kb.reload_knowledge_base() # Its own rewrite is not a new file version
+    restarted = KnowledgeBaseService()
+    assert restarted.knowledge_base_data == kb.knowledge_base_data
+    assert restarted.kb_version == kb.kb_version
+
+    # The log is compacted automatically once it reaches the threshold
+    monkeypatch.setenv("KB_LOG_COMPACT_THRESHOLD", "2")
+    kb = KnowledgeBaseService()
+    kb.create_entry({"question": "Q1", "answer": "A1"})
+    kb.create_entry({"question": "Q2", "answer": "A2"})
+    compaction = kb._compaction # None once the background compaction has finished
+    if compaction is not None:
+        compaction.join()
+    assert kb._log.records == 0 and len(KnowledgeBaseService().knowledge_base_data) == 4
+
+
+
+def test_workers_sharing_the_files_keep_each_others_edits(tmp_path):
+    from app.services.knowledge_base_service import KnowledgeBaseService
+
+    kb_path = tmp_path / "knowledge_base.json"
+    kb_path.write_text(json.dumps(ENTRIES), encoding="utf-8")
+    first, second = KnowledgeBaseService(kb_path=str(kb_path)), KnowledgeBaseService(kb_path=str(kb_path))
+
+    first.create_entry({"id": "d", "question": "What are your opening hours?", "answer": "hours"})
+    second.delete_entry("a") # Applies the logged edit of the first worker before its own
+    assert second.get_entry("d") is not None
+    assert first.get_entry("a") is not None # Until it reloads
+    assert first.reload_knowledge_base() and first.get_entry("a") is None
+    assert not first.reload_knowledge_base()
+    assert first.kb_version == second.kb_version
+
+    second.update_entry("b", {"question": "Where is my refund?", "answer": "refund"})
+    assert first.compact() # Includes the update of the second worker
+    second.create_entry({"id": "e", "question": "Do you ship abroad?", "answer": "yes"}) # Reads the compacted file first
+    assert first.reload_knowledge_base()
+    assert first.kb_version == second.kb_version
+    expected = [("b", "refund"), ("c", "tracking"), ("d", "hours"), ("e", "yes")]
+    for kb in (first, second, KnowledgeBaseService(kb_path=str(kb_path))):
+        assert [(entry["id"], entry["answer"]) for entry in kb.knowledge_base_data] == expected
+
+
+def test_entry_endpoints(api_client):
+    response = api_client.post("/admin/knowledge_base/entries", json={"question": "Do you ship abroad?", "answer": "Yes, worldwide.", "keywords": ["ship", "abroad"]})
+    assert response.status_code == 201
+    entry_id = response.json()["id"]
+    assert api_client.post("/admin/knowledge_base/entries", json={"id": entry_id, "question": "Q", "answer": "A"}).status_code == 409
+
+    response = api_client.post("/ai/knowledge_base/search", json={"query": "can you ship abroad"})
+    assert response.json()["answer"] == "Yes, worldwide."
+    assert response.json()["candidates"][0]["id"] == entry_id
+
+    response = api_client.put(f"/admin/knowledge_base/entries/{entry_id}", json={"question": "Do you ship abroad?", "answer": "Only within the EU.", "keywords": ["ship"]})
+    assert response.status_code == 200
+    assert api_client.get(f"/admin/knowledge_base/entries/{entry_id}").json()["answer"] == "Only within the EU."
+    assert api_client.get("/admin/knowledge_base/entries", params={"offset": 2}).json() == {"total": 3, "entries": [response.json()]}
+
+    assert api_client.delete(f"/admin/knowledge_base/entries/{entry_id}").status_code == 200
+    assert api_client.get(f"/admin/knowledge_base/entries/{entry_id}").status_code == 404
+    assert api_client.put("/admin/knowledge_base/entries/missing", json={"question": "Q", "answer": "A"}).status_code == 404
+    assert api_client.post("/admin/knowledge_base/compact").json()["compacted"] is True
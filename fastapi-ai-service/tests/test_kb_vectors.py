@@ -0,0 +1,85 @@
+import numpy as np
+
+from app.utils.kb_vectors import SemanticIndex, entry_text
+from benchmarks.synthetic import make_knowledge_base
+from conftest import KNOWLEDGE_BASE_DATA
+
+ENTRIES = [
+    {"question": "How do I reset my password?", "answer": "Use the forgot password link on the login page.", "keywords": ["reset", "password", "forgot"]},
+    {"question": "What is the status of my order?", "answer": "Track the shipment with the tracking number from your confirmation email.", "keywords": ["order", "status", "tracking"]},
+    {"question": "What are your business hours?", "answer": "Our support team is available Monday to Friday, 9am to 6pm.", "keywords": ["hours", "open"]},
+    {"question": "How do I get a refund?", "answer": "Refunds are paid back to the original payment method within 5 days.", "keywords": ["refund", "money", "payment"]},
+]
+
+
+def test_batch_search_matches_single_queries():
+    index = SemanticIndex.build(ENTRIES, dim=16)
+    queries = ["password reset", "where is my shipment", "when is support available", "refund my payment"]
+    batch = index.search_batch(queries, top_k=2)
+    assert batch == [index.search_batch([query], top_k=2)[0] for query in queries]
+    assert [results[0][0] for results in batch] == [0, 1, 2, 3]
+    assert all(0 < score <= 1.0001 for results in batch for _, score in results)
+    assert index.embeddings.dtype == np.float32 and index.embeddings.flags["C_CONTIGUOUS"]
+
+
+def test_update_embeds_only_changed_entries():
+    index = SemanticIndex.build(ENTRIES, dim=16)
+    added = {"question": "Can I track my refund?", "answer": "Refund status is shown on the order tracking page.", "keywords": ["refund", "tracking"]}
+    updated = index.update(ENTRIES[1:] + [added], refit_fraction=0.5)
+    assert updated.space is index.space
+    np.testing.assert_array_equal(updated.embeddings[:3], index.embeddings[1:])
+    np.testing.assert_allclose(updated.embeddings[3], index.space.embed([entry_text(added)])[0])
+
+    # Replacing most of the knowledge base refits the embedding space
+    rebuilt = updated.update([added] + make_knowledge_base(10), refit_fraction=0.5)
+    assert rebuilt.space is not index.space
+
+
+def test_ivf_search_finds_the_exact_best_match():
+    entries = make_knowledge_base(2000)
+    exact = SemanticIndex.build(entries, dim=32)
+    approximate = SemanticIndex.build(entries, dim=32, ivf_min_entries=1000, nprobe=8)
+    assert approximate.ivf is not None
+    queries = [entry["question"] for entry in entries[:200]]
+    best_scores = [results[0][1] for results in exact.search_batch(queries)]
+    found_scores = [results[0][1] if results else 0.0 for results in approximate.search_batch(queries)]
+    recall = np.mean(np.isclose(found_scores, best_scores, atol=1e-5))
+    assert recall >= 0.9
+
+
+def test_cache_dir_memory_maps_and_reuses_embeddings(tmp_path):
+    index = SemanticIndex.build(ENTRIES, dim=16, cache_dir=str(tmp_path))
+    assert isinstance(index.embeddings, np.memmap)
+    reloaded = SemanticIndex.build(ENTRIES, dim=16, cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(reloaded.embeddings, index.embeddings)
+    assert len(list(tmp_path.iterdir())) == 2 # embeddings and embedding space of the current version only
+
+
+def test_hybrid_retrieval_falls_back_to_semantic_matches(ai_services, monkeypatch):
+    from app.services.knowledge_base_service import KnowledgeBaseService
+
+    monkeypatch.setenv("KB_RETRIEVAL_MODE", "hybrid")
+    kb = KnowledgeBaseService()
+    # No keyword overlap with the questions or keywords, only with an answer
+    entry, matched_by, candidates = kb.search_top_k("where is the login page", top_k=2)
+    assert matched_by == "semantic"
+    assert entry["answer"] == KNOWLEDGE_BASE_DATA[0]["answer"]
+    assert candidates[0][1] >= kb.semantic_min_score
+    assert kb.search_batch(["forgot password", "where is the login page", "hello"], [None, None, "order_status"]) == [
+        KNOWLEDGE_BASE_DATA[0]["answer"], KNOWLEDGE_BASE_DATA[0]["answer"], KNOWLEDGE_BASE_DATA[1]["answer"]
+    ]
+
+    # Keyword retrieval, the default, does not match the answer text
+    monkeypatch.setenv("KB_RETRIEVAL_MODE", "keyword")
+    assert KnowledgeBaseService().search_knowledge_base("where is the login page") is None
+
+
+def test_with_changes_embeds_edited_rows_only():
+    index = SemanticIndex.build(ENTRIES, dim=16)
+    added = {"question": "Can I pay the refund into a new account?", "answer": "Refunds go to the original payment method.", "keywords": ["refund"]}
+    changed = index.with_changes({1: None, 4: added}, [ENTRIES[0], None, ENTRIES[2], ENTRIES[3], added], refit_fraction=0.5)
+    assert changed.space is index.space
+    np.testing.assert_array_equal(changed.embeddings[[0, 2, 3]], index.embeddings[[0, 2, 3]])
+    assert not changed.embeddings[1].any()
+    assert all(doc_id != 1 for doc_id, _ in changed.search_batch(["status of my order tracking"], top_k=5)[0])
+    np.testing.assert_array_equal(index.embeddings[1], SemanticIndex.build(ENTRIES, dim=16).embeddings[1]) # Unchanged
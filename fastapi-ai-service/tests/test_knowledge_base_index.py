@@ -0,0 +1,50 @@
+from app.utils.kb_index import KnowledgeBaseIndex, tokenize
+
+ENTRIES = [
+    {"question": "How do I reset my password?", "answer": "reset", "keywords": ["reset", "password", "forgot"], "intent_keyword": "password_reset"},
+    {"question": "What is the status of my order?", "answer": "order", "keywords": ["order", "status", "tracking"], "intent_keyword": "order_status"},
+    {"question": "How can I track my order shipment?", "answer": "tracking", "keywords": ["tracking", "shipment", "order"], "intent_keyword": "order_status"},
+    {"question": "What are your business hours?", "answer": "hours", "keywords": ["hours", "open"], "intent_keyword": "business_hours"},
+]
+
+
+def test_tokenize_drops_stop_words_and_short_tokens():
+    assert tokenize("How do I reset my Password?") == ["reset", "password"]
+
+
+def test_search_ranks_best_match_first():
+    index = KnowledgeBaseIndex(ENTRIES)
+    results = index.search("where is the tracking for my order shipment", top_k=3)
+    assert [doc_id for doc_id, _ in results] == [2, 1]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_search_without_overlap_returns_nothing():
+    index = KnowledgeBaseIndex(ENTRIES)
+    assert index.search("I have a very unique problem that needs expert help", top_k=5) == []
+
+
+def test_intent_map_keeps_first_entry_per_intent():
+    index = KnowledgeBaseIndex(ENTRIES)
+    assert index.lookup_intent("ORDER_STATUS") == 1
+    assert index.lookup_intent("unknown_intent") is None
+
+
+def test_service_prefers_intent_then_keywords(ai_services):
+    kb = ai_services.knowledge_base
+    assert kb.search_knowledge_base("anything at all", "order_status") == "Please provide your order number to check status."
+    assert kb.search_knowledge_base("I forgot my password, how to reset it?") == "You can reset your password on the login page."
+    assert kb.search_knowledge_base("completely unrelated text") is None
+
+
+def test_search_endpoint_returns_ranked_candidates(api_client):
+    response = api_client.post("/ai/knowledge_base/search", json={"query": "forgot password for my order", "top_k": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["matched_by"] == "keyword"
+    assert data["answer"] == "You can reset your password on the login page."
+    assert len(data["candidates"]) == 2
+    assert data["candidates"][0]["score"] >= data["candidates"][1]["score"]
+
+    response = api_client.post("/ai/knowledge_base/search", json={"query": "hello", "intent": "order_status"})
+    assert response.json()["matched_by"] == "intent"
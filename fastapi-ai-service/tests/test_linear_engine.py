@@ -0,0 +1,55 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+
+from app.utils.featurizer import MessageFeatures, decision_scores
+from app.utils.linear_engine import CompiledLinearModel, compile_pipeline
+from conftest import CHATBOT_TRAINING_DATA, SENTIMENT_TRAINING_DATA, train_pipeline
+
+MESSAGES = [
+    "I forgot my password!!", "where is my order? This is terrible", "hello", "zzz unseen words", "",
+    "order order order status status", "i love this great service, thank you " * 5,
+]
+
+
+def test_scores_are_identical_to_the_sklearn_pipeline():
+    binary_data = [sample for sample in SENTIMENT_TRAINING_DATA if sample[1] != "neutral"]
+    for data in (CHATBOT_TRAINING_DATA, SENTIMENT_TRAINING_DATA, binary_data):
+        pipeline = train_pipeline(data)
+        scores = CompiledLinearModel(pipeline).decision_function(MESSAGES)
+        expected = pipeline.decision_function(MESSAGES)
+        assert scores.shape == expected.shape
+        assert np.array_equal(scores, expected)
+
+
+def test_vectorizer_options_are_honoured():
+    texts, labels = zip(*CHATBOT_TRAINING_DATA)
+    for params in ({"sublinear_tf": True}, {"binary": True, "norm": "l1"}, {"ngram_range": (1, 2), "use_idf": False}, {"norm": None}):
+        pipeline = Pipeline([('tfidf', TfidfVectorizer(**params)), ('clf', LinearSVC())]).fit(texts, labels)
+        assert np.array_equal(CompiledLinearModel(pipeline).decision_function(MESSAGES), pipeline.decision_function(MESSAGES))
+
+
+def test_shared_features_feed_the_engine():
+    pipeline = train_pipeline(CHATBOT_TRAINING_DATA)
+    engine = CompiledLinearModel(pipeline)
+    features = MessageFeatures(MESSAGES)
+    assert np.array_equal(decision_scores(pipeline, MESSAGES, features, engine), pipeline.decision_function(MESSAGES))
+
+
+def test_unsupported_pipelines_fall_back_to_sklearn():
+    assert compile_pipeline(object()) is None
+
+
+def test_services_switch_engine_with_flag(ai_services, monkeypatch):
+    from app.services.chatbot_service import ChatbotService
+    from app.services.sentiment_service import SentimentService
+
+    assert ai_services.chatbot.inference_engine == "sklearn"
+    monkeypatch.setenv("COMPILED_INFERENCE", "true")
+    chatbot, sentiment = ChatbotService(), SentimentService()
+    assert chatbot.inference_engine == sentiment.inference_engine == "compiled"
+
+    features = MessageFeatures(MESSAGES)
+    assert chatbot.predict_intents(MESSAGES, features) == ai_services.chatbot.predict_intents(MESSAGES)
+    assert sentiment.analyze_sentiments(MESSAGES, features) == ai_services.sentiment.analyze_sentiments(MESSAGES)
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import logging
+import queue
+
+from app.utils import log_config
+from app.utils.inference_executor import InferenceExecutor
+from app.utils.log_config import (
+    LOG_RECORDS_DROPPED, JsonFormatter, RequestLogContextMiddleware, RequestSamplingFilter, _NonBlockingQueueHandler, body
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.addFilter(RequestSamplingFilter())
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def run_request(sample_rate, headers=()):
+    logger = logging.getLogger("tests.log_config")
+    logger.setLevel(logging.INFO)
+    handler = ListHandler()
+    logger.addHandler(handler)
+
+    async def app(scope, receive, send):
+        logger.info("handled %s", body("a customer message"))
+        logger.error("failed")
+
+    try:
+        asyncio.run(RequestLogContextMiddleware(app, sample_rate=sample_rate)({"type": "http", "headers": list(headers)}, None, None))
+    finally:
+        logger.removeHandler(handler)
+    return handler.records
+
+
+def test_unsampled_requests_keep_only_errors():
+    dropped = LOG_RECORDS_DROPPED.value(reason="sampled")
+    assert [record.levelname for record in run_request(0.0)] == ["ERROR"]
+    assert LOG_RECORDS_DROPPED.value(reason="sampled") > dropped
+
+    records = run_request(1.0, headers=[(b"x-request-id", b"abc123")])
+    assert [record.levelname for record in records] == ["INFO", "ERROR"]
+    assert {record.request_id for record in records} == {"abc123"}
+    entry = json.loads(JsonFormatter().format(records[0]))
+    assert entry["request_id"] == "abc123" and entry["message"] == "handled 'a customer message'"
+
+
+def test_bodies_are_truncated_or_hashed(monkeypatch):
+    text = "my order number is 12345 and it has not arrived"
+    monkeypatch.setattr(log_config, "_body_max_chars", 8)
+    assert str(body(text)) == "'my order'...(+39 chars)"
+    monkeypatch.setattr(log_config, "_body_mode", "hash")
+    hashed = str(body(text))
+    assert hashed.startswith("<sha256:") and "12345" not in hashed and hashed == str(body(text))
+    monkeypatch.setattr(log_config, "_body_mode", "full")
+    assert str(body(text)) == repr(text)
+
+
+def test_queue_handler_defers_formatting_and_never_blocks():
+    handler = _NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    dropped = LOG_RECORDS_DROPPED.value(reason="queue_full")
+    message = body("hello")
+    for _ in range(2):
+        handler.handle(logging.LogRecord("x", logging.INFO, __file__, 1, "text %s", (message,), None))
+    record = handler.queue.get_nowait()
+    assert record.msg == "text %s" and record.args == (message,) # Not formatted by the caller
+    assert LOG_RECORDS_DROPPED.value(reason="queue_full") == dropped + 1
+
+
+def test_executor_threads_see_the_request_context():
+    executor = InferenceExecutor(mode="thread", max_workers=1)
+
+    async def sampled_in_worker(sample_rate):
+        result = {}
+
+        async def app(scope, receive, send):
+            result["sampled"] = await executor.run(log_config._request_sampled.get)
+
+        await RequestLogContextMiddleware(app, sample_rate=sample_rate)({"type": "http", "headers": []}, None, None)
+        return result["sampled"]
+
+    try:
+        assert asyncio.run(sampled_in_worker(0.0)) is False
+        assert asyncio.run(sampled_in_worker(1.0)) is True
+    finally:
+        executor.shutdown()
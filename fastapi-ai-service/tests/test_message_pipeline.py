@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from conftest import KNOWLEDGE_BASE_DATA
+
+
+def stages_of(result):
+    return {timing["stage"]: timing for timing in result["stages"]}
+
+
+def test_sentiment_and_intent_share_one_classification(ai_services, api_client, monkeypatch):
+    classify = ai_services.analysis.classify
+    calls = []
+
+    def slow_classify(messages, include_sentiment=True, include_intent=True):
+        calls.append((list(messages), include_sentiment, include_intent))
+        time.sleep(0.2)
+        return classify(messages, include_sentiment, include_intent)
+
+    monkeypatch.setattr(ai_services.analysis, "classify", slow_classify)
+    response = api_client.post("/ai/process_incoming_message", json={"ticket_id": 1, "message": "my order has not arrived yet"})
+    assert response.status_code == 200
+    result = response.json()
+    stages = stages_of(result)
+    assert set(stages) == {"knowledge_base_exact", "sentiment", "intent", "knowledge_base", "dispatch"}
+    assert list(stages)[-2:] == ["knowledge_base", "dispatch"]
+    assert result["skipped_stages"] == ["reply"] # The knowledge base answered
+    assert result["ai_reply"] == KNOWLEDGE_BASE_DATA[1]["answer"]
+    sentiment, intent = stages["sentiment"], stages["intent"]
+    assert sentiment["duration_ms"] >= 200 and intent["duration_ms"] >= 200
+    # Both stages wait on the same classification instead of running one after another
+    assert calls == [(["my order has not arrived yet"], True, True)]
+    assert sentiment["started_ms"] < intent["started_ms"] + intent["duration_ms"]
+    assert intent["started_ms"] < sentiment["started_ms"] + sentiment["duration_ms"]
+    assert stages["knowledge_base"]["started_ms"] >= intent["started_ms"] + intent["duration_ms"]
+    assert result["suggested_priority"] is not None
+
+
+def test_exact_question_hit_skips_search_and_reply(ai_services, api_client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("the knowledge base search should be skipped")
+
+    monkeypatch.setattr(ai_services.knowledge_base, "search_batch", fail)
+    response = api_client.post("/ai/process_incoming_message", json={"ticket_id": 2, "message": "what is my ORDER status"})
+    assert response.status_code == 200
+    result = response.json()
+    assert result["knowledge_base_answer"] == result["ai_reply"] == KNOWLEDGE_BASE_DATA[1]["answer"]
+    assert sorted(result["skipped_stages"]) == ["knowledge_base", "reply"]
+    assert {"sentiment", "intent", "dispatch"} <= set(stages_of(result))
+
+
+def test_exact_question_match_wins_over_the_intent_entry(ai_services):
+    entry, matched_by, _ = ai_services.knowledge_base.search_top_k("How to reset password", intent="order_status")
+    assert matched_by == "exact" and entry["answer"] == KNOWLEDGE_BASE_DATA[0]["answer"]
+    assert ai_services.knowledge_base.search_knowledge_base("reset password", "order_status") == KNOWLEDGE_BASE_DATA[1]["answer"]
+
+
+def test_unknown_intent_skips_the_reply_stage(ai_services, api_client, monkeypatch):
+    monkeypatch.setattr(ai_services.knowledge_base, "search_batch", lambda queries, intents=None: [None] * len(queries))
+    monkeypatch.setattr(ai_services.chatbot, "predict_intents", lambda messages, *args: [("unknown", 0.1)] * len(messages))
+    response = api_client.post("/ai/process_incoming_message", json={"ticket_id": 3, "message": "blah blah"})
+    assert response.status_code == 200
+    result = response.json()
+    assert result["intent"] == "unknown" and result["ai_reply"] is None
+    assert result["skipped_stages"] == ["reply"]
+    assert "knowledge_base" in stages_of(result)
+
+
+@pytest.mark.parametrize("failing", ["sentiment", "intent"])
+def test_stage_errors_fail_the_request(ai_services, api_client, monkeypatch, failing):
+    service = ai_services.sentiment if failing == "sentiment" else ai_services.chatbot
+    method = "analyze_sentiments" if failing == "sentiment" else "predict_intents"
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("model failure")
+
+    monkeypatch.setattr(service, method, broken)
+    response = api_client.post("/ai/process_incoming_message", json={"ticket_id": 4, "message": "where is my parcel"})
+    assert response.status_code == 500
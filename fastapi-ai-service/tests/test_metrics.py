@@ -0,0 +1,58 @@
+from app.utils.metrics import MODEL_FALLBACKS, REQUEST_DURATION, STAGE_DURATION, MetricsRegistry
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Jobs seen.", ("kind",))
+    histogram = registry.histogram("job_seconds", "Job latency.", buckets=(0.1, 1.0))
+    registry.gauge_callback("queue_depth", "Queued jobs.", lambda: [((), 3)])
+    counter.inc(kind='a"b')
+    counter.inc(2, kind="c")
+    for value in (0.05, 0.1, 0.5, 7):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{kind="a\\"b"} 1' in lines
+    assert 'jobs_total{kind="c"} 2' in lines
+    # Buckets are cumulative and upper-inclusive
+    assert 'job_seconds_bucket{le="0.1"} 2' in lines
+    assert 'job_seconds_bucket{le="1"} 3' in lines
+    assert 'job_seconds_bucket{le="+Inf"} 4' in lines
+    assert "job_seconds_sum 7.65" in lines
+    assert "job_seconds_count 4" in lines
+    assert "queue_depth 3" in lines
+
+
+def test_stages_endpoints_and_cache_are_exposed(api_client):
+    stage_counts = {stage: STAGE_DURATION.count(stage=stage) for stage in ("sentiment", "intent", "knowledge_base", "dispatch")}
+    route = "/ai/process_incoming_message"
+    requests_before = REQUEST_DURATION.count(method="POST", route=route, status="200")
+
+    for _ in range(2):
+        response = api_client.post(route, json={"ticket_id": 1, "message": "how do i reset my password"})
+        assert response.status_code == 200
+
+    # Classification ran once; the repeated message was served from the cache
+    assert STAGE_DURATION.count(stage="sentiment") == stage_counts["sentiment"] + 1
+    assert STAGE_DURATION.count(stage="intent") == stage_counts["intent"] + 1
+    assert STAGE_DURATION.count(stage="knowledge_base") == stage_counts["knowledge_base"] + 2
+    assert STAGE_DURATION.count(stage="dispatch") == stage_counts["dispatch"] + 2
+    assert REQUEST_DURATION.count(method="POST", route=route, status="200") == requests_before + 2
+
+    response = api_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'ai_result_cache_hits_total{namespace="intent"} 1' in body
+    assert 'ai_result_cache_hit_ratio{namespace="sentiment"} 0.5' in body
+    assert "ai_inference_executor_queue_depth 0" in body
+    assert 'ai_http_request_duration_seconds_count{method="POST",route="/ai/process_incoming_message",status="200"}' in body
+
+
+def test_fallbacks_are_counted(ai_services, api_client):
+    before = MODEL_FALLBACKS.value(component="sentiment", reason="not_loaded")
+    ai_services.sentiment._model = None
+    response = api_client.post("/ai/process_incoming_message", json={"ticket_id": 1, "message": "hello there"})
+    assert response.json()["sentiment"] == "neutral"
+    assert MODEL_FALLBACKS.value(component="sentiment", reason="not_loaded") == before + 1
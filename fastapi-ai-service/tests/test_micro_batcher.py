@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from app.utils.micro_batcher import MICROBATCH_QUEUE_DELAY, MICROBATCH_SIZE, MicroBatcher
+
+
+def make_batcher(batches, delay=0.02, **kwargs):
+    async def process(items):
+        batches.append(list(items))
+        await asyncio.sleep(delay)
+        return [ValueError(item) if item == "bad" else item.upper() for item in items]
+    return MicroBatcher("test", process, **kwargs)
+
+
+def test_concurrent_requests_share_batches_and_get_their_own_results():
+    batches = []
+    batcher = make_batcher(batches, max_batch_size=4, max_wait_seconds=0.05, max_concurrency=1)
+
+    async def scenario():
+        items = [f"m{i}" for i in range(10)]
+        results = await asyncio.gather(*(batcher.submit(item) for item in items))
+        await batcher.shutdown()
+        return items, results
+
+    items, results = asyncio.run(scenario())
+    assert results == [item.upper() for item in items]
+    assert sorted(item for batch in batches for item in batch) == sorted(items)
+    assert len(batches) < len(items) and all(len(batch) <= 4 for batch in batches)
+
+
+def test_lone_request_is_dispatched_without_waiting():
+    batches = []
+    batcher = make_batcher(batches, delay=0, max_wait_seconds=5, max_concurrency=1)
+
+    async def scenario():
+        result = await asyncio.wait_for(batcher.submit("hello"), timeout=1)
+        await batcher.shutdown()
+        return result
+
+    assert asyncio.run(scenario()) == "HELLO"
+    assert batches == [["hello"]]
+
+
+def test_item_errors_only_fail_their_caller():
+    batches = []
+    batcher = make_batcher(batches, max_wait_seconds=0.05, max_concurrency=1)
+
+    async def scenario():
+        results = await asyncio.gather(batcher.submit("ok"), batcher.submit("bad"), return_exceptions=True)
+        await batcher.shutdown()
+        return results
+
+    ok, bad = asyncio.run(scenario())
+    assert ok == "OK"
+    assert isinstance(bad, ValueError)
+
+
+def test_target_size_grows_with_load_and_metrics_are_recorded():
+    batches = []
+    batcher = make_batcher(batches, delay=0.02, max_batch_size=16, max_wait_seconds=0.05, max_concurrency=1)
+    batch_count = MICROBATCH_SIZE.count(operation="test")
+    delay_count = MICROBATCH_QUEUE_DELAY.count(operation="test")
+
+    async def scenario():
+        async def client(i):
+            for j in range(5):
+                await batcher.submit(f"{i}-{j}")
+        await asyncio.gather(*(client(i) for i in range(16)))
+        await batcher.shutdown()
+
+    asyncio.run(scenario())
+    assert batcher.target_size > 1
+    assert max(len(batch) for batch in batches) > 1
+    assert MICROBATCH_SIZE.count(operation="test") == batch_count + len(batches)
+    assert MICROBATCH_QUEUE_DELAY.count(operation="test") == delay_count + 80
+
+
+def test_disabled_batcher_processes_each_request_alone():
+    batches = []
+    batcher = make_batcher(batches, delay=0, enabled=False)
+
+    async def scenario():
+        return await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+
+    assert asyncio.run(scenario()) == ["A", "B"]
+    assert batches == [["a"], ["b"]]
+    with pytest.raises(ValueError):
+        asyncio.run(batcher.submit("bad"))
@@ -0,0 +1,67 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+
+from app.utils.featurizer import MessageFeatures, decision_scores
+from app.utils.model_artifacts import MappedTextPipeline, export_mapped_artifact
+from app.utils.model_loader import file_version, load_model_from_path
+from conftest import CHATBOT_TRAINING_DATA, SENTIMENT_TRAINING_DATA, train_pipeline
+
+MESSAGES = ["I forgot my password!!", "where is my order? This is terrible", "hello", "", "zzz unseen words"]
+
+
+def test_mapped_artifact_matches_pipeline_scores(tmp_path):
+    pipeline = train_pipeline(CHATBOT_TRAINING_DATA)
+    export_mapped_artifact(pipeline, str(tmp_path / "chatbot"))
+    mapped = load_model_from_path(str(tmp_path / "chatbot"))
+
+    assert isinstance(mapped, MappedTextPipeline)
+    assert isinstance(mapped.named_steps.clf.coef_, np.memmap)
+    assert list(mapped.named_steps.clf.classes_) == list(pipeline.named_steps.clf.classes_)
+    assert np.array_equal(mapped.decision_function(MESSAGES), pipeline.decision_function(MESSAGES))
+    assert list(mapped.predict(MESSAGES)) == list(pipeline.predict(MESSAGES))
+
+
+def test_binary_and_ngram_models_round_trip(tmp_path):
+    texts = [text for text, _ in SENTIMENT_TRAINING_DATA]
+    labels = ["positive" if label == "positive" else "other" for _, label in SENTIMENT_TRAINING_DATA]
+    pipeline = Pipeline([
+        ('tfidf', TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, stop_words="english")),
+        ('clf', LinearSVC())
+    ]).fit(texts, labels)
+    export_mapped_artifact(pipeline, str(tmp_path / "binary"))
+    mapped = MappedTextPipeline(str(tmp_path / "binary"))
+    assert mapped.decision_function(MESSAGES).shape == (len(MESSAGES),)
+    assert np.array_equal(mapped.decision_function(MESSAGES), pipeline.decision_function(MESSAGES))
+
+
+def test_shared_features_work_with_mapped_artifacts(tmp_path):
+    pipeline = train_pipeline(CHATBOT_TRAINING_DATA)
+    export_mapped_artifact(pipeline, str(tmp_path / "chatbot"))
+    mapped = MappedTextPipeline(str(tmp_path / "chatbot"))
+    features = MessageFeatures(MESSAGES)
+    assert np.array_equal(decision_scores(mapped, MESSAGES, features), pipeline.decision_function(MESSAGES))
+    # Same analyzer settings as the sklearn vectorizer, so the tokens are shared
+    decision_scores(pipeline, MESSAGES, features)
+    assert len(features._tokens) == 1
+
+
+def test_re_export_replaces_artifact_and_changes_version(tmp_path):
+    target = str(tmp_path / "chatbot")
+    first = export_mapped_artifact(train_pipeline(CHATBOT_TRAINING_DATA), target)
+    assert file_version(target) == first
+    relabelled = [(text, "x_" + label) for text, label in CHATBOT_TRAINING_DATA]
+    second = export_mapped_artifact(train_pipeline(relabelled), target)
+    assert second != first and file_version(target) == second
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["chatbot"]
+
+
+def test_services_serve_mapped_artifacts(ai_services, tmp_path):
+    chatbot = ai_services.chatbot
+    expected = chatbot.predict_intents(MESSAGES)
+    export_mapped_artifact(chatbot.pipeline, str(tmp_path / "chatbot_mapped"))
+    swapped, message = chatbot.reload_model(str(tmp_path / "chatbot_mapped"))
+    assert swapped, message
+    assert isinstance(chatbot.pipeline, MappedTextPipeline)
+    assert chatbot.predict_intents(MESSAGES) == expected
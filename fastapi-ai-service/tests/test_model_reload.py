@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import joblib
+
+from app.utils.model_watcher import ModelWatcher
+from conftest import CHATBOT_TRAINING_DATA, train_pipeline
+
+RELABELLED = [(text, "v2_" + label) for text, label in CHATBOT_TRAINING_DATA]
+
+
+def test_reload_swaps_validated_model_atomically(ai_services):
+    chatbot = ai_services.chatbot
+    old_snapshot = chatbot.current_model()
+
+    swapped, _ = chatbot.reload_model()
+    assert not swapped # same artifact, nothing to do
+
+    joblib.dump(train_pipeline(RELABELLED), chatbot.model_path)
+    swapped, message = chatbot.reload_model()
+    assert swapped, message
+    assert chatbot.model_version != old_snapshot.version
+    assert chatbot.predict_intent("hello there")[0] == "v2_greeting"
+    # A request that captured the old snapshot keeps using it until it finishes
+    assert chatbot.predict_intent("hello there", model=old_snapshot)[0] == "greeting"
+
+
+def test_reload_rejects_broken_artifact_and_keeps_serving(ai_services):
+    chatbot = ai_services.chatbot
+    version = chatbot.model_version
+    with open(chatbot.model_path, "wb") as f:
+        f.write(b"not a pickle")
+    swapped, message = chatbot.reload_model()
+    assert not swapped and "failed" in message
+    assert chatbot.model_version == version
+    assert chatbot.predict_intent("hello there")[0] == "greeting"
+
+
+def test_reload_rejects_model_failing_smoke_prediction(ai_services):
+    chatbot = ai_services.chatbot
+    version = chatbot.model_version
+    broken = train_pipeline(CHATBOT_TRAINING_DATA)
+    broken.named_steps.clf.coef_ = broken.named_steps.clf.coef_[:, :3] # wrong feature width
+    joblib.dump(broken, chatbot.model_path)
+    swapped, _ = chatbot.reload_model()
+    assert not swapped
+    assert chatbot.model_version == version
+
+
+def test_admin_reload_endpoint_and_response_versions(ai_services, api_client):
+    first = api_client.post("/ai/process_incoming_message", json={"ticket_id": 1, "message": "hello there"}).json()
+    assert first["intent_model_version"] == ai_services.chatbot.model_version
+    assert first["sentiment_model_version"] == ai_services.sentiment.model_version
+
+    joblib.dump(train_pipeline(RELABELLED), ai_services.chatbot.model_path)
+    result = api_client.post("/admin/models/reload").json()
+    assert result["chatbot"]["reloaded"] is True
+    assert result["sentiment"]["reloaded"] is False
+
+    second = api_client.post("/ai/chatbot", json={"message": "hello there"}).json()
+    assert second["intent"] == "v2_greeting"
+    assert second["intent_model_version"] == result["chatbot"]["version"] != first["intent_model_version"]
+    assert api_client.get("/admin/models").json()["chatbot"]["version"] == second["intent_model_version"]
+
+
+def test_knowledge_base_reload_keeps_old_data_on_invalid_file(ai_services):
+    kb = ai_services.knowledge_base
+    entries = len(kb.knowledge_base_data)
+    with open(kb.kb_path, "w", encoding="utf-8") as f:
+        f.write("{ invalid json")
+    assert kb.reload_knowledge_base() is False
+    assert len(kb.knowledge_base_data) == entries
+
+    with open(kb.kb_path, "w", encoding="utf-8") as f:
+        json.dump([{"question": "Q", "answer": "A", "intent_keyword": "greeting"}], f)
+    assert kb.reload_knowledge_base() is True
+    assert kb.search_knowledge_base("anything", "greeting") == "A"
+
+
+def test_watcher_triggers_on_changed_files(tmp_path):
+    artifact = tmp_path / "model.joblib"
+    artifact.write_bytes(b"v1")
+    changes = []
+
+    async def on_change(paths):
+        changes.append(paths)
+
+    async def main():
+        watcher = ModelWatcher(lambda: [str(artifact)], on_change, interval_seconds=60)
+        watcher.start()
+        assert await watcher.check() == []
+        artifact.write_bytes(b"version 2")
+        assert await watcher.check() == [str(artifact)]
+        await watcher.stop()
+
+    asyncio.run(main())
+    assert changes == [[str(artifact)]]
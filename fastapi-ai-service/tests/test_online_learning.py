@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.chatbot_service import ChatbotService
+from app.services.online_learning_service import (
+    OnlineLearningService, OnlineLearningUnavailableError, UnknownLabelError
+)
+from app.utils.training import fit_pipeline, publish_version, read_manifest
+from conftest import CHATBOT_TRAINING_DATA
+
+MESSAGE = "my parcel went to the wrong city"
+
+
+@pytest.fixture
+def online_chatbot(tmp_path, monkeypatch):
+    """A chatbot service serving an online pipeline from a registry in tmp_path."""
+    texts, labels = zip(*CHATBOT_TRAINING_DATA)
+    pipeline, summary = fit_pipeline(list(texts), list(labels), pipeline_kind="online")
+    assert summary["pipeline"] == "online"
+    publish_version(str(tmp_path / "registry"), "chatbot", pipeline, summary)
+    monkeypatch.setenv("MODEL_PATH_CHATBOT", str(tmp_path / "registry" / "chatbot" / "manifest.json"))
+    return ChatbotService()
+
+
+def test_corrections_update_serving_model_and_are_checkpointed(online_chatbot, tmp_path, monkeypatch):
+    monkeypatch.setenv("ONLINE_FEEDBACK_LOG_DIR", str(tmp_path / "feedback"))
+    updated = []
+
+    async def on_updated(name):
+        updated.append(name)
+
+    service = OnlineLearningService(
+        {"chatbot": online_chatbot}, registry_dir=str(tmp_path / "registry"), on_updated=on_updated, enabled=True
+    )
+    base_version = online_chatbot.model_version
+    previous_model = online_chatbot.current_model()
+    assert online_chatbot.predict_intent(MESSAGE)[0] != "order_status"
+
+    with pytest.raises(UnknownLabelError):
+        service.submit(MESSAGE, {"chatbot": "refund"})
+    for _ in range(20):
+        service.submit(MESSAGE, {"chatbot": "order_status"})
+    assert service.pending() == {"chatbot": 20}
+
+    asyncio.run(service.flush())
+    assert updated == ["chatbot"]
+    assert online_chatbot.predict_intent(MESSAGE)[0] == "order_status"
+    assert online_chatbot.model_version == f"{base_version}+online1"
+    # The previous snapshot was copied, not updated in place
+    assert previous_model.pipeline.predict([MESSAGE])[0] != "order_status"
+    status = service.status()[0]
+    assert (status.online, status.pending, status.samples_applied, status.updates) == (True, 0, 20, 1)
+    journal = (tmp_path / "feedback" / "chatbot.jsonl").read_text(encoding="utf-8").splitlines()
+    assert json.loads(journal[0]) == {"text": MESSAGE, "label": "order_status"}
+
+    asyncio.run(service.flush(checkpoint=True))
+    manifest = read_manifest(str(tmp_path / "registry" / "chatbot" / "manifest.json"))
+    assert manifest["training"]["samples_applied"] == 20
+    assert service.status()[0].checkpoint_version == manifest["version"]
+    # The checkpoint is now served, as it would be after a restart
+    assert "+online" not in online_chatbot.model_version
+    assert online_chatbot.predict_intent(MESSAGE)[0] == "order_status"
+    assert ChatbotService().predict_intent(MESSAGE)[0] == "order_status"
+
+
+
+def test_corrections_requeued_after_a_lost_swap_are_journaled_once(online_chatbot, tmp_path, monkeypatch):
+    monkeypatch.setenv("ONLINE_FEEDBACK_LOG_DIR", str(tmp_path / "feedback"))
+    service = OnlineLearningService({"chatbot": online_chatbot}, registry_dir=str(tmp_path / "registry"), enabled=True)
+    swap_model = online_chatbot.swap_model
+    swaps = []
+
+    def swap_after_a_reload(candidate, expected):
+        swaps.append(candidate.version)
+        return len(swaps) > 1 and swap_model(candidate, expected) # The first swap loses to a reload
+
+    monkeypatch.setattr(online_chatbot, "swap_model", swap_after_a_reload)
+    for _ in range(3):
+        service.submit(MESSAGE, {"chatbot": "order_status"})
+    asyncio.run(service.flush())
+    assert service.pending() == {"chatbot": 3} and not (tmp_path / "feedback" / "chatbot.jsonl").exists()
+    asyncio.run(service.flush())
+    assert service.pending() == {"chatbot": 0} and len(swaps) == 2
+    assert len((tmp_path / "feedback" / "chatbot.jsonl").read_text(encoding="utf-8").splitlines()) == 3
+
+
+def test_online_learning_stays_disabled_with_several_workers(online_chatbot, monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert not OnlineLearningService({"chatbot": online_chatbot}, enabled=True).enabled
+
+
+def test_background_task_applies_a_full_batch(online_chatbot, tmp_path, monkeypatch):
+    monkeypatch.setenv("ONLINE_BATCH_SIZE", "5")
+    monkeypatch.setenv("ONLINE_UPDATE_INTERVAL_SECONDS", "60")
+
+    async def main():
+        service = OnlineLearningService({"chatbot": online_chatbot}, registry_dir=str(tmp_path / "registry"), enabled=True)
+        service.start()
+        for _ in range(5):
+            service.submit(MESSAGE, {"chatbot": "order_status"})
+        for _ in range(100):
+            if service.status()[0].updates:
+                break
+            await asyncio.sleep(0.02)
+        updates = service.status()[0].updates
+        await service.stop()
+        return updates, service.status()[0]
+
+    updates, status = asyncio.run(main())
+    assert updates == 1 # Well before the update interval
+    assert status.checkpoint_version is not None # Checkpointed at shutdown
+
+
+def test_feedback_endpoint(api_client, ai_services, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main, "online_learning_service", OnlineLearningService(
+        {"chatbot": ai_services.chatbot, "sentiment": ai_services.sentiment}, enabled=False
+    ))
+    assert api_client.post("/ai/feedback", json={"message": "hi", "intent": "greeting"}).status_code == 503
+
+    main.online_learning_service.enabled = True
+    assert api_client.post("/ai/feedback", json={"message": "hi"}).status_code == 422
+    # The fixture serves TF-IDF models, which cannot be updated online
+    response = api_client.post("/ai/feedback", json={"message": "hi", "intent": "greeting"})
+    assert response.status_code == 409
+    with pytest.raises(OnlineLearningUnavailableError):
+        main.online_learning_service.submit("hi", {"sentiment": "positive"})
+
+    texts, labels = zip(*CHATBOT_TRAINING_DATA)
+    pipeline, _ = fit_pipeline(list(texts), list(labels), pipeline_kind="online")
+    ai_services.chatbot._model = ai_services.chatbot._model._replace(pipeline=pipeline, engine=None)
+    response = api_client.post("/ai/feedback", json={"message": MESSAGE, "intent": "order_status", "ticket_id": 7})
+    assert response.status_code == 202
+    assert response.json() == {"accepted": {"chatbot": "order_status"}, "pending": {"chatbot": 1, "sentiment": 0}}
+    assert api_client.post("/ai/feedback", json={"message": MESSAGE, "intent": "nope"}).status_code == 422
+
+    statuses = {status["model"]: status for status in api_client.get("/admin/models/online").json()}
+    assert statuses["chatbot"]["online"] and not statuses["sentiment"]["online"]
+    assert statuses["chatbot"]["pending"] == 1
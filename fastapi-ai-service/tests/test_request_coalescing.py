@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+from app.utils.single_flight import SingleFlight
+
+
+def test_single_flight_shares_one_computation():
+    calls = []
+
+    async def main():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def compute(value):
+            calls.append(value)
+            await release.wait()
+            return value
+
+        waiters = [asyncio.ensure_future(flights.run("op", "same", lambda i=i: compute(i))) for i in range(5)]
+        other = asyncio.ensure_future(flights.run("op", "other", lambda: compute("other")))
+        await asyncio.sleep(0)
+        waiters[0].cancel() # The caller that started the computation goes away
+        release.set()
+        results = await asyncio.gather(*waiters[1:], other)
+
+        async def fail():
+            raise ValueError("boom")
+
+        failures = await asyncio.gather(flights.run("op", "x", fail), flights.run("op", "x", fail), return_exceptions=True)
+        return results, failures, len(flights)
+
+    results, failures, in_flight = asyncio.run(main())
+    assert calls == [0, "other"]
+    assert results == [0, 0, 0, 0, "other"]
+    assert [str(failure) for failure in failures] == ["boom", "boom"]
+    assert in_flight == 0
+
+
+def test_identical_messages_share_one_analysis_with_per_ticket_dispatch(ai_services, monkeypatch):
+    from app import main
+
+    classify = ai_services.analysis.classify
+    calls = []
+    lock = threading.Lock()
+
+    def slow_classify(messages, include_sentiment=True, include_intent=True):
+        with lock:
+            calls.append(len(messages))
+        time.sleep(0.2) # Long enough for the identical requests to arrive
+        return classify(messages, include_sentiment, include_intent)
+
+    monkeypatch.setattr(ai_services.analysis, "classify", slow_classify)
+    open_tickets = sum(agent.open_tickets for agent in ai_services.dispatch.get_roster())
+
+    async def send_all():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            requests = [
+                client.post("/ai/process_incoming_message", json={
+                    "ticket_id": ticket_id, "message": "I forgot my  PASSWORD" if ticket_id % 2 else "i forgot my password",
+                    "existing_ticket_status": "in_progress" if ticket_id == 3 else "pending"
+                })
+                for ticket_id in range(1, 7)
+            ]
+            return await asyncio.gather(*requests)
+
+    responses = asyncio.run(send_all())
+    assert calls == [1] # One joint classification of one message
+    assert all(response.status_code == 200 for response in responses)
+    results = [response.json() for response in responses]
+    assert [result["ticket_id"] for result in results] == [1, 2, 3, 4, 5, 6]
+    assert len({result["ai_reply"] for result in results}) == 1
+    # Dispatch ran once per ticket: the agents' open ticket counts rose for each of them
+    assert sum(agent.open_tickets for agent in ai_services.dispatch.get_roster()) == open_tickets + 5 # Ticket 3 is already in progress and counted
+
+
+def test_coalescing_can_be_disabled():
+    calls = []
+
+    async def main():
+        flights = SingleFlight(enabled=False)
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(flights.run("op", "same", compute) for _ in range(3)))
+
+    asyncio.run(main())
+    assert len(calls) == 3
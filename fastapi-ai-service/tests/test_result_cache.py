@@ -0,0 +1,75 @@
+import joblib
+
+from app.utils.result_cache import MISSING, ResultCache, normalize_message
+from conftest import CHATBOT_TRAINING_DATA, train_pipeline
+
+
+def test_normalize_message_collapses_case_and_whitespace():
+    assert normalize_message("  Reset   my\tPASSWORD \n") == normalize_message("reset my password")
+
+
+def test_lru_eviction_and_counters():
+    cache = ResultCache(max_entries=2, ttl_seconds=60)
+    cache.set(("intent", "v1", "a"), 1)
+    cache.set(("intent", "v1", "b"), 2)
+    assert cache.get(("intent", "v1", "a")) == 1 # 'a' becomes most recently used
+    cache.set(("intent", "v1", "c"), 3)
+    assert cache.get(("intent", "v1", "b")) is MISSING
+    assert cache.get(("intent", "v1", "c")) == 3
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["namespaces"]["intent"] == {"hits": 2, "misses": 1, "hit_rate": 2 / 3}
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = ResultCache(max_entries=10, ttl_seconds=5)
+    clock = [100.0]
+    monkeypatch.setattr("app.utils.result_cache.time.monotonic", lambda: clock[0])
+    cache.set(("kb", None, "q"), None)
+    assert cache.get(("kb", None, "q")) is None # None is a valid cached value
+    clock[0] += 6
+    assert cache.get(("kb", None, "q")) is MISSING
+    assert len(cache) == 0
+
+
+def test_repeated_messages_skip_the_model(ai_services, api_client):
+    classifier = ai_services.chatbot.pipeline.named_steps.clf
+    original = classifier.decision_function
+    calls = []
+    classifier.decision_function = lambda X: calls.append(X.shape[0]) or original(X)
+
+    first = api_client.post("/ai/process_incoming_message", json={"ticket_id": 1, "message": "Where is my order"}).json()
+    second = api_client.post("/ai/process_incoming_message", json={"ticket_id": 2, "message": "  where IS my   order "}).json()
+    assert calls == [1]
+    assert first["intent"] == second["intent"] and second["ticket_id"] == 2
+    assert api_client.post("/ai/chatbot", json={"message": "where is my order"}).json()["intent"] == first["intent"]
+    assert api_client.post("/ai/dispatch_ticket", json={"ticket_id": 3, "message": "WHERE is my order"}).status_code == 200
+    assert calls == [1]
+
+    stats = api_client.get("/admin/cache").json()
+    assert stats["namespaces"]["intent"]["hits"] == 3
+    assert stats["namespaces"]["kb"]["hits"] == 1
+
+
+def test_batch_deduplicates_identical_messages(ai_services):
+    from app.models.ticket_models import TicketAnalysisRequest
+    classifier = ai_services.sentiment.pipeline.named_steps.clf
+    original = classifier.decision_function
+    calls = []
+    classifier.decision_function = lambda X: calls.append(X.shape[0]) or original(X)
+
+    requests = [TicketAnalysisRequest(ticket_id=i, message="hello there" if i % 2 else "I hate this") for i in range(8)]
+    results = ai_services.analysis.analyze_batch(requests)
+    assert calls == [2]
+    assert len({response.sentiment for response, _ in results}) == 2
+
+
+def test_model_reload_changes_cache_key(ai_services, tmp_path):
+    analysis = ai_services.analysis
+    assert analysis.predict_intent("hello there")[0] == "greeting"
+
+    # Retrain with different labels; a reload must not serve the old cached result
+    relabelled = [(text, "renamed_" + label) for text, label in CHATBOT_TRAINING_DATA]
+    joblib.dump(train_pipeline(relabelled), ai_services.chatbot.model_path)
+    ai_services.chatbot.load_model()
+    assert analysis.predict_intent("hello there")[0] == "renamed_greeting"
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+from fastapi.testclient import TestClient
+
+from app.utils.startup import StartupLoader
+
+
+def test_loader_runs_loads_concurrently_and_reports_each_component():
+    # Both loads must be inside the barrier at once, which fails if they run one after another
+    barrier = threading.Barrier(2, timeout=5)
+    state = {"a": False, "b": False}
+
+    def load(name):
+        barrier.wait()
+        state[name] = True
+
+    def broken():
+        raise RuntimeError("disk on fire")
+
+    loader = StartupLoader()
+    loader.add("a", lambda: load("a"), lambda: (state["a"], "v1", None))
+    loader.add("b", lambda: load("b"), lambda: (state["b"], "v2", None))
+    loader.add("missing", lambda: None, lambda: (False, None, "file not found"), required=False)
+    loader.add("broken", broken, lambda: (False, None, None), required=False)
+    assert not loader.ready
+
+    asyncio.run(loader.load_all())
+
+    report = loader.report()
+    assert report["ready"] and loader.finished
+    components = report["components"]
+    assert components["a"]["status"] == "loaded" and components["a"]["version"] == "v1"
+    assert components["b"]["status"] == "loaded"
+    assert components["missing"]["status"] == "not_loaded"
+    assert components["missing"]["error"] == "file not found"
+    assert components["broken"]["status"] == "failed"
+    assert components["broken"]["error"] == "disk on fire"
+    assert all(component["load_duration_seconds"] is not None for component in components.values())
+
+    loader.add("required_missing", lambda: None, lambda: (False, None, None))
+    asyncio.run(loader.load_all())
+    assert not loader.ready
+
+
+def test_ready_reports_unloaded_until_startup_loads_artifacts(ai_services, monkeypatch):
+    from app import main
+    from app.services.chatbot_service import ChatbotService
+    from app.services.knowledge_base_service import KnowledgeBaseService
+    from app.services.sentiment_service import SentimentService
+
+    chatbot, sentiment, knowledge_base = ChatbotService(load=False), SentimentService(load=False), KnowledgeBaseService(load=False)
+    monkeypatch.setattr(main, "chatbot_service", chatbot)
+    monkeypatch.setattr(main, "sentiment_service", sentiment)
+    monkeypatch.setattr(main, "knowledge_base_service", knowledge_base)
+    monkeypatch.setattr(main, "startup_loader", StartupLoader())
+    for name, service, load in (
+        ("chatbot", chatbot, chatbot.load_model),
+        ("sentiment", sentiment, sentiment.load_model),
+    ):
+        main.startup_loader.add(name, load, lambda s=service: (s.is_model_loaded(), s.model_version, s.load_error))
+    main.startup_loader.add(
+        "knowledge_base", knowledge_base.load_knowledge_base,
+        lambda: (knowledge_base.is_kb_loaded(), knowledge_base.kb_version, knowledge_base.load_error)
+    )
+
+    client = TestClient(main.app)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["components"]["chatbot"]["status"] == "pending"
+    assert not chatbot.is_model_loaded()
+
+    with TestClient(main.app) as client: # runs the startup event
+        response = client.get("/ready")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["ready"] and body["mode"] == "blocking"
+        assert {name: component["status"] for name, component in body["components"].items()} == {
+            "chatbot": "loaded", "sentiment": "loaded", "knowledge_base": "loaded",
+        }
+        assert body["components"]["chatbot"]["version"] == chatbot.model_version
+        assert chatbot.is_model_loaded() and knowledge_base.is_kb_loaded()
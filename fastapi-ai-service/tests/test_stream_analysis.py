@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+from app.services.stream_analysis_service import StreamAnalysisService
+from app.utils.inference_executor import InferenceExecutor
+
+
+def record(ticket_id, message):
+    return (json.dumps({"ticket_id": ticket_id, "message": message}) + "\n").encode("utf-8")
+
+
+def spy_batches(analysis, monkeypatch):
+    sizes = []
+    analyze_batch = analysis.analyze_batch
+
+    def recording(requests, dispatch=True):
+        sizes.append(len(requests))
+        return analyze_batch(requests, dispatch)
+
+    monkeypatch.setattr(analysis, "analyze_batch", recording)
+    return sizes
+
+
+def test_stream_endpoint_returns_results_in_order_with_dispatch(api_client):
+    body = record(1, "how do i reset my password") + b"[1, 2]\n\n" + record(3, "where is my order")
+    response = api_client.post("/ai/process_incoming_messages/stream", content=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [(result["index"], result["status"]) for result in results] == [(0, "ok"), (1, "error"), (2, "ok")]
+    assert results[0]["result"]["intent"] == "password_reset"
+    assert results[0]["result"]["suggested_agent_id"] is not None
+    assert results[2]["ticket_id"] == 3
+
+
+def test_micro_batches_close_on_size_and_on_window(ai_services, monkeypatch):
+    sizes = spy_batches(ai_services.analysis, monkeypatch)
+
+    async def collect(service, body):
+        return [chunk async for chunk in service.stream(body)]
+
+    async def burst():
+        for i in range(7):
+            yield record(i, "hello there")
+
+    by_size = StreamAnalysisService(ai_services.analysis, InferenceExecutor(mode="thread"), batch_size=3, window_seconds=10)
+    chunks = asyncio.run(collect(by_size, burst()))
+    assert sizes == [3, 3, 1]
+    assert sum(chunk.count(b"\n") for chunk in chunks) == 7
+
+    async def trickle():
+        yield record(1, "hello there")
+        await asyncio.sleep(0.2)
+        yield record(2, "where is my order")
+
+    sizes.clear()
+    by_window = StreamAnalysisService(ai_services.analysis, InferenceExecutor(mode="thread"), batch_size=100, window_seconds=0.02)
+    asyncio.run(collect(by_window, trickle()))
+    assert sizes == [1, 1]
+
+
+def test_stream_stops_reading_input_while_results_are_not_consumed(ai_services):
+    consumed = 0
+
+    async def feed():
+        nonlocal consumed
+        for i in range(100):
+            consumed += 1
+            yield record(i, "hello there")
+
+    async def main():
+        service = StreamAnalysisService(ai_services.analysis, InferenceExecutor(mode="thread"), batch_size=1, window_seconds=0, max_pending=2)
+        results = service.stream(feed())
+        await results.__anext__()
+        await asyncio.sleep(0.2) # the client is slow to read the next result
+        read_while_paused = consumed
+        remaining = [chunk async for chunk in results]
+        return read_while_paused, remaining
+
+    read_while_paused, remaining = asyncio.run(main())
+    assert read_while_paused <= 5
+    assert len(remaining) == 99
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+
+import joblib
+import pytest
+
+from app.services.tenant_registry import TENANT_EVICTIONS, TenantNotFoundError, TenantRegistry
+from conftest import CHATBOT_TRAINING_DATA, train_pipeline
+
+ACME_KNOWLEDGE_BASE = [
+    {"question": "How do I return a rocket?", "answer": "Acme rockets can be returned within 30 days.", "keywords": ["return", "rocket"], "intent_keyword": "returns"},
+]
+
+
+@pytest.fixture
+def tenants(ai_services, tmp_path, monkeypatch):
+    """Tenant 'acme' with its own chatbot model and knowledge base, tenant 'beta' with only a knowledge base."""
+    from app import main
+
+    acme = tmp_path / "tenants" / "acme"
+    acme.mkdir(parents=True)
+    joblib.dump(train_pipeline([(text, "acme_" + label) for text, label in CHATBOT_TRAINING_DATA]), acme / "trained_chatbot_model.joblib")
+    (acme / "knowledge_base.json").write_text(json.dumps(ACME_KNOWLEDGE_BASE), encoding="utf-8")
+    beta = tmp_path / "tenants" / "beta"
+    beta.mkdir()
+    (beta / "knowledge_base.json").write_text(json.dumps(ACME_KNOWLEDGE_BASE[:0]), encoding="utf-8")
+
+    registry = TenantRegistry(main.tenant_registry.default_services, main.inference_executor, root_dir=str(tmp_path / "tenants"))
+    monkeypatch.setattr(main, "tenant_registry", registry)
+    return registry
+
+
+def test_tenant_models_serve_tenant_requests(api_client, ai_services, tenants):
+    default = api_client.post("/ai/process_incoming_message", json={"ticket_id": 1, "message": "i forgot my password"}).json()
+    acme = api_client.post("/ai/process_incoming_message", json={"ticket_id": 2, "message": "i forgot my password", "tenant_id": "acme"}).json()
+    assert default["intent"] == "password_reset"
+    assert acme["intent"] == "acme_password_reset"
+    assert acme["intent_model_version"] != default["intent_model_version"]
+    # Artifacts a tenant does not provide come from the default services
+    assert acme["sentiment_model_version"] == default["sentiment_model_version"]
+    answer = api_client.post("/ai/process_incoming_message", json={"ticket_id": 3, "message": "How do I return a rocket?", "tenant_id": "acme"}).json()
+    assert answer["knowledge_base_answer"] == ACME_KNOWLEDGE_BASE[0]["answer"]
+
+    dispatch = api_client.post("/ai/dispatch_ticket", json={"ticket_id": 4, "message": "where is my order", "tenant_id": "acme"}).json()
+    assert dispatch["intent"] == "acme_order_status"
+
+    batch = api_client.post("/ai/process_incoming_messages", json=[
+        {"ticket_id": 5, "message": "hello there", "tenant_id": "acme"},
+        {"ticket_id": 6, "message": "hello there"},
+        {"ticket_id": 7, "message": "hello there", "tenant_id": "nope"},
+    ]).json()
+    assert [item["status"] for item in batch["results"]] == ["ok", "ok", "error"]
+    assert [item["result"]["intent"] for item in batch["results"][:2]] == ["acme_greeting", "greeting"]
+    assert "not found" in batch["results"][2]["error"]
+
+    assert api_client.post("/ai/process_incoming_message", json={"ticket_id": 8, "message": "hi", "tenant_id": "nope"}).status_code == 404
+    assert api_client.post("/ai/process_incoming_message", json={"ticket_id": 9, "message": "hi", "tenant_id": "../acme"}).status_code == 404
+    assert [tenant["tenant_id"] for tenant in api_client.get("/admin/tenants").json()["tenants"]] == ["acme"]
+
+
+def test_concurrent_first_requests_load_a_tenant_once(tenants, monkeypatch):
+    build = tenants._build
+    builds = []
+
+    def slow_build(*args):
+        builds.append(args[0])
+        time.sleep(0.1) # Long enough for the other requests to arrive
+        return build(*args)
+
+    monkeypatch.setattr(tenants, "_build", slow_build)
+
+    async def main():
+        loaded = await asyncio.gather(*(tenants.get("acme") for _ in range(10)), return_exceptions=True)
+        missing = await asyncio.gather(tenants.get("nope"), tenants.get("nope"), return_exceptions=True)
+        return loaded, missing
+
+    loaded, missing = asyncio.run(main())
+    assert builds == ["acme"]
+    assert all(tenant is loaded[0] for tenant in loaded)
+    assert all(isinstance(error, TenantNotFoundError) for error in missing)
+
+
+def test_least_recently_used_tenants_are_evicted_over_budget(tenants):
+    async def main():
+        acme = await tenants.get("acme")
+        # Room for acme, or for beta, but not for both
+        tenants.memory_budget_bytes = acme.memory_bytes
+        await tenants.get("beta")
+        after_beta = [tenant.tenant_id for tenant in tenants.loaded()]
+        beta = await tenants.get("beta")
+        assert await tenants.get("acme") is not acme # Loaded again
+        return after_beta, beta
+
+    evictions = TENANT_EVICTIONS.value(reason="memory")
+    after_beta, beta = asyncio.run(main())
+    assert beta.memory_bytes > 0
+    assert after_beta == ["beta"]
+    assert [tenant.tenant_id for tenant in tenants.loaded()] == ["acme"]
+    assert TENANT_EVICTIONS.value(reason="memory") == evictions + 2
+    assert tenants.evict("acme") and not tenants.evict("acme")
+    assert len(tenants) == 0
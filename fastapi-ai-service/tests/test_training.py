@@ -0,0 +1,95 @@
+import json
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+from app.services.chatbot_service import ChatbotService
+from app.utils.training import fit_pipeline, load_training_data, parse_param_grid, publish_version, read_manifest
+from conftest import CHATBOT_TRAINING_DATA
+
+
+def write_jsonl(path, samples):
+    path.write_text("".join(json.dumps({"text": text, "label": label}) + "\n" for text, label in samples), encoding="utf-8")
+
+
+def test_search_picks_parameters_and_manifest_versions_are_served(tmp_path, monkeypatch):
+    data_path = tmp_path / "intents.jsonl"
+    write_jsonl(data_path, CHATBOT_TRAINING_DATA)
+    texts, labels = load_training_data(str(data_path))
+
+    grid = parse_param_grid('{"clf__C": [0.1, 1.0], "tfidf__ngram_range": [[1, 1], [1, 2]]}')
+    assert grid == {"clf__C": [0.1, 1.0], "tfidf__ngram_range": [(1, 1), (1, 2)]}
+    pipeline, summary = fit_pipeline(texts, labels, param_grid=grid, n_jobs=2)
+    assert summary["search"] and summary["candidates"] == 4 and summary["folds"] == 3
+    assert set(summary["best_params"]) == set(grid)
+
+    registry = tmp_path / "registry"
+    first = publish_version(str(registry), "chatbot", pipeline, summary, keep=2)
+    manifest_path = registry / "chatbot" / "manifest.json"
+    assert read_manifest(str(manifest_path))["version"] == first["version"]
+    assert os.path.exists(registry / "chatbot" / first["artifact"])
+
+    monkeypatch.setenv("MODEL_PATH_CHATBOT", str(manifest_path))
+    chatbot = ChatbotService()
+    assert chatbot.predict_intent("i forgot my password")[0] == "password_reset"
+    serving_version = chatbot.model_version
+
+    relabelled, _ = fit_pipeline(texts, ["v2_" + label for label in labels], search=False)
+    time.sleep(1) # versions are timestamped to the second
+    second = publish_version(str(registry), "chatbot", relabelled, {"search": False}, export_mapped=True, keep=2)
+    assert second["history"] == [second["version"], first["version"]]
+    assert second["artifact"].endswith("/mapped")
+
+    swapped, message = chatbot.reload_model()
+    assert swapped, message
+    assert chatbot.model_version != serving_version
+    assert chatbot.predict_intent("i forgot my password")[0] == "v2_password_reset"
+
+    time.sleep(1)
+    third = publish_version(str(registry), "chatbot", relabelled, {"search": False}, keep=2)
+    # Only the newest `keep` versions remain
+    assert not os.path.exists(registry / "chatbot" / first["version"])
+    assert sorted(os.listdir(registry / "chatbot")) == sorted(["manifest.json", second["version"], third["version"]])
+
+
+def test_admin_training_runs_in_a_child_process_and_reloads(ai_services, monkeypatch, tmp_path):
+    from app import main
+    from app.services.training_service import TrainingService
+
+    data_path = tmp_path / "intents.csv"
+    data_path.write_text("text,intent\n" + "".join(f'"{text}",v2_{label}\n' for text, label in CHATBOT_TRAINING_DATA), encoding="utf-8")
+    registry = tmp_path / "registry"
+    monkeypatch.setattr(main, "training_service", TrainingService(str(registry), main._on_model_published))
+    original_path = ai_services.chatbot.model_path
+    # Serve whatever the registry publishes
+    ai_services.chatbot.model_path = str(registry / "chatbot" / "manifest.json")
+    sentiment_version = ai_services.sentiment.model_version
+
+    def train(client):
+        response = client.post("/admin/models/train", json={"model": "chatbot", "data_path": str(data_path), "search": False})
+        assert response.status_code == 202
+        run_id = response.json()["run_id"]
+        deadline = time.monotonic() + 60
+        while (status := client.get(f"/admin/models/train/{run_id}").json())["status"] == "running":
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+        return status
+
+    with TestClient(main.app) as client:
+        assert client.post("/admin/models/train", json={"model": "chatbot", "data_path": str(tmp_path / "missing.csv")}).status_code == 400
+        status = train(client)
+        assert status["status"] == "succeeded", status["log_tail"]
+        assert status["training"]["samples"] == len(CHATBOT_TRAINING_DATA)
+        assert read_manifest(str(registry / "chatbot" / "manifest.json"))["version"] == status["version"]
+        assert ai_services.chatbot.model_version == status["version"]
+        assert ai_services.sentiment.model_version == sentiment_version # Only the trained model is reloaded
+
+        reply = client.post("/ai/chatbot", json={"message": "i forgot my password"}).json()
+        assert reply["intent"] == "v2_password_reset"
+
+        # Published, but the service is configured to serve another file
+        ai_services.chatbot.model_path = original_path
+        status = client.get(f"/admin/models/train/{train(client)['run_id']}").json()
+        assert status["status"] == "published_not_serving" and status["error"]
+        assert read_manifest(str(registry / "chatbot" / "manifest.json"))["version"] == status["version"] != ai_services.chatbot.model_version
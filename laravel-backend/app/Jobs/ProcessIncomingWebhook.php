@@ -57,7 +57,11 @@ class ProcessIncomingWebhook implements ShouldQueue
         // Send message to FastAPI AI service for analysis and possible AI reply
         try {
             $aiServiceUrl = env('FASTAPI_AI_SERVICE_URL') . '/ai/process_incoming_message';
-            $response = Http::timeout(60)->post($aiServiceUrl, [
+            $response = Http::timeout(60)->withHeaders([
+                'X-Client-ID' => 'laravel-webhook',
+                // The AI service drops the request instead of computing it once this job has given up waiting
+                'X-Request-Deadline' => (string) (microtime(true) + 60),
+            ])->post($aiServiceUrl, [
                 'ticket_id' => $ticket->id,
                 'message' => $this->messageContent,
                 'customer_id' => $this->customerId, // Pass customer_id for potential personalized responses